@@ -0,0 +1,271 @@
+"""
+Admission control and load shedding for the streaming API.
+
+Bounds how much work the process accepts at once (globally and per route),
+queues briefly when a route is full and rejects once the queue is deep.
+Before rejecting streaming frames, sessions are moved through degradation
+tiers so already-admitted work keeps its latency.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+
+from flask import jsonify
+
+# Degradation tiers, cheapest service first
+TIER_NORMAL = 0
+TIER_REDUCED_QUALITY = 1  # Lower JPEG quality / smaller preview
+TIER_LANDMARKS_ONLY = 2   # Measurements only, no processed frame
+TIER_REDUCED_FPS = 3      # Measurements only, and sessions capped to a lower frame rate
+
+TIER_NAMES = {
+    TIER_NORMAL: 'normal',
+    TIER_REDUCED_QUALITY: 'reduced_quality',
+    TIER_LANDMARKS_ONLY: 'landmarks_only',
+    TIER_REDUCED_FPS: 'reduced_fps',
+}
+
+# Load (in-flight / limit) at which each tier starts
+TIER_THRESHOLDS = (
+    (0.9, TIER_REDUCED_FPS),
+    (0.75, TIER_LANDMARKS_ONLY),
+    (0.5, TIER_REDUCED_QUALITY),
+)
+
+# Preview JPEG quality per tier (None = do not send a frame)
+TIER_JPEG_QUALITY = {
+    TIER_NORMAL: 80,
+    TIER_REDUCED_QUALITY: 50,
+    TIER_LANDMARKS_ONLY: None,
+    TIER_REDUCED_FPS: None,
+}
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+class Ticket:
+    """An admitted unit of work; release it through the controller"""
+
+    def __init__(self, route, tier):
+        self.route = route
+        self.tier = tier
+        self.started = time.time()
+
+    @property
+    def tier_name(self):
+        return TIER_NAMES[self.tier]
+
+    @property
+    def jpeg_quality(self):
+        return TIER_JPEG_QUALITY[self.tier]
+
+
+class AdmissionController:
+    """Global and per-route concurrency limits with queue-depth-aware rejection"""
+
+    def __init__(self, max_in_flight=32, route_limits=None, max_queue_depth=16,
+                 queue_timeout=2.0, latency_slos=None, degraded_fps=4.0, sleep=None, poll_interval=0.05):
+        self.max_in_flight = max_in_flight
+        self.route_limits = dict(route_limits or {})
+        self.max_queue_depth = max_queue_depth
+        self.queue_timeout = queue_timeout
+        self.latency_slos = dict(latency_slos or {})  # route -> target service time (s)
+        self.degraded_fps = degraded_fps
+        # With a cooperative sleep (socketio.sleep under eventlet) queued requests poll
+        # instead of blocking on the condition, so they never stall the event loop
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._route_in_flight = {}
+        self._queued = 0
+        self._route_latency = {}  # EWMA service time per route
+        self._last_frame_at = {}  # session id -> last admitted frame time
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'frames_dropped': 0}
+
+    def _has_capacity(self, route):
+        if self._in_flight >= self.max_in_flight:
+            return False
+        limit = self.route_limits.get(route)
+        return limit is None or self._route_in_flight.get(route, 0) < limit
+
+    def _load(self, route):
+        load = self._in_flight / self.max_in_flight
+        limit = self.route_limits.get(route)
+        if limit:
+            load = max(load, self._route_in_flight.get(route, 0) / limit)
+        return load
+
+    def current_tier(self, route):
+        """Degradation tier for new work on a route given current load and latency"""
+        with self._cond:
+            return self._tier_locked(route)
+
+    def _tier_locked(self, route):
+        load = self._load(route)
+        tier = TIER_NORMAL
+        for threshold, threshold_tier in TIER_THRESHOLDS:
+            if load >= threshold:
+                tier = threshold_tier
+                break
+        # Step down one more tier while the route is missing its latency SLO
+        latency = self._route_latency.get(route)
+        slo = self.latency_slos.get(route)
+        if slo is not None and latency is not None and latency > slo:
+            tier = min(tier + 1, TIER_REDUCED_FPS)
+        return tier
+
+    def _admit_locked(self, route):
+        self._in_flight += 1
+        self._route_in_flight[route] = self._route_in_flight.get(route, 0) + 1
+        self.stats['admitted'] += 1
+        # Tier reflects the load including this request
+        return Ticket(route, self._tier_locked(route))
+
+    def try_acquire(self, route, timeout=0):
+        """Admit work on a route, waiting up to timeout seconds in the queue. Returns a Ticket or None."""
+        with self._cond:
+            if self._has_capacity(route):
+                return self._admit_locked(route)
+            if timeout <= 0 or self._queued >= self.max_queue_depth:
+                self.stats['rejected'] += 1
+                return None
+
+            self._queued += 1
+            self.stats['queued'] += 1
+            deadline = time.time() + timeout
+            try:
+                while not self._has_capacity(route):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.stats['rejected'] += 1
+                        return None
+                    if self.sleep is None:
+                        self._cond.wait(remaining)
+                        continue
+                    self._cond.release()
+                    try:
+                        self.sleep(min(remaining, self.poll_interval))
+                    finally:
+                        self._cond.acquire()
+                return self._admit_locked(route)
+            finally:
+                self._queued -= 1
+
+    def release(self, ticket):
+        """Return a ticket's slot and record its service time"""
+        elapsed = time.time() - ticket.started
+        with self._cond:
+            self._in_flight -= 1
+            self._route_in_flight[ticket.route] -= 1
+            previous = self._route_latency.get(ticket.route)
+            self._route_latency[ticket.route] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+            self._cond.notify()
+
+    def allow_frame(self, session_id, tier):
+        """Frame-rate gate for the reduced-fps tier; False means drop this frame"""
+        now = time.time()
+        with self._cond:
+            if tier >= TIER_REDUCED_FPS:
+                last = self._last_frame_at.get(session_id)
+                if last is not None and now - last < 1.0 / self.degraded_fps:
+                    self.stats['frames_dropped'] += 1
+                    return False
+            self._last_frame_at[session_id] = now
+            return True
+
+    def forget_session(self, session_id):
+        with self._cond:
+            self._last_frame_at.pop(session_id, None)
+
+    def retry_after(self, route):
+        """Seconds a rejected client should wait, from queue depth and observed service time"""
+        with self._cond:
+            latency = self._route_latency.get(route, 1.0)
+            limit = self.route_limits.get(route, self.max_in_flight)
+            backlog = self._queued + self._route_in_flight.get(route, 0)
+            return max(1, int(math.ceil(backlog * latency / max(limit, 1))))
+
+    def throttle_payload(self, route, tier=None, rejected=False):
+        """Body of the Socket.IO 'throttle' event"""
+        tier = self.current_tier(route) if tier is None else tier
+        payload = {
+            'route': route,
+            'tier': TIER_NAMES[tier],
+            'rejected': rejected,
+            'max_fps': self.degraded_fps if tier >= TIER_REDUCED_FPS or rejected else None,
+        }
+        if rejected:
+            payload['retry_after'] = self.retry_after(route)
+        return payload
+
+    def limit(self, route, timeout=None):
+        """Decorator for Flask views: 503 with Retry-After when the route cannot admit the request"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                wait = self.queue_timeout if timeout is None else timeout
+                ticket = self.try_acquire(route, timeout=wait)
+                if ticket is None:
+                    retry_after = self.retry_after(route)
+                    response = jsonify({
+                        'error': 'Server busy, please retry',
+                        'route': route,
+                        'retry_after': retry_after
+                    })
+                    response.status_code = 503
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    self.release(ticket)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Current load, queue depth and counters for /status"""
+        with self._cond:
+            return {
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'queued': self._queued,
+                'max_queue_depth': self.max_queue_depth,
+                'routes': {
+                    route: {
+                        'in_flight': self._route_in_flight.get(route, 0),
+                        'limit': limit,
+                        'latency_ms': round(self._route_latency[route] * 1000, 1) if route in self._route_latency else None,
+                        'tier': TIER_NAMES[self._tier_locked(route)]
+                    }
+                    for route, limit in self.route_limits.items()
+                },
+                'stats': dict(self.stats)
+            }
+
+
+def create_admission_controller(sleep=None):
+    """Admission controller configured from the environment (sleep: cooperative sleep for queued waits)"""
+    return AdmissionController(
+        max_in_flight=_env_int('ADMISSION_MAX_IN_FLIGHT', 32),
+        route_limits={
+            'stream': _env_int('ADMISSION_STREAM_LIMIT', 16),
+            'process_image': _env_int('ADMISSION_PROCESS_IMAGE_LIMIT', 4),
+            'tryon': _env_int('ADMISSION_TRYON_LIMIT', 4),
+        },
+        max_queue_depth=_env_int('ADMISSION_MAX_QUEUE', 16),
+        queue_timeout=_env_float('ADMISSION_QUEUE_TIMEOUT', 2.0),
+        latency_slos={'stream': _env_float('ADMISSION_STREAM_SLO_MS', 250) / 1000.0},
+        degraded_fps=_env_float('ADMISSION_DEGRADED_FPS', 4.0),
+        sleep=sleep,
+    )
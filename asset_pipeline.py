@@ -0,0 +1,254 @@
+"""
+Build and serve the frontend's static assets.
+
+`python asset_pipeline.py` turns virtual-try-on-app/ into a build directory:
+catalog images get WebP and AVIF variants at thumbnail sizes, JS and CSS get
+content-fingerprinted names, HTML is rewritten to point at them (catalog
+<img> tags become <picture> elements with srcset), and every text asset is
+stored alongside gzip (and brotli, when installed) encodings. A manifest
+records each file's hash so the API can serve fingerprinted files as
+immutable and answer conditional requests without touching the disk.
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, features
+
+try:
+    import brotli
+except ImportError:  # Brotli encodings are optional
+    brotli = None
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'virtual-try-on-app')
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build', 'app')
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+TEXT_EXTENSIONS = ('.html', '.js', '.css', '.json', '.svg')
+FINGERPRINTED_TEXT = ('.js', '.css')
+VARIANT_WIDTHS = (160, 320, 640)
+VARIANT_QUALITY = {'webp': 80, 'avif': 60}
+MANIFEST_NAME = 'asset-manifest.json'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+IMG_TAG = re.compile(r'<img\s+([^>]*?)src="([^":/?#]+)"([^>]*)>')
+LINK_ATTR = re.compile(r'((?:src|href)=")([^":/?#]+\.(?:js|css))(")')
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def fingerprint(name, data):
+    """'catalog-script.js' -> 'catalog-script.3f2a9c1d.js'"""
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{digest(data)[:8]}{extension}"
+
+
+def image_formats():
+    """Variant formats this Pillow build can encode"""
+    return [name for name in ('avif', 'webp') if features.check(name)]
+
+
+def build_image_variants(path, output_dir, widths=VARIANT_WIDTHS, formats=None):
+    """Fingerprinted WebP/AVIF copies of one image at each width (never upscaled)"""
+    formats = formats or image_formats()
+    name = os.path.basename(path)
+    stem = os.path.splitext(name)[0]
+    variants = []
+    with Image.open(path) as image:
+        image.load()
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for width in sorted(set(min(w, image.width) for w in widths)):
+            resized = image if width == image.width else image.resize(
+                (width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            for image_format in formats:
+                buffer = io.BytesIO()
+                resized.save(buffer, image_format.upper(), quality=VARIANT_QUALITY[image_format])
+                data = buffer.getvalue()
+                variant_name = f"{stem}.{digest(data)[:8]}.{width}w.{image_format}"
+                with open(os.path.join(output_dir, variant_name), 'wb') as f:
+                    f.write(data)
+                variants.append({'format': image_format, 'width': width, 'path': variant_name, 'bytes': len(data)})
+    return name, variants
+
+
+def picture_tag(match, images):
+    """Rewrite a catalog <img> into <picture> with AVIF/WebP srcsets"""
+    before, source, after = match.groups()
+    variants = images.get(source)
+    if not variants:
+        return match.group(0)
+    by_format = {}
+    for variant in variants:
+        by_format.setdefault(variant['format'], []).append(variant)
+    sizes = 'sizes="(max-width: 600px) 50vw, 320px"'
+    srcset = lambda items: ', '.join(f"{v['path']} {v['width']}w" for v in items)
+    sources = ''.join(f'<source type="image/{image_format}" srcset="{srcset(items)}" {sizes}>'
+                      for image_format, items in by_format.items() if image_format != 'webp')
+    fallback = by_format.get('webp') or next(iter(by_format.values()))
+    largest = max(fallback, key=lambda v: v['width'])
+    loading = '' if 'loading=' in before + after else ' loading="lazy" decoding="async"'
+    # Scripts identify garments by image file name, which the fingerprinted src no longer carries
+    garment = '' if 'data-garment-id=' in before + after else f' data-garment-id="{os.path.splitext(source)[0]}"'
+    return (f'<picture style="display: contents">{sources}'
+            f'<img {before}src="{largest["path"]}" srcset="{srcset(fallback)}" {sizes}{after}{garment}{loading}></picture>')
+
+
+def precompress(path):
+    """Write .gz (and .br) next to a text asset; returns the encodings written"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    encodings = []
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    encodings.append('gzip')
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+        encodings.append('br')
+    return encodings
+
+
+def build(source_dir=SOURCE_DIR, output_dir=BUILD_DIR, widths=VARIANT_WIDTHS, workers=None):
+    """Build the asset directory and its manifest; returns the manifest"""
+    started = time.time()
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+    names = sorted(name for name in os.listdir(source_dir) if os.path.isfile(os.path.join(source_dir, name)))
+    formats = image_formats()
+
+    # Image variants in parallel (Pillow releases the GIL while encoding)
+    image_names = [name for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        images = dict(pool.map(lambda name: build_image_variants(
+            os.path.join(source_dir, name), output_dir, widths, formats), image_names))
+
+    # JS and CSS under fingerprinted names, then HTML pointing at them
+    renamed = {}
+    for name in names:
+        if name.endswith(FINGERPRINTED_TEXT):
+            with open(os.path.join(source_dir, name), 'rb') as f:
+                data = f.read()
+            renamed[name] = fingerprint(name, data)
+            with open(os.path.join(output_dir, renamed[name]), 'wb') as f:
+                f.write(data)
+    for name in names:
+        source = os.path.join(source_dir, name)
+        if name.endswith('.html'):
+            with open(source, 'r', encoding='utf-8') as f:
+                html = f.read()
+            html = LINK_ATTR.sub(lambda m: m.group(1) + renamed.get(m.group(2), m.group(2)) + m.group(3), html)
+            html = IMG_TAG.sub(lambda m: picture_tag(m, images), html)
+            with open(os.path.join(output_dir, name), 'w', encoding='utf-8') as f:
+                f.write(html)
+        elif name.lower().endswith(IMAGE_EXTENSIONS + TEXT_EXTENSIONS) and name not in renamed:
+            # Originals keep their names: scripts still load catalog images by file name
+            shutil.copy2(source, os.path.join(output_dir, name))
+
+    files = {}
+    immutable = set(renamed.values()) | {v['path'] for variants in images.values() for v in variants}
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        encodings = precompress(path) if name.endswith(TEXT_EXTENSIONS) else []
+        files[name] = {
+            'sha256': digest(data),
+            'bytes': len(data),
+            'immutable': name in immutable,
+            'encodings': encodings
+        }
+    manifest = {
+        'built_at': time.time(),
+        'files': files,
+        'fingerprinted': renamed,
+        'images': images
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    source_bytes = sum(os.path.getsize(os.path.join(source_dir, name)) for name in image_names)
+    thumbnail_bytes = sum(min(v['bytes'] for v in variants if v['width'] == min(x['width'] for x in variants))
+                          for variants in images.values() if variants)
+    print(f"📦 Built {len(files)} assets into {output_dir} in {time.time() - started:.1f}s "
+          f"({len(image_names)} images, {source_bytes / 1e6:.1f} MB originals, "
+          f"{thumbnail_bytes / 1e3:.0f} KB smallest thumbnails; formats: {', '.join(formats)})")
+    return manifest
+
+
+class AssetCatalog:
+    """Manifest lookups for serving a built asset directory"""
+
+    def __init__(self, directory=BUILD_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_NAME), 'r') as f:
+            self.manifest = json.load(f)
+        self.files = self.manifest['files']
+
+    def resolve(self, name, accept_encoding=''):
+        """(path, headers) for a built file, or None; picks br/gzip when the client accepts it"""
+        entry = self.files.get(name)
+        if entry is None:
+            return None
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        headers = {
+            'Content-Type': mimetype,
+            'Cache-Control': IMMUTABLE_CACHE if entry['immutable'] else REVALIDATE_CACHE,
+            'ETag': f'"{entry["sha256"][:32]}"'
+        }
+        path = os.path.join(self.directory, name)
+        if entry['encodings']:
+            headers['Vary'] = 'Accept-Encoding'
+            accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+            for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+                if encoding in entry['encodings'] and encoding in accepted:
+                    path += suffix
+                    headers['Content-Encoding'] = encoding
+                    # Each encoding is a different representation
+                    headers['ETag'] = f'"{entry["sha256"][:32]}-{encoding}"'
+                    break
+        return path, headers
+
+    def snapshot(self):
+        return {
+            'directory': self.directory,
+            'files': len(self.files),
+            'immutable': sum(1 for entry in self.files.values() if entry['immutable']),
+            'built_at': self.manifest.get('built_at')
+        }
+
+
+def load_asset_catalog(directory=None):
+    """Catalog for ASSET_BUILD_DIR (default build/app), or None if it has not been built"""
+    directory = directory or os.getenv('ASSET_BUILD_DIR', BUILD_DIR)
+    if not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        return None
+    return AssetCatalog(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed frontend assets')
+    parser.add_argument('--source', default=SOURCE_DIR, help='Frontend directory (default: virtual-try-on-app)')
+    parser.add_argument('--output', default=BUILD_DIR, help='Build directory (default: build/app)')
+    parser.add_argument('--widths', default=','.join(str(w) for w in VARIANT_WIDTHS),
+                        help='Comma-separated image variant widths')
+    parser.add_argument('--workers', type=int, default=None, help='Image encoding threads (default: CPU count)')
+    args = parser.parse_args()
+    build(args.source, args.output, tuple(int(w) for w in args.widths.split(',')), args.workers)
+
+
+if __name__ == '__main__':
+    main()
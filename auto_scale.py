@@ -0,0 +1,100 @@
+"""
+Streaming pixels-per-cm estimate from facial landmarks.
+
+Each frame contributes eye-distance and ear-distance samples weighted by
+landmark visibility and by how squarely the head faces the camera (yaw from
+the landmarks' z coordinates). A weighted median over a ring buffer of recent
+samples gives a robust estimate; once the samples agree closely enough the
+scale locks and is only re-checked every few frames.
+"""
+
+import math
+from collections import deque
+
+AVG_EYE_DISTANCE_CM = 6.3
+AVG_HEAD_WIDTH_CM = 15.0
+
+
+def weighted_median(samples):
+    """Median of (value, weight) pairs"""
+    ordered = sorted(samples)
+    total = sum(weight for _, weight in ordered)
+    running = 0.0
+    for value, weight in ordered:
+        running += weight
+        if running >= total / 2:
+            return value
+    return ordered[-1][0] if ordered else None
+
+
+class ScaleEstimator:
+    """Weighted-median pixels-per-cm estimate that converges over a few frames"""
+
+    def __init__(self, window=30, min_samples=8, tolerance=0.04, recheck_every=15, min_weight=0.2):
+        self.window = window
+        self.min_samples = min_samples
+        self.tolerance = tolerance          # Relative spread (weighted MAD / median) that counts as converged
+        self.recheck_every = recheck_every  # Frames between samples once locked
+        self.min_weight = min_weight        # Samples weighted below this are dropped
+        self.reset()
+
+    def reset(self):
+        self.samples = deque(maxlen=self.window)
+        self.estimate = None
+        self.spread = None
+        self.converged = False
+        self.frames_since_sample = 0
+
+    def _pair_sample(self, first, second, width, height, reference_cm, min_pixels, base_weight):
+        """(pixels per cm, weight) from one landmark pair, or None if unusable"""
+        dx = (first.x - second.x) * width
+        dy = (first.y - second.y) * height
+        dz = (first.z - second.z) * width  # MediaPipe z is on roughly the same scale as x
+        planar = math.hypot(dx, dy)
+        if planar <= min_pixels:
+            return None
+        facing = planar / math.sqrt(planar * planar + dz * dz)  # cos(yaw): 1 when facing the camera
+        visibility = min(getattr(first, 'visibility', 1.0), getattr(second, 'visibility', 1.0))
+        weight = base_weight * visibility * facing * facing
+        if weight < self.min_weight:
+            return None
+        return planar / reference_cm, weight
+
+    def frame_samples(self, landmarks, width, height, left_eye=1, right_eye=4, left_ear=7, right_ear=8):
+        """Scale samples available in one frame's pose landmarks"""
+        points = landmarks.landmark
+        samples = [
+            self._pair_sample(points[left_eye], points[right_eye], width, height, AVG_EYE_DISTANCE_CM, 10, 1.0),
+            self._pair_sample(points[left_ear], points[right_ear], width, height, AVG_HEAD_WIDTH_CM, 20, 0.5)
+        ]
+        return [sample for sample in samples if sample]
+
+    def update(self, landmarks, width, height, **indices):
+        """Fold in a frame (skipped while locked, except for periodic re-checks); returns the estimate"""
+        if self.converged:
+            self.frames_since_sample += 1
+            if self.frames_since_sample < self.recheck_every:
+                return self.estimate
+        self.frames_since_sample = 0
+        samples = self.frame_samples(landmarks, width, height, **indices)
+        if not samples:
+            return self.estimate
+        self.samples.extend(samples)
+        self._recompute()
+        return self.estimate
+
+    def _recompute(self):
+        self.estimate = weighted_median(self.samples)
+        deviations = [(abs(value - self.estimate), weight) for value, weight in self.samples]
+        self.spread = weighted_median(deviations) / self.estimate if self.estimate else None
+        self.converged = (len(self.samples) >= self.min_samples
+                          and self.spread is not None and self.spread <= self.tolerance)
+
+    def state(self):
+        """Convergence state for clients"""
+        return {
+            'pixels_per_cm': round(self.estimate, 3) if self.estimate else None,
+            'converged': self.converged,
+            'samples': len(self.samples),
+            'spread': round(self.spread, 4) if self.spread is not None else None
+        }
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the virtual try-on proxy.
+
+Starts the mock provider (mock_tryon_server.py), points the API at it and
+drives concurrent shoppers through POST /virtual-tryon, then reports
+throughput, latency percentiles, worker saturation and memory growth.
+By default the Flask app runs in-process through its test client; pass
+--url to load a running server instead (start it with TRYON_UPSTREAM_URL
+pointing at a mock).
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from mock_tryon_server import start_mock_server
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'virtual-try-on-app')
+
+
+def read_rss_kb(pid='self'):
+    """Resident set size of a process in KB, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class InProcessClient:
+    """Calls the Flask app through its test client, one client per thread"""
+
+    def __init__(self):
+        import streaming_api
+        self.app = streaming_api.app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def post_tryon(self, data, files):
+        form = dict(data)
+        for field, (filename, content, mimetype) in files.items():
+            form[field] = (io.BytesIO(content), filename, mimetype)
+        response = self._client().post('/virtual-tryon', data=form, content_type='multipart/form-data')
+        return response.status_code, response.get_json(silent=True)
+
+    def status(self):
+        return self._client().get('/status').get_json(silent=True) or {}
+
+
+class HttpClient:
+    """Calls a running API server over HTTP"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def post_tryon(self, data, files):
+        response = self._session().post(f'{self.base_url}/virtual-tryon', data=data, files=files, timeout=self.timeout)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    def status(self):
+        try:
+            return self._session().get(f'{self.base_url}/status', timeout=5).json()
+        except (requests.RequestException, ValueError):
+            return {}
+
+
+class SaturationSampler(threading.Thread):
+    """Polls /status and the process RSS while the benchmark runs"""
+
+    def __init__(self, client, interval, pid=None):
+        super().__init__(daemon=True, name='benchmark-sampler')
+        self.client = client
+        self.interval = interval
+        self.pid = pid
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            status = self.client.status()
+            jobs = status.get('tryon_jobs', {})
+            tryon_route = status.get('admission', {}).get('routes', {}).get('tryon', {})
+            self.samples.append({
+                't': time.time(),
+                'workers': jobs.get('workers'),
+                'running': jobs.get('running', 0),
+                'queued': jobs.get('queued', 0),
+                'admission_in_flight': tryon_route.get('in_flight', 0),
+                'rss_kb': read_rss_kb(self.pid) if self.pid else None
+            })
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_benchmark(client, args, avatar, garment):
+    """Drive args.requests try-ons from args.concurrency threads; returns the per-request records"""
+    records = []
+    records_lock = threading.Lock()
+    counter = iter(range(args.requests))
+    counter_lock = threading.Lock()
+    rng = random.Random(args.seed)
+
+    def next_index():
+        with counter_lock:
+            return next(counter, None)
+
+    def shopper():
+        while True:
+            index = next_index()
+            if index is None:
+                return
+            with counter_lock:
+                repeat = rng.random() < args.repeat_ratio
+            # A unique trailer after the JPEG end marker changes the cache key but not the image
+            avatar_bytes = avatar if repeat else avatar + b'bench-%d-%d' % (os.getpid(), index)
+            data = {'backend': args.backend, 'session_id': f'bench-user-{index % args.users}'}
+            files = {'avatar_image': ('avatar.jpg', avatar_bytes, 'image/jpeg')}
+            if args.garment_id:
+                data['garment_id'] = args.garment_id
+            else:
+                files['clothing_image'] = (os.path.basename(args.garment), garment, 'image/png')
+
+            started = time.time()
+            try:
+                status, body = client.post_tryon(data, files)
+            except Exception as e:
+                status, body = 'exception', {'error': str(e)}
+            elapsed = time.time() - started
+            with records_lock:
+                records.append({
+                    'status': status,
+                    'latency': elapsed,
+                    'cached': bool(body and body.get('cached')),
+                    'backend': body.get('backend') if body else None
+                })
+
+    threads = [threading.Thread(target=shopper, name=f'shopper-{i}') for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def summarise(records, samples, elapsed, rss_before, upstream_stats):
+    """Aggregate request records and sampler output into a report"""
+    latencies = [r['latency'] for r in records if r['status'] == 200]
+    statuses = Counter(str(r['status']) for r in records)
+    workers = next((s['workers'] for s in samples if s['workers']), None)
+    running = [s['running'] for s in samples]
+    rss = [s['rss_kb'] for s in samples if s['rss_kb']]
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        'requests': len(records),
+        'succeeded': statuses.get('200', 0),
+        'statuses': dict(statuses),
+        'cached': sum(1 for r in records if r['cached']),
+        'backends': dict(Counter(r['backend'] for r in records if r['backend'])),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(statuses.get('200', 0) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(max(latencies) if latencies else None)
+        },
+        'workers': {
+            'size': workers,
+            'mean_running': round(sum(running) / len(running), 2) if running else None,
+            'peak_running': max(running) if running else None,
+            'saturation': round(sum(running) / len(running) / workers, 2) if running and workers else None,
+            'peak_queued': max((s['queued'] for s in samples), default=None),
+            'peak_admission_in_flight': max((s['admission_in_flight'] for s in samples), default=None)
+        },
+        'memory_kb': {
+            'rss_before': rss_before,
+            'rss_peak': max(rss) if rss else None,
+            'rss_after': rss[-1] if rss else None,
+            'growth': rss[-1] - rss_before if rss and rss_before else None
+        },
+        'upstream': upstream_stats
+    }
+
+
+def print_report(report):
+    latency = report['latency_ms']
+    workers = report['workers']
+    memory = report['memory_kb']
+    print("\n📊 Try-on proxy benchmark")
+    print(f"   Requests:    {report['requests']} in {report['elapsed_s']}s, {report['succeeded']} succeeded, {report['cached']} from cache")
+    print(f"   Statuses:    {report['statuses']}  backends: {report['backends']}")
+    print(f"   Throughput:  {report['throughput_rps']} try-ons/s")
+    print(f"   Latency:     p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, max {latency['max']} ms")
+    print(f"   Workers:     {workers['mean_running']} of {workers['size']} busy on average ({workers['saturation']}), "
+          f"peak {workers['peak_running']} running / {workers['peak_queued']} queued")
+    print(f"   Admission:   peak {workers['peak_admission_in_flight']} try-on requests in flight")
+    if memory['rss_before']:
+        print(f"   Memory:      RSS {memory['rss_before'] / 1024:.0f} MB -> {(memory['rss_after'] or 0) / 1024:.0f} MB "
+              f"(peak {(memory['rss_peak'] or 0) / 1024:.0f} MB, growth {(memory['growth'] or 0) / 1024:+.1f} MB)")
+    if report['upstream']:
+        upstream = report['upstream']
+        print(f"   Upstream:    {upstream['requests']} calls, {upstream['errors']} injected errors, {upstream['rate_limited']} rate limited, "
+              f"peak {upstream['max_in_flight']} concurrent, {upstream['bytes_received'] / 1e6:.1f} MB uploaded")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the virtual try-on proxy against a mock provider')
+    parser.add_argument('--requests', type=int, default=40, help='total try-ons to submit')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent shoppers')
+    parser.add_argument('--url', help='load a running API server instead of the in-process app')
+    parser.add_argument('--pid', help='process id of the --url server, for RSS sampling')
+    parser.add_argument('--backend', choices=('remote', 'local', 'auto'), default='remote')
+    parser.add_argument('--users', type=int, default=1, help='distinct shoppers (session ids) the requests come from')
+    parser.add_argument('--avatar', default=os.path.join(APP_DIR, 'salwar_suit.jpg'), help='avatar JPEG')
+    parser.add_argument('--garment', default=os.path.join(APP_DIR, 'blue_shirt.png'), help='garment image to upload')
+    parser.add_argument('--garment-id', help='catalog garment id to reference instead of uploading --garment')
+    parser.add_argument('--repeat-ratio', type=float, default=0.0, help='fraction of requests reusing one avatar (cache hits)')
+    parser.add_argument('--latency', type=float, default=1.0, help='mock provider median latency (s)')
+    parser.add_argument('--latency-dist', choices=('lognormal', 'uniform', 'fixed'), default='lognormal')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='mock provider failure rate')
+    parser.add_argument('--error-status', type=int, nargs='+', default=[503])
+    parser.add_argument('--response-kb', type=int, default=120, help='mock result image size')
+    parser.add_argument('--rate-limit', type=int, help='mock provider requests per minute (429 beyond)')
+    parser.add_argument('--quota', type=int, help='mock provider plan quota')
+    parser.add_argument('--sample-interval', type=float, default=0.2, help='seconds between /status samples')
+    parser.add_argument('--timeout', type=float, default=120, help='per-request timeout for --url')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    with open(args.avatar, 'rb') as f:
+        avatar = f.read()
+    garment = None
+    if not args.garment_id:
+        with open(args.garment, 'rb') as f:
+            garment = f.read()
+
+    mock = None
+    if args.url:
+        client = HttpClient(args.url, args.timeout)
+        pid = args.pid
+    else:
+        mock, upstream_url = start_mock_server(
+            latency=args.latency, latency_dist=args.latency_dist, error_rate=args.error_rate,
+            error_statuses=args.error_status, response_kb=args.response_kb, seed=args.seed,
+            rate_limit=args.rate_limit, quota=args.quota
+        )
+        print(f"🎭 Mock provider on {upstream_url} ({args.latency_dist} median {args.latency}s, error rate {args.error_rate:.0%})")
+        # Configure the app before importing it; keep benchmark results out of the real stores
+        scratch = tempfile.mkdtemp(prefix='tryon-bench-')
+        os.environ['TRYON_UPSTREAM_URL'] = upstream_url
+        os.environ.setdefault('RAPIDAPI_KEY', 'benchmark')
+        os.environ.setdefault('TRYON_CACHE_DIR', os.path.join(scratch, 'cache'))
+        os.environ.setdefault('TRYON_RESULTS_DIR', os.path.join(scratch, 'results'))
+        client = InProcessClient()
+        pid = 'self'
+
+    rss_before = read_rss_kb(pid) if pid else None
+    print(f"🚀 Submitting {args.requests} try-ons from {args.concurrency} concurrent shoppers (backend={args.backend})")
+    sampler = SaturationSampler(client, args.sample_interval, pid)
+    sampler.start()
+    started = time.time()
+    records = run_benchmark(client, args, avatar, garment)
+    elapsed = time.time() - started
+    sampler.stop()
+
+    upstream_stats = None
+    if mock:
+        with mock.RequestHandlerClass.config.lock:
+            upstream_stats = dict(mock.RequestHandlerClass.config.stats)
+        mock.shutdown()
+
+    report = summarise(records, sampler.samples, elapsed, rss_before, upstream_stats)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.json}")
+    return 0 if report['succeeded'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Per-user, per-device calibration profiles.
+
+Profiles live in SQLite (one row per user and device) behind a write-through
+in-memory LRU cache. The streaming API loads a profile once when a client
+connects and applies it to that session's processor, so frames never touch
+the store and users never share one calibration file.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_DEVICE = 'default'
+
+# Profile fields stored as JSON columns
+PROFILE_FIELDS = ('calibration', 'display_calibration')
+
+
+class CalibrationProfileStore:
+    """SQLite-backed calibration profiles keyed by (user_id, device_id)"""
+
+    def __init__(self, path='calibration_profiles.db', cache_size=1024):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (user_id, device_id) -> profile or None, least recently used first
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'deletes': 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS calibration_profiles ('
+            ' user_id TEXT NOT NULL,'
+            ' device_id TEXT NOT NULL,'
+            ' calibration TEXT,'
+            ' display_calibration TEXT,'
+            ' updated_at REAL NOT NULL,'
+            ' PRIMARY KEY (user_id, device_id))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS calibration_profiles_updated ON calibration_profiles (updated_at)')
+
+    def _remember(self, key, profile):
+        self._cache[key] = profile
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, user_id, device_id=DEFAULT_DEVICE):
+        """Return a copy of a profile ({'calibration', 'display_calibration', 'updated_at'}) or None"""
+        key = (user_id, device_id or DEFAULT_DEVICE)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                profile = self._cache[key]
+                return dict(profile) if profile else None
+
+            self.stats['misses'] += 1
+            row = self._db.execute(
+                'SELECT calibration, display_calibration, updated_at FROM calibration_profiles'
+                ' WHERE user_id = ? AND device_id = ?', key
+            ).fetchone()
+            profile = None
+            if row is not None:
+                profile = {
+                    'calibration': json.loads(row[0]) if row[0] else None,
+                    'display_calibration': json.loads(row[1]) if row[1] else None,
+                    'updated_at': row[2]
+                }
+            self._remember(key, profile)  # Unknown profiles are cached too
+            return dict(profile) if profile else None
+
+    def save(self, user_id, device_id=DEFAULT_DEVICE, **fields):
+        """Merge fields into a profile, writing the database before the cache"""
+        key = (user_id, device_id or DEFAULT_DEVICE)
+        with self._lock:
+            current = self._cache.get(key)
+            if current is None and key not in self._cache:
+                row = self._db.execute(
+                    'SELECT calibration, display_calibration FROM calibration_profiles'
+                    ' WHERE user_id = ? AND device_id = ?', key
+                ).fetchone()
+                if row is not None:
+                    current = {name: json.loads(value) if value else None for name, value in zip(PROFILE_FIELDS, row)}
+            profile = {name: (current or {}).get(name) for name in PROFILE_FIELDS}
+            profile.update({name: value for name, value in fields.items() if name in PROFILE_FIELDS})
+            profile['updated_at'] = time.time()
+            self._db.execute(
+                'INSERT OR REPLACE INTO calibration_profiles'
+                ' (user_id, device_id, calibration, display_calibration, updated_at) VALUES (?, ?, ?, ?, ?)',
+                key + tuple(json.dumps(profile[name]) if profile[name] is not None else None
+                            for name in PROFILE_FIELDS) + (profile['updated_at'],)
+            )
+            self._remember(key, profile)
+            self.stats['writes'] += 1
+            return dict(profile)
+
+    def delete(self, user_id, device_id=DEFAULT_DEVICE):
+        """Forget one user's profile on one device"""
+        key = (user_id, device_id or DEFAULT_DEVICE)
+        with self._lock:
+            self._db.execute('DELETE FROM calibration_profiles WHERE user_id = ? AND device_id = ?', key)
+            self._remember(key, None)
+            self.stats['deletes'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            count = self._db.execute('SELECT COUNT(*) FROM calibration_profiles').fetchone()[0]
+            return {
+                'path': self.path,
+                'profiles': count,
+                'cached': len(self._cache),
+                **self.stats
+            }
+
+
+def create_profile_store():
+    """Calibration profile store configured from the environment"""
+    return CalibrationProfileStore(
+        path=os.getenv('CALIBRATION_DB', 'calibration_profiles.db'),
+        cache_size=int(os.getenv('CALIBRATION_CACHE_SIZE', 1024))
+    )
@@ -0,0 +1,174 @@
+"""
+Server-side catalog search.
+
+Item metadata (catalog.json) is loaded once into inverted indexes: for every
+facet value (category, colour, fabric, collection, price band) and every
+search token, the array of item positions that carry it. A query ORs the
+values within a facet, ANDs facets and prefix-matched tokens as boolean masks,
+and reads the page straight out of a pre-sorted order, so filtering, facet
+counts and pagination are a handful of NumPy operations however large the
+catalog gets.
+"""
+
+import bisect
+import json
+import os
+import re
+
+import numpy as np
+
+DEFAULT_CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json')
+
+FACETS = ('category', 'colour', 'fabric', 'collection', 'price_band')
+SORTS = ('featured', 'price_asc', 'price_desc', 'rating', 'name')
+TEXT_FIELDS = ('name', 'description', 'category', 'colour', 'fabric', 'collection')
+DEFAULT_PER_PAGE = 24
+MAX_PER_PAGE = 100
+
+TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return TOKEN.findall(str(text).lower())
+
+
+def price_band(price, bands):
+    """Id of the first band whose [min, max) range holds the price, or None"""
+    for band in bands:
+        if band.get('min', 0) <= price < band.get('max', float('inf')):
+            return band['id']
+    return None
+
+
+class CatalogService:
+    """Filtered, paginated catalog search over in-memory inverted indexes"""
+
+    def __init__(self, items, price_bands=()):
+        self.price_bands = list(price_bands)
+        self.items = []
+        for item in items:
+            item = dict(item)
+            item['price_band'] = price_band(item.get('price', 0), self.price_bands)
+            self.items.append(item)
+        self._positions = {item['sku']: i for i, item in enumerate(self.items)}
+
+        # Facet value -> integer code per item, so masks and counts are array operations
+        self._values = {}
+        self._lookup = {}
+        self._codes = {}
+        for facet in FACETS:
+            values = sorted({str(item[facet]).lower() for item in self.items if item.get(facet) is not None})
+            lookup = {value: code for code, value in enumerate(values)}
+            self._values[facet] = values
+            self._lookup[facet] = lookup
+            self._codes[facet] = np.array([lookup.get(str(item.get(facet)).lower(), -1) for item in self.items],
+                                          dtype=np.int32)
+
+        # Token -> positions of the items containing it; sorted tokens for prefix lookups
+        postings = {}
+        for i, item in enumerate(self.items):
+            words = [word for field in TEXT_FIELDS for word in tokenize(item.get(field, ''))]
+            words += [word for tag in item.get('tags', ()) for word in tokenize(tag)]
+            for word in set(words):
+                postings.setdefault(word, []).append(i)
+        self._tokens = sorted(postings)
+        self._postings = [np.array(postings[token], dtype=np.int32) for token in self._tokens]
+
+        # Every sort order computed once; a query only masks and slices one of them
+        count = len(self.items)
+        prices = np.array([item.get('price', 0) for item in self.items], dtype=float)
+        ratings = np.array([item.get('rating', 0) for item in self.items], dtype=float)
+        names = [item.get('name', '').lower() for item in self.items]
+        self._orders = {
+            'featured': np.arange(count),
+            'price_asc': np.argsort(prices, kind='stable'),
+            'price_desc': np.argsort(-prices, kind='stable'),
+            'rating': np.argsort(-ratings, kind='stable'),
+            'name': np.array(sorted(range(count), key=names.__getitem__), dtype=np.int64)
+        }
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_CATALOG_FILE):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['items'], data.get('price_bands', ()))
+
+    def get(self, sku):
+        position = self._positions.get(sku)
+        return None if position is None else self.items[position]
+
+    def _facet_mask(self, facet, values):
+        """Items matching any of the values of one facet"""
+        lookup = self._lookup[facet]
+        codes = [lookup[value] for value in (str(v).lower() for v in values) if value in lookup]
+        return np.isin(self._codes[facet], codes)
+
+    def _text_mask(self, query):
+        """Items containing every query word (as a prefix, so partial words match while typing)"""
+        mask = np.ones(len(self.items), dtype=bool)
+        for word in tokenize(query):
+            start = bisect.bisect_left(self._tokens, word)
+            end = bisect.bisect_left(self._tokens, word + '\uffff')
+            matches = np.zeros(len(self.items), dtype=bool)
+            for postings in self._postings[start:end]:
+                matches[postings] = True
+            mask &= matches
+        return mask
+
+    def search(self, query='', filters=None, sort='featured', page=1, per_page=DEFAULT_PER_PAGE):
+        """One page of matching items plus per-facet counts
+
+        filters maps a facet to a value or a list of values (ORed); facets are
+        ANDed with each other and with the query words. Facet counts ignore the
+        facet's own filter, so clients can show how many items each
+        alternative value would give.
+        """
+        if sort not in self._orders:
+            raise ValueError(f"Unknown sort: {sort} (expected one of {', '.join(SORTS)})")
+        page = max(1, int(page))
+        per_page = min(max(1, int(per_page)), MAX_PER_PAGE)
+        filters = {facet: values if isinstance(values, (list, tuple)) else [values]
+                   for facet, values in (filters or {}).items() if values not in (None, '', [])}
+        for facet in filters:
+            if facet not in FACETS:
+                raise ValueError(f"Unknown filter: {facet} (expected one of {', '.join(FACETS)})")
+
+        base = self._text_mask(query) if query else np.ones(len(self.items), dtype=bool)
+        facet_masks = {facet: self._facet_mask(facet, values) for facet, values in filters.items()}
+        mask = base.copy()
+        for facet_mask in facet_masks.values():
+            mask &= facet_mask
+
+        facets = {}
+        for facet in FACETS:
+            others = base.copy()
+            for other, facet_mask in facet_masks.items():
+                if other != facet:
+                    others &= facet_mask
+            codes = self._codes[facet][others]
+            counts = np.bincount(codes[codes >= 0], minlength=len(self._values[facet]))
+            facets[facet] = {value: int(n) for value, n in zip(self._values[facet], counts) if n}
+
+        order = self._orders[sort]
+        matches = order[mask[order]]
+        start = (page - 1) * per_page
+        return {
+            'items': [self.items[i] for i in matches[start:start + per_page]],
+            'total': int(len(matches)),
+            'page': page,
+            'per_page': per_page,
+            'pages': -(-len(matches) // per_page),
+            'facets': facets
+        }
+
+    def snapshot(self):
+        return {
+            'items': len(self.items),
+            'tokens': len(self._tokens),
+            'facets': {facet: len(values) for facet, values in self._values.items()}
+        }
+
+
+def create_catalog_service():
+    """Catalog loaded from CATALOG_FILE (defaults to the bundled catalog.json)"""
+    return CatalogService.from_file(os.getenv('CATALOG_FILE', DEFAULT_CATALOG_FILE))
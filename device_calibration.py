@@ -0,0 +1,146 @@
+"""
+Learned device calibration table.
+
+When a user confirms a calibration (manual px/cm or a multiplier), the
+resulting multiplier over the reference calibration is recorded under
+(capture resolution, display size bucket, device pixel ratio, device class).
+The table is held in memory and persisted to SQLite, so a new session with a
+known setup resolves its multiplier with one dict lookup when its display
+calibration arrives; unseen capture resolutions are interpolated from the
+nearest known ones for the same kind of display.
+"""
+
+import bisect
+import os
+import sqlite3
+import threading
+import time
+
+DISPLAY_BUCKET = 160    # Display widths are grouped in buckets of this many CSS pixels
+MULTIPLIER_RANGE = (0.3, 3.0)  # Confirmed multipliers outside this range are ignored
+# Multiplier over the reference calibration for setups nobody has confirmed yet. It was
+# measured on the reference webcam setup and, like the learned entries, is not scaled
+# by capture resolution (see DEVICE_CALIBRATION_DEFAULT_MULTIPLIER)
+DEFAULT_MULTIPLIER = 1 / 1.13
+
+
+def device_class(display):
+    """'mobile', 'tablet' or 'desktop' from the reported screen size (or the client's own label)"""
+    if display.get('device_class'):
+        return str(display['device_class'])
+    width = min(display.get('screen_width') or 0, display.get('screen_height') or 0) or display.get('screen_width') or 0
+    if width < 600:
+        return 'mobile'
+    if width < 1000:
+        return 'tablet'
+    return 'desktop'
+
+
+def display_group(display):
+    """(display bucket, DPR, device class) shared by entries that may be interpolated"""
+    bucket = int(round((display.get('display_width') or 0) / DISPLAY_BUCKET)) * DISPLAY_BUCKET
+    dpr = round(float(display.get('device_pixel_ratio') or 1) * 4) / 4
+    return bucket, dpr, device_class(display)
+
+
+class DeviceCalibrationTable:
+    """In-memory table of confirmed calibration multipliers with SQLite persistence"""
+
+    def __init__(self, path='calibration_profiles.db', min_samples=1, default_multiplier=DEFAULT_MULTIPLIER):
+        self.path = path
+        self.min_samples = min_samples
+        self.default_multiplier = default_multiplier
+        self._entries = {}  # (width, height) + display group -> {'multiplier', 'samples'}
+        self._by_group = {}  # display group -> sorted [(width, height)] for interpolation
+        self._lock = threading.Lock()
+        self.stats = {'exact': 0, 'interpolated': 0, 'unknown': 0, 'recorded': 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS device_calibration ('
+            ' capture_width INTEGER NOT NULL,'
+            ' capture_height INTEGER NOT NULL,'
+            ' display_bucket INTEGER NOT NULL,'
+            ' device_pixel_ratio REAL NOT NULL,'
+            ' device_class TEXT NOT NULL,'
+            ' multiplier REAL NOT NULL,'
+            ' samples INTEGER NOT NULL,'
+            ' updated_at REAL NOT NULL,'
+            ' PRIMARY KEY (capture_width, capture_height, display_bucket, device_pixel_ratio, device_class))'
+        )
+        for row in self._db.execute('SELECT capture_width, capture_height, display_bucket, device_pixel_ratio,'
+                                    ' device_class, multiplier, samples FROM device_calibration'):
+            self._store((row[0], row[1]) + (row[2], row[3], row[4]), row[5], row[6])
+        if self._entries:
+            print(f"📐 Device calibration table: {len(self._entries)} setups loaded from {path}")
+
+    def _store(self, key, multiplier, samples):
+        if key not in self._entries:
+            bisect.insort(self._by_group.setdefault(key[2:], []), key[:2])
+        self._entries[key] = {'multiplier': multiplier, 'samples': samples}
+
+    def resolve(self, width, height, display):
+        """Learned multiplier for a capture resolution on a display, or None if nothing is known"""
+        group = display_group(display)
+        with self._lock:
+            entry = self._entries.get((width, height) + group)
+            if entry and entry['samples'] >= self.min_samples:
+                self.stats['exact'] += 1
+                return entry['multiplier']
+            multiplier = self._interpolate(width, height, group)
+            self.stats['interpolated' if multiplier else 'unknown'] += 1
+            return multiplier
+
+    def _interpolate(self, width, height, group):
+        """Linear in capture width between the nearest known resolutions of the same display group"""
+        known = [size for size in self._by_group.get(group, ())
+                 if self._entries[size + group]['samples'] >= self.min_samples]
+        if not known:
+            return None
+        index = bisect.bisect_left(known, (width, height))
+        below = known[index - 1] if index > 0 else None
+        above = known[index] if index < len(known) else None
+        if below is None or above is None or above[0] == below[0]:
+            return self._entries[(below or above) + group]['multiplier']
+        low = self._entries[below + group]['multiplier']
+        high = self._entries[above + group]['multiplier']
+        weight = (width - below[0]) / (above[0] - below[0])
+        return low + (high - low) * weight
+
+    def record(self, width, height, display, multiplier):
+        """Fold one confirmed calibration into the table (running mean per setup)"""
+        if not MULTIPLIER_RANGE[0] <= multiplier <= MULTIPLIER_RANGE[1]:
+            return None
+        key = (int(width), int(height)) + display_group(display)
+        with self._lock:
+            entry = self._entries.get(key)
+            samples = (entry['samples'] if entry else 0) + 1
+            mean = multiplier if entry is None else entry['multiplier'] + (multiplier - entry['multiplier']) / samples
+            self._db.execute(
+                'INSERT OR REPLACE INTO device_calibration (capture_width, capture_height, display_bucket,'
+                ' device_pixel_ratio, device_class, multiplier, samples, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                key + (mean, samples, time.time())
+            )
+            self._store(key, mean, samples)
+            self.stats['recorded'] += 1
+            return mean
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'setups': len(self._entries),
+                'display_groups': len(self._by_group),
+                'default_multiplier': round(self.default_multiplier, 4),
+                **self.stats
+            }
+
+
+def create_device_calibration_table():
+    """Device calibration table stored next to the calibration profiles"""
+    return DeviceCalibrationTable(
+        path=os.getenv('CALIBRATION_DB', 'calibration_profiles.db'),
+        min_samples=int(os.getenv('DEVICE_CALIBRATION_MIN_SAMPLES', 1)),
+        default_multiplier=float(os.getenv('DEVICE_CALIBRATION_DEFAULT_MULTIPLIER', DEFAULT_MULTIPLIER))
+    )
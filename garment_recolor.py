@@ -0,0 +1,261 @@
+"""
+Colourways of catalog garments rendered on demand.
+
+Each garment is decoded once into HSV with a foreground mask and the median
+hue, saturation and value of its fabric. Photographed garments stand in front
+of walls and scenery the border-colour mask cannot remove, so the garment
+itself is cut out with GrabCut seeded from the middle of the frame, and only
+fabric-coloured pixels inside it are recoloured. A colourway is one 256-entry lookup
+table per HSV channel that moves those medians onto the target colour: hue is
+rotated (or set, for unsaturated fabrics) and saturation and value are
+gamma-mapped so folds and shading keep their relative brightness. The table
+is applied to the whole image with a single cv2.LUT call, the background is
+restored from the mask, and rendered variants are kept in an LRU cache so a
+colourway is only rendered once while it is popular.
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from tryon_preprocess import decode_image, encode_jpeg, flatten_alpha, foreground_mask
+
+# Named colourways; any '#rrggbb' is accepted too
+COLOURS = {
+    'black': (30, 30, 34),
+    'white': (242, 242, 238),
+    'grey': (128, 128, 128),
+    'navy': (30, 44, 92),
+    'blue': (52, 94, 196),
+    'sky': (135, 196, 235),
+    'teal': (0, 128, 128),
+    'green': (46, 139, 87),
+    'olive': (112, 118, 40),
+    'mint': (152, 224, 170),
+    'yellow': (240, 200, 40),
+    'gold': (212, 168, 55),
+    'orange': (232, 118, 36),
+    'red': (200, 30, 45),
+    'maroon': (118, 18, 32),
+    'pink': (238, 140, 170),
+    'purple': (112, 48, 160),
+    'lavender': (190, 170, 230)
+}
+
+# Fabric with median saturation below this is treated as white/grey/black (no usable hue)
+NEUTRAL_SATURATION = 40
+# Pixels within this many hue steps (of 180) of the fabric are fully recoloured, fading out over FEATHER more
+HUE_TOLERANCE = 12
+VALUE_TOLERANCE = 60
+FEATHER = 8
+# GrabCut runs on a downscaled copy: the region only has to be roughly right, the fabric mask adds the detail
+SEGMENT_MAX_SIDE = 256
+SEGMENT_ITERATIONS = 5
+
+
+def parse_colour(colour):
+    """(name, (r, g, b)) for a colour name or '#rrggbb'; raises ValueError"""
+    name = str(colour).strip().lower()
+    if name in COLOURS:
+        return name, COLOURS[name]
+    hex_digits = name.lstrip('#')
+    if len(hex_digits) == 6:
+        try:
+            return '#' + hex_digits, tuple(int(hex_digits[i:i + 2], 16) for i in (0, 2, 4))
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown colour: {colour} (use #rrggbb or one of {', '.join(COLOURS)})")
+
+
+def gamma_curve(source, target):
+    """0..255 curve through (0, 0), (source, target) and (255, 255)"""
+    source = min(max(source, 1.0), 254.0) / 255.0
+    target = min(max(target, 1.0), 254.0) / 255.0
+    exponent = min(max(math.log(target) / math.log(source), 0.05), 20.0)
+    return 255.0 * (np.arange(256) / 255.0) ** exponent
+
+
+def garment_region(bgr, foreground):
+    """Boolean (H, W) mask of the garment in the middle of the frame
+
+    GrabCut starts from the frame border as background, a box over the middle
+    as probable garment and the central fifth as certain garment; of what it
+    keeps, only the connected piece around the centre counts, so wall and
+    floor patches that happen to match the fabric stay untouched.
+    """
+    height, width = foreground.shape
+    scale = min(1.0, SEGMENT_MAX_SIDE / max(height, width))
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    small = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+    inside = cv2.resize(foreground.astype(np.uint8), size, interpolation=cv2.INTER_NEAREST) > 0
+    w, h = size
+    core = np.zeros((h, w), bool)
+    core[h * 2 // 5:h * 3 // 5, w * 2 // 5:w * 3 // 5] = True
+    core &= inside
+    if not core.any():
+        # Nothing in the middle of the frame to start from: keep the whole foreground
+        return foreground
+    mask = np.full((h, w), cv2.GC_PR_BGD, np.uint8)
+    mask[h // 20:h - h // 20, w * 3 // 20:w - w * 3 // 20] = cv2.GC_PR_FGD
+    mask[~inside] = cv2.GC_BGD
+    border = max(2, round(0.02 * max(w, h)))
+    mask[:border] = mask[-border:] = cv2.GC_BGD
+    mask[:, :border] = mask[:, -border:] = cv2.GC_BGD
+    mask[core] = cv2.GC_FGD
+    models = np.zeros((1, 65), np.float64), np.zeros((1, 65), np.float64)
+    cv2.grabCut(small, mask, None, *models, SEGMENT_ITERATIONS, cv2.GC_INIT_WITH_MASK)
+    kept = ((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD)).astype(np.uint8)
+    _, labels = cv2.connectedComponents(kept, connectivity=8)
+    centre = np.bincount(labels[core & (kept > 0)]).argmax()
+    region = (labels == centre).astype(np.uint8)
+    return cv2.resize(region, (width, height), interpolation=cv2.INTER_NEAREST) > 0
+
+
+def fabric_colour(hsv, foreground):
+    """Median fabric hue/saturation/value and a soft (H, W, 1) mask of the pixels that share them
+
+    The fabric colour is sampled from the middle of the foreground, where the
+    garment is, and only foreground pixels close to that colour are recoloured
+    so trims, skin and embroidery keep theirs.
+    """
+    height, width = hsv.shape[:2]
+    centre = np.zeros_like(foreground)
+    centre[height // 4:height * 3 // 4, width // 4:width * 3 // 4] = True
+    sample = hsv[foreground & centre]
+    if len(sample) == 0:
+        sample = hsv[height // 4:height * 3 // 4, width // 4:width * 3 // 4].reshape(-1, 3)
+    saturation = float(np.median(sample[:, 1]))
+    value = float(np.median(sample[:, 2]))
+    if saturation >= NEUTRAL_SATURATION:
+        # Hue is circular: take the most common hue of the coloured pixels rather than a median across the wrap
+        coloured = sample[sample[:, 1] >= NEUTRAL_SATURATION]
+        hue = float(np.argmax(np.bincount(coloured[:, 0], minlength=180)))
+        distance = np.abs(hsv[:, :, 0].astype(np.float32) - hue)
+        distance = np.minimum(distance, 180 - distance) - HUE_TOLERANCE
+        gate = np.clip((hsv[:, :, 1].astype(np.float32) - NEUTRAL_SATURATION / 2) / (NEUTRAL_SATURATION / 2), 0, 1)
+    else:
+        hue = 0.0
+        distance = np.abs(hsv[:, :, 2].astype(np.float32) - value) - VALUE_TOLERANCE
+        gate = np.clip((NEUTRAL_SATURATION * 1.5 - hsv[:, :, 1].astype(np.float32)) / NEUTRAL_SATURATION, 0, 1)
+    alpha = np.clip(1 - distance / FEATHER, 0, 1) * gate * foreground
+    alpha = cv2.GaussianBlur(alpha.astype(np.float32), (5, 5), 0)
+    return {'hue': hue, 'saturation': saturation, 'value': value, 'alpha': alpha[:, :, None]}
+
+
+def colourway_lut(base, rgb):
+    """(1, 256, 3) HSV lookup table moving a garment's median colour onto rgb"""
+    target = cv2.cvtColor(np.uint8([[rgb[::-1]]]), cv2.COLOR_BGR2HSV)[0, 0].astype(float)
+    levels = np.arange(256, dtype=float)
+    if base['saturation'] >= NEUTRAL_SATURATION:
+        hue = (levels + target[0] - base['hue']) % 180
+        saturation = gamma_curve(base['saturation'], target[1])
+    else:
+        # White/grey fabric has no hue to rotate: dye it, keeping its small saturation variations
+        hue = np.full(256, target[0])
+        saturation = target[1] + (levels - base['saturation'])
+    value = gamma_curve(base['value'], target[2])
+    lut = np.stack([hue, saturation, value], axis=-1)
+    return np.clip(np.rint(lut), 0, 255).astype(np.uint8).reshape(1, 256, 3)
+
+
+class GarmentRecolorer:
+    """Renders registry garments in other colours, with an LRU cache of encoded variants"""
+
+    def __init__(self, registry, cache_size=256, jpeg_quality=90):
+        self.registry = registry
+        self.cache_size = cache_size
+        self.jpeg_quality = jpeg_quality
+        self._bases = OrderedDict()     # (garment id, sha256) -> decoded image, fabric colour and mask
+        self._luts = OrderedDict()      # (garment id, sha256, colour) -> lookup table
+        self._variants = OrderedDict()  # (garment id, sha256, colour) -> JPEG bytes
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'renders': 0}
+
+    def _cached(self, cache, key):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _store(self, cache, key, value, limit):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > limit:
+                cache.popitem(last=False)
+
+    def _base(self, garment):
+        """Decoded garment with its fabric colour and recolouring mask"""
+        key = (garment.garment_id, garment.sha256)
+        base = self._cached(self._bases, key)
+        if base is None:
+            image = decode_image(garment.content, keep_alpha=True)
+            if image is None:
+                raise ValueError(f"Unreadable garment image: {garment.garment_id}")
+            bgr = flatten_alpha(image)
+            hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+            foreground = foreground_mask(image)
+            foreground &= garment_region(bgr, foreground)
+            base = {'bgr': bgr, 'hsv': hsv, **fabric_colour(hsv, foreground)}
+            self._store(self._bases, key, base, self.cache_size)
+        return base
+
+    def lut(self, garment, colour):
+        """Cached lookup table for one garment in one colour"""
+        name, rgb = parse_colour(colour)
+        key = (garment.garment_id, garment.sha256, name)
+        lut = self._cached(self._luts, key)
+        if lut is None:
+            lut = colourway_lut(self._base(garment), rgb)
+            self._store(self._luts, key, lut, self.cache_size * 4)
+        return lut
+
+    def render(self, garment, colour):
+        """JPEG bytes of a garment in a colour (from the cache when it was rendered before)"""
+        name, _ = parse_colour(colour)
+        key = (garment.garment_id, garment.sha256, name)
+        content = self._cached(self._variants, key)
+        if content is not None:
+            self.stats['hits'] += 1
+            return content
+        self.stats['misses'] += 1
+        base = self._base(garment)
+        recoloured = cv2.cvtColor(cv2.LUT(base['hsv'], self.lut(garment, name)), cv2.COLOR_HSV2BGR)
+        blended = base['bgr'] + (recoloured.astype(np.float32) - base['bgr']) * base['alpha']
+        content = encode_jpeg(blended.astype(np.uint8), self.jpeg_quality)
+        self._store(self._variants, key, content, self.cache_size)
+        self.stats['renders'] += 1
+        return content
+
+    def render_by_id(self, garment_id, colour):
+        """(garment, JPEG bytes) for a registry garment id, or (None, None) if unknown"""
+        garment = self.registry.get(garment_id)
+        if garment is None:
+            return None, None
+        return garment, self.render(garment, colour)
+
+    def snapshot(self):
+        with self._lock:
+            cached = len(self._variants)
+            cached_bytes = sum(len(content) for content in self._variants.values())
+        return {
+            'cache_size': self.cache_size,
+            'cached_variants': cached,
+            'cached_bytes': cached_bytes,
+            'colours': len(COLOURS),
+            **self.stats
+        }
+
+
+def create_garment_recolorer(registry):
+    """Recolorer over the garment registry, configured from the environment"""
+    return GarmentRecolorer(
+        registry,
+        cache_size=int(os.getenv('GARMENT_RECOLOR_CACHE_SIZE', 256)),
+        jpeg_quality=int(os.getenv('TRYON_JPEG_QUALITY', 90))
+    )
@@ -0,0 +1,100 @@
+"""
+Server-side registry of catalog garments.
+
+Catalog images are loaded once at startup, normalised for the try-on
+provider (trimmed, downscaled, JPEG) and kept in memory with their hashes,
+so clients reference a garment by id instead of re-uploading it and the
+result cache sees identical bytes for identical garments.
+"""
+
+import hashlib
+import os
+import threading
+
+GARMENT_EXTENSIONS = ('.png', '.webp', '.jpg', '.jpeg')
+
+# Images in the catalog directory that are not garments
+NON_GARMENT_IMAGES = ('profile',)
+
+
+class Garment:
+    """A normalised catalog garment held in memory"""
+
+    def __init__(self, garment_id, filename, content, extension, original_bytes):
+        self.garment_id = garment_id
+        self.filename = filename
+        self.name = garment_id.replace('_', ' ').replace('-', ' ').title()
+        self.content = content
+        self.extension = extension
+        self.original_bytes = original_bytes
+        self.sha256 = hashlib.sha256(content).hexdigest()
+
+    def to_dict(self):
+        return {
+            'garment_id': self.garment_id,
+            'name': self.name,
+            'filename': self.filename,
+            'bytes': len(self.content),
+            'original_bytes': self.original_bytes,
+            'sha256': self.sha256
+        }
+
+
+class GarmentRegistry:
+    """Catalog garments by id, normalised once with the try-on pre-processor"""
+
+    def __init__(self, directory, preprocessor=None):
+        self.directory = directory
+        self.preprocessor = preprocessor
+        self._garments = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """(Re)load every garment image in the catalog directory"""
+        garments = {}
+        if not os.path.isdir(self.directory):
+            print(f"⚠️ Garment catalog directory not found: {self.directory}")
+        else:
+            for filename in sorted(os.listdir(self.directory)):
+                garment_id, extension = os.path.splitext(filename)
+                if extension.lower() not in GARMENT_EXTENSIONS or garment_id in NON_GARMENT_IMAGES:
+                    continue
+                try:
+                    garments[garment_id] = self._load_garment(garment_id, filename)
+                except Exception as e:
+                    print(f"⚠️ Could not load garment {filename}: {e}")
+
+        with self._lock:
+            self._garments = garments
+        saved = sum(g.original_bytes - len(g.content) for g in garments.values())
+        print(f"👕 Garment registry: {len(garments)} garments loaded from {self.directory} ({saved / 1e3:.0f} KB saved by normalising)")
+
+    def _load_garment(self, garment_id, filename):
+        with open(os.path.join(self.directory, filename), 'rb') as f:
+            data = f.read()
+        extension = os.path.splitext(filename)[1].lower()
+        if self.preprocessor:
+            content, report = self.preprocessor.prepare_garment(data)
+            if report['re_encoded']:
+                extension = '.jpg'
+        else:
+            content = data
+        return Garment(garment_id, filename, content, '.jpg' if extension == '.jpeg' else extension, len(data))
+
+    def get(self, garment_id):
+        with self._lock:
+            return self._garments.get(garment_id)
+
+    def list(self):
+        with self._lock:
+            return [garment.to_dict() for garment in self._garments.values()]
+
+    def snapshot(self):
+        with self._lock:
+            garments = list(self._garments.values())
+        return {
+            'garments': len(garments),
+            'bytes': sum(len(g.content) for g in garments),
+            'original_bytes': sum(g.original_bytes for g in garments)
+        }
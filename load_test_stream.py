@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Load test for the Socket.IO measurement stream.
+
+Simulates N browser clients streaming JPEG frames over `process_frame` at a
+configurable FPS and resolution, the way live-tryon.html does: open loop, one
+frame per interval, slowing down when the server sends `throttle`. Replies are
+matched to frames by `frame_id`, giving round-trip latency percentiles,
+achieved throughput, frames dropped by admission control, error events and
+frames that never got an answer.
+
+Soak mode (--duration 4h --report-every 60) prints a line per interval and
+samples the server's RSS and open file descriptors, then fits their growth per
+hour after a warm-up so slow leaks show up. Latencies go into fixed log-scale
+histograms, so the harness itself uses constant memory however long it runs.
+
+By default the app runs in-process through the Flask-SocketIO test client
+(the handler runs in the sending thread, so latency is handler time). Pass
+--url (and --pid for resource sampling) to load a running server over the
+network; install `websocket-client` for the WebSocket transport, otherwise
+python-socketio falls back to long polling.
+"""
+
+import argparse
+import base64
+import bisect
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from benchmark_tryon import read_rss_kb
+from test_api_resolution import create_test_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+# Growth fitted over less time than this is too noisy to call a leak
+MIN_LEAK_SPAN = 600
+
+
+def parse_duration(value):
+    """Seconds from '90', '90s', '15m', '4h' or '1h30m'"""
+    parts = re.findall(r'(\d+(?:\.\d+)?)([hms]?)', value.strip().lower())
+    if not parts or ''.join(n + u for n, u in parts) != value.strip().lower():
+        raise argparse.ArgumentTypeError(f"Invalid duration: {value}")
+    return sum(float(n) * {'h': 3600, 'm': 60, 's': 1, '': 1}[u] for n, u in parts)
+
+
+def count_fds(pid='self'):
+    """Open file descriptors of a process, or None where /proc is unavailable"""
+    try:
+        return len(os.listdir(f'/proc/{pid}/fd'))
+    except OSError:
+        return None
+
+
+def growth_per_hour(samples, key, warmup):
+    """Least-squares slope of a sampled value per hour, ignoring samples taken during warm-up"""
+    points = [(s['elapsed'], s[key]) for s in samples if s['elapsed'] >= warmup and s[key] is not None]
+    if len(points) < 3:
+        return None
+    t, v = np.array(points, dtype=float).T
+    if t[-1] - t[0] <= 0:
+        return None
+    return float(np.polyfit(t, v, 1)[0] * 3600)
+
+
+class LatencyHistogram:
+    """Log-spaced latency buckets (0.1 ms to 2 min, ~2% wide); constant memory percentiles"""
+
+    EDGES = [1e-4 * 1.02 ** i for i in range(int(math.log(1200 / 1e-4) / math.log(1.02)) + 2)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.EDGES) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.EDGES, seconds)] += 1
+        self.total += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct):
+        """Upper edge of the bucket holding the pct-th latency, in seconds"""
+        if not self.total:
+            return None
+        rank = max(1, int(math.ceil(pct / 100.0 * self.total)))
+        running = 0
+        for i, count in enumerate(self.counts):
+            running += count
+            if running >= rank:
+                return min(self.EDGES[i] if i < len(self.EDGES) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            'p50': ms(self.percentile(50)),
+            'p95': ms(self.percentile(95)),
+            'p99': ms(self.percentile(99)),
+            'max': ms(self.max if self.total else None)
+        }
+
+
+class Recorder:
+    """Frame outcomes shared by all clients: run totals plus the current report window"""
+
+    OUTCOMES = ('processed', 'dropped', 'errors', 'lost', 'skipped')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.totals = Counter()
+        self.latency = LatencyHistogram()
+        self.tiers = Counter()
+        self.error_messages = Counter()
+        self._window = Counter()
+        self._window_latency = LatencyHistogram()
+
+    def record_sent(self):
+        with self._lock:
+            self.sent += 1
+            self._window['sent'] += 1
+
+    def record(self, outcome, latency=None, tier=None, message=None):
+        with self._lock:
+            self.totals[outcome] += 1
+            self._window[outcome] += 1
+            if latency is not None:
+                self.latency.add(latency)
+                self._window_latency.add(latency)
+            if tier:
+                self.tiers[tier] += 1
+            if message:
+                self.error_messages[message[:120]] += 1
+
+    def take_window(self):
+        """Counts and latency histogram since the previous call"""
+        with self._lock:
+            window, latency = self._window, self._window_latency
+            self._window, self._window_latency = Counter(), LatencyHistogram()
+        return window, latency
+
+
+class InProcessConnection:
+    """A Socket.IO test client on the in-process app; events are handled synchronously on emit"""
+
+    def __init__(self, session_id, on_event):
+        import streaming_api
+        self.on_event = on_event
+        self.client = streaming_api.socketio.test_client(streaming_api.app, auth={'session_id': session_id})
+        if not self.client.is_connected():
+            raise RuntimeError('Socket.IO connection refused')
+
+    def send(self, payload):
+        self.client.emit('process_frame', payload)
+        received_at = time.perf_counter()
+        for event in self.client.get_received():
+            self.on_event(event['name'], event['args'][0] if event['args'] else {}, received_at)
+
+    def close(self):
+        if self.client.is_connected():
+            self.client.disconnect()
+
+
+class RemoteConnection:
+    """A python-socketio client connected to a running server; events arrive on its own thread"""
+
+    def __init__(self, url, session_id, on_event, timeout):
+        import socketio
+        self.sio = socketio.Client(reconnection=False)
+        for name in ('processed_frame', 'throttle', 'error'):
+            self.sio.on(name, lambda data=None, name=name: on_event(name, data or {}, time.perf_counter()))
+        self.sio.connect(url, auth={'session_id': session_id}, wait_timeout=timeout)
+
+    def send(self, payload):
+        self.sio.emit('process_frame', payload)
+
+    def close(self):
+        self.sio.disconnect()
+
+
+class StreamClient(threading.Thread):
+    """One simulated viewer: sends frames at its FPS, honours throttling, tracks unanswered frames"""
+
+    def __init__(self, index, connect, frames, recorder, args, stop_event):
+        super().__init__(daemon=True, name=f'stream-client-{index}')
+        self.index = index
+        self.frames = frames
+        self.recorder = recorder
+        self.args = args
+        self.stop_event = stop_event
+        self.interval = 1.0 / args.fps
+        self._pending = {}  # frame id -> perf_counter at send
+        self._lock = threading.Lock()
+        self.connection = connect(f'load-{os.getpid()}-{index}', self.on_event)
+
+    def on_event(self, name, data, received_at):
+        frame_id = data.get('frame_id') if isinstance(data, dict) else None
+        with self._lock:
+            sent_at = self._pending.pop(frame_id, None)
+        if name == 'throttle' and not self.args.ignore_throttle:
+            # Same back-off as live-tryon.html
+            self.interval = 1.0 / data['max_fps'] if data.get('max_fps') else 1.0 / self.args.fps
+        if sent_at is None:
+            return  # Advisory throttle, or a reply to a frame already counted as lost
+        if name == 'processed_frame':
+            if data.get('quality_tier') == 'normal':
+                self.interval = 1.0 / self.args.fps
+            self.recorder.record('processed', received_at - sent_at, tier=data.get('quality_tier'))
+        elif name == 'throttle':
+            self.recorder.record('dropped')
+        else:
+            self.recorder.record('errors', message=data.get('message'))
+
+    def _expire(self, now):
+        with self._lock:
+            expired = [frame_id for frame_id, sent_at in self._pending.items() if now - sent_at > self.args.timeout]
+            for frame_id in expired:
+                del self._pending[frame_id]
+        for _ in expired:
+            self.recorder.record('lost')
+
+    def run(self):
+        sequence = 0
+        # Stagger clients across the first interval so they do not send in lockstep
+        next_due = time.perf_counter() + self.interval * self.index / max(1, self.args.clients)
+        while not self.stop_event.is_set():
+            delay = next_due - time.perf_counter()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+            now = time.perf_counter()
+            next_due = max(next_due + self.interval, now)
+            self._expire(now)
+            with self._lock:
+                in_flight = len(self._pending)
+            if in_flight >= self.args.max_in_flight:
+                self.recorder.record('skipped')  # Client-side backpressure, like a browser tab falling behind
+                continue
+            frame_id = f'{self.index}-{sequence}'
+            payload = {'frame': self.frames[sequence % len(self.frames)], 'frame_id': frame_id}
+            sequence += 1
+            with self._lock:
+                self._pending[frame_id] = time.perf_counter()
+            self.recorder.record_sent()
+            try:
+                self.connection.send(payload)
+            except Exception as e:
+                with self._lock:
+                    self._pending.pop(frame_id, None)
+                self.recorder.record('errors', message=f'send failed: {e}')
+
+    def finish(self, grace):
+        """Wait up to grace seconds for replies, count the rest as lost and disconnect"""
+        deadline = time.perf_counter() + grace
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if not self._pending:
+                    break
+            time.sleep(0.05)
+        with self._lock:
+            lost = len(self._pending)
+            self._pending.clear()
+        for _ in range(lost):
+            self.recorder.record('lost')
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+def load_frames(args):
+    """Base64 JPEG frames at the requested resolution: recorded (image dir or video) or synthetic"""
+    images = []
+    if args.frames and os.path.isdir(args.frames):
+        for name in sorted(os.listdir(args.frames)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image = cv2.imread(os.path.join(args.frames, name))
+                if image is not None:
+                    images.append(image)
+    elif args.frames:
+        capture = cv2.VideoCapture(args.frames)
+        while len(images) < args.max_frames:
+            ok, image = capture.read()
+            if not ok:
+                break
+            images.append(image)
+        capture.release()
+    else:
+        # Synthetic figure drifting sideways, so consecutive frames differ a little
+        base, _ = create_test_image(args.width, args.height)
+        for shift in range(0, 60, 2):
+            images.append(np.roll(base, shift - 30, axis=1))
+    if not images:
+        raise SystemExit(f"❌ No frames could be read from {args.frames}")
+
+    frames = []
+    for image in images[:args.max_frames]:
+        if image.shape[1] != args.width or image.shape[0] != args.height:
+            image = cv2.resize(image, (args.width, args.height), interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+        frames.append(base64.b64encode(buffer).decode('utf-8'))
+    return frames
+
+
+def resource_sample(elapsed, pid):
+    return {
+        'elapsed': round(elapsed, 1),
+        'rss_kb': read_rss_kb(pid) if pid else None,
+        'fds': count_fds(pid) if pid else None,
+        'harness_rss_kb': read_rss_kb('self')
+    }
+
+
+def print_window(sample, window, latency, interval):
+    latency = latency.summary()
+    rss = f"{sample['rss_kb'] / 1024:.0f} MB" if sample['rss_kb'] else 'n/a'
+    print(f"⏱️  {sample['elapsed']:>8.0f}s  {window['processed'] / interval:6.1f} fps  "
+          f"p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+          f"dropped {window['dropped']}  errors {window['errors']}  lost {window['lost']}  skipped {window['skipped']}  "
+          f"RSS {rss}  fds {sample['fds'] if sample['fds'] is not None else 'n/a'}", flush=True)
+
+
+def summarise(recorder, samples, elapsed, args):
+    """Run totals, latency percentiles and resource growth"""
+    totals = recorder.totals
+    warmup = min(args.warmup, elapsed / 2)
+    rss = [s['rss_kb'] for s in samples if s['rss_kb']]
+    fds = [s['fds'] for s in samples if s['fds'] is not None]
+    rss_growth = growth_per_hour(samples, 'rss_kb', warmup)
+    fd_growth = growth_per_hour(samples, 'fds', warmup)
+    return {
+        'clients': args.clients,
+        'target_fps_per_client': args.fps,
+        'resolution': f'{args.width}x{args.height}',
+        'elapsed_s': round(elapsed, 1),
+        'frames': {'sent': recorder.sent, **{outcome: totals[outcome] for outcome in Recorder.OUTCOMES}},
+        'throughput_fps': round(totals['processed'] / elapsed, 2) if elapsed else None,
+        'offered_fps': round(args.clients * args.fps, 2),
+        'latency_ms': recorder.latency.summary(),
+        'quality_tiers': dict(recorder.tiers),
+        'error_messages': dict(recorder.error_messages.most_common(5)),
+        'resources': {
+            'rss_kb_start': rss[0] if rss else None,
+            'rss_kb_end': rss[-1] if rss else None,
+            'rss_kb_peak': max(rss) if rss else None,
+            'fds_start': fds[0] if fds else None,
+            'fds_end': fds[-1] if fds else None,
+            'warmup_s': round(warmup, 1),
+            'rss_mb_per_hour': round(rss_growth / 1024, 2) if rss_growth is not None else None,
+            'fds_per_hour': round(fd_growth, 2) if fd_growth is not None else None,
+            'harness_rss_kb_end': samples[-1]['harness_rss_kb'] if samples else None
+        }
+    }
+
+
+def leak_warnings(report, args):
+    """Soak-mode leak checks against the configured growth limits"""
+    resources = report['resources']
+    warnings = []
+    if resources['rss_mb_per_hour'] is not None and resources['rss_mb_per_hour'] > args.max_rss_growth:
+        warnings.append(f"RSS grows {resources['rss_mb_per_hour']} MB/hour (limit {args.max_rss_growth})")
+    if resources['fds_per_hour'] is not None and resources['fds_per_hour'] > args.max_fd_growth:
+        warnings.append(f"open file descriptors grow {resources['fds_per_hour']}/hour (limit {args.max_fd_growth})")
+    return warnings
+
+
+def print_report(report, warnings):
+    frames = report['frames']
+    latency = report['latency_ms']
+    resources = report['resources']
+    print("\n📊 Stream load test")
+    print(f"   Clients:     {report['clients']} x {report['target_fps_per_client']} fps at {report['resolution']} "
+          f"for {report['elapsed_s']}s (offered {report['offered_fps']} fps)")
+    print(f"   Frames:      {frames['sent']} sent, {frames['processed']} processed, {frames['dropped']} dropped by the server, "
+          f"{frames['errors']} errors, {frames['lost']} unanswered, {frames['skipped']} skipped by clients")
+    print(f"   Throughput:  {report['throughput_fps']} frames/s  tiers: {report['quality_tiers']}")
+    print(f"   Latency:     p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, max {latency['max']} ms")
+    if report['error_messages']:
+        print(f"   Errors:      {report['error_messages']}")
+    def per_hour(value, unit):
+        return f"{value:+} {unit}/hour after {resources['warmup_s']}s warm-up" if value is not None else 'run too short to fit growth'
+
+    if resources['rss_kb_start']:
+        print(f"   Memory:      RSS {resources['rss_kb_start'] / 1024:.0f} MB -> {resources['rss_kb_end'] / 1024:.0f} MB "
+              f"(peak {resources['rss_kb_peak'] / 1024:.0f} MB, {per_hour(resources['rss_mb_per_hour'], 'MB')})")
+    if resources['fds_start'] is not None:
+        print(f"   Files:       {resources['fds_start']} -> {resources['fds_end']} open descriptors "
+              f"({per_hour(resources['fds_per_hour'], 'fds')})")
+    for warning in warnings:
+        print(f"⚠️ Possible leak: {warning}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load and soak test the Socket.IO process_frame stream')
+    parser.add_argument('--clients', type=int, default=8, help='simulated streaming clients')
+    parser.add_argument('--fps', type=float, default=10, help='frames per second per client (live-tryon.html sends 10)')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--quality', type=int, default=80, help='JPEG quality of sent frames')
+    parser.add_argument('--frames', help='directory of images or a video file to stream instead of synthetic frames')
+    parser.add_argument('--max-frames', type=int, default=300, help='frames kept in memory from --frames')
+    parser.add_argument('--duration', type=parse_duration, default=30, help='run time, e.g. 60, 15m or 4h (soak mode)')
+    parser.add_argument('--report-every', type=parse_duration, default=10, help='seconds between progress lines and resource samples')
+    parser.add_argument('--warmup', type=parse_duration, default=60, help='seconds ignored when fitting resource growth')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds before an unanswered frame counts as lost')
+    parser.add_argument('--max-in-flight', type=int, default=10, help='unanswered frames per client before it skips frames')
+    parser.add_argument('--ignore-throttle', action='store_true', help='keep sending at --fps when the server throttles')
+    parser.add_argument('--url', help='load a running server (e.g. http://localhost:8000) instead of the in-process app')
+    parser.add_argument('--pid', help='process id of the --url server, for RSS and file descriptor sampling')
+    parser.add_argument('--max-rss-growth', type=float, default=50, help='RSS MB/hour after warm-up flagged as a leak')
+    parser.add_argument('--max-fd-growth', type=float, default=10, help='file descriptors/hour after warm-up flagged as a leak')
+    parser.add_argument('--json', help='also write the report (with resource samples) to this file')
+    args = parser.parse_args()
+
+    frames = load_frames(args)
+    if args.url:
+        connect = lambda session_id, on_event: RemoteConnection(args.url, session_id, on_event, args.timeout)
+        pid = args.pid
+    else:
+        # Configure the app before importing it; keep load-test data out of the real stores
+        scratch = tempfile.mkdtemp(prefix='stream-load-')
+        os.environ.setdefault('RAPIDAPI_KEY', 'load-test')
+        os.environ.setdefault('TRYON_PREFETCH', '0')
+        os.environ.setdefault('TRYON_CACHE_DIR', os.path.join(scratch, 'cache'))
+        os.environ.setdefault('TRYON_RESULTS_DIR', os.path.join(scratch, 'results'))
+        os.environ.setdefault('CALIBRATION_DB', os.path.join(scratch, 'calibration_profiles.db'))
+        os.environ.setdefault('MEASUREMENT_HISTORY_DIR', os.path.join(scratch, 'history'))
+        connect = InProcessConnection
+        pid = 'self'
+
+    recorder = Recorder()
+    stop_event = threading.Event()
+    print(f"🚀 Streaming {len(frames)} distinct {args.width}x{args.height} frames from {args.clients} clients "
+          f"at {args.fps} fps for {args.duration:.0f}s ({'in-process' if not args.url else args.url})")
+    clients = [StreamClient(i, connect, frames, recorder, args, stop_event) for i in range(args.clients)]
+
+    started = time.perf_counter()
+    samples = [resource_sample(0.0, pid)]
+    for client in clients:
+        client.start()
+    next_report = started + args.report_every
+    try:
+        while True:
+            now = time.perf_counter()
+            if now - started >= args.duration:
+                break
+            time.sleep(max(0.0, min(next_report, started + args.duration) - now))
+            if time.perf_counter() >= next_report:
+                samples.append(resource_sample(time.perf_counter() - started, pid))
+                window, latency = recorder.take_window()
+                print_window(samples[-1], window, latency, args.report_every)
+                next_report += args.report_every
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted, finishing up")
+    stop_event.set()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        client.finish(grace=min(args.timeout, 5))
+    samples.append(resource_sample(time.perf_counter() - started, pid))
+
+    report = summarise(recorder, samples, elapsed, args)
+    warnings = leak_warnings(report, args) if elapsed - report['resources']['warmup_s'] >= MIN_LEAK_SPAN else []
+    report['leak_warnings'] = warnings
+    print_report(report, warnings)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({**report, 'samples': samples}, f, indent=2)
+        print(f"💾 Report written to {args.json}")
+    return 0 if recorder.totals['processed'] and not warnings else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Local CPU try-on backend.
+
+Warps the garment onto the avatar with a perspective transform that maps
+the garment's shoulder and hip line onto the avatar's pose landmarks, then
+alpha-blends it with a feathered mask. Far rougher than the diffusion
+service, but it answers in well under a second and needs no API key, so
+it serves as a preview and as the fallback while the provider is down.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from tryon_jobs import TryOnError
+from tryon_preprocess import PoseDetector, decode_image, downscale, encode_jpeg, foreground_mask
+
+# MediaPipe pose landmark indices
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_HIP = 23
+RIGHT_HIP = 24
+
+# How far the garment extends beyond the joints the landmarks mark
+SHOULDER_SPREAD = 1.1
+HIP_SPREAD = 1.3
+# Shoulder seams sit above the shoulder joints (fraction of shoulder width)
+SHOULDER_LIFT = 0.2
+
+# Segmentation runs on a copy at most this large
+SEGMENT_MAX_SIDE = 320
+
+
+def _point(landmarks, index, min_visibility=0.5):
+    x, y, visibility = landmarks[index]
+    return np.array([x, y], dtype=np.float32) if visibility >= min_visibility else None
+
+
+def garment_mask(image):
+    """Float mask of the garment: alpha, plain-background difference, or GrabCut for photos"""
+    if image.shape[2] == 4:
+        return (image[:, :, 3] > 8).astype(np.float32)
+    border = np.concatenate([image[0], image[-1], image[:, 0], image[:, -1]]).astype(np.float32)
+    if border.std(axis=0).max() < 12:
+        return foreground_mask(image).astype(np.float32)
+
+    # Product photo (model, mannequin, scenery): segment the centred subject
+    small = downscale(image, SEGMENT_MAX_SIDE)
+    height, width = small.shape[:2]
+    mask = np.zeros((height, width), np.uint8)
+    rect = (int(width * 0.05), int(height * 0.02), int(width * 0.9), int(height * 0.96))
+    cv2.grabCut(small, mask, rect, np.zeros((1, 65), np.float64), np.zeros((1, 65), np.float64), 3, cv2.GC_INIT_WITH_RECT)
+    foreground = np.isin(mask, (cv2.GC_FGD, cv2.GC_PR_FGD)).astype(np.float32)
+    return cv2.resize(foreground, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_LINEAR)
+
+
+def shoulder_line(mask):
+    """(y, x_left, x_right) of the garment's shoulders: the first row nearly as wide as the body"""
+    widths = (mask > 0.5).sum(axis=1)
+    rows = np.flatnonzero(widths)
+    if len(rows) == 0:
+        return None
+    # Heads, necks and hangers are narrow; the shoulders are the first wide row
+    body_width = np.percentile(widths[rows], 75)
+    y = int(rows[np.argmax(widths[rows] >= 0.6 * body_width)])
+    cols = np.flatnonzero(mask[y] > 0.5)
+    return y, int(cols[0]), int(cols[-1])
+
+
+def _widen(left, right, factor):
+    """Move two points apart (or together) about their midpoint"""
+    middle = (left + right) / 2
+    return middle + (left - middle) * factor, middle + (right - middle) * factor
+
+
+class LocalTryOnRenderer:
+    """Landmark-driven garment warp and alpha compositing"""
+
+    def __init__(self, pose_detector=None, max_side=1024, jpeg_quality=90, feather=7):
+        self.pose_detector = pose_detector or PoseDetector()
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        self.feather = feather
+        self._lock = threading.Lock()
+        self.stats = {'renders': 0, 'failures': 0, 'latency_ms': None}
+
+    def _avatar_quad(self, landmarks):
+        """Destination quad (image-left shoulder, image-right shoulder, image-right hip, image-left hip)"""
+        # The person's right shoulder is on the image's left when they face the camera
+        shoulder_a = _point(landmarks, RIGHT_SHOULDER)
+        shoulder_b = _point(landmarks, LEFT_SHOULDER)
+        if shoulder_a is None or shoulder_b is None:
+            raise TryOnError('Shoulders not visible in avatar image', 422)
+        if shoulder_a[0] > shoulder_b[0]:
+            shoulder_a, shoulder_b = shoulder_b, shoulder_a
+
+        hip_a = _point(landmarks, RIGHT_HIP)
+        hip_b = _point(landmarks, LEFT_HIP)
+        if hip_a is None or hip_b is None:
+            # Hips out of frame: extend the torso perpendicular to the shoulder line
+            across = shoulder_b - shoulder_a
+            down = np.array([-across[1], across[0]], dtype=np.float32)
+            hip_a, hip_b = shoulder_a + down * 1.3, shoulder_b + down * 1.3
+        elif hip_a[0] > hip_b[0]:
+            hip_a, hip_b = hip_b, hip_a
+
+        # Lift the seam line above the joints, along the torso's up direction
+        across = shoulder_b - shoulder_a
+        up = np.array([across[1], -across[0]], dtype=np.float32)
+        shoulder_a, shoulder_b = shoulder_a + up * SHOULDER_LIFT, shoulder_b + up * SHOULDER_LIFT
+
+        shoulder_a, shoulder_b = _widen(shoulder_a, shoulder_b, SHOULDER_SPREAD)
+        hip_a, hip_b = _widen(hip_a, hip_b, HIP_SPREAD)
+        return np.array([shoulder_a, shoulder_b, hip_b, hip_a], dtype=np.float32)
+
+    @staticmethod
+    def _garment_quad(shoulders, height, avatar_quad):
+        """Matching quad on the garment, with the hip line placed by the avatar's torso proportions"""
+        top, x0, x1 = shoulders
+        shoulder_width = np.linalg.norm(avatar_quad[1] - avatar_quad[0])
+        torso_length = np.linalg.norm((avatar_quad[2] + avatar_quad[3]) / 2 - (avatar_quad[0] + avatar_quad[1]) / 2)
+        hip_y = top + (x1 - x0) * torso_length / max(shoulder_width, 1.0)
+        return np.array([[x0, top], [x1, top], [x1, hip_y], [x0, hip_y]], dtype=np.float32)
+
+    def render(self, garment_bytes, avatar_bytes):
+        """Composite a garment onto an avatar; returns (JPEG bytes, info)"""
+        started = time.time()
+        try:
+            avatar = decode_image(avatar_bytes)
+            garment = decode_image(garment_bytes, keep_alpha=True)
+            if avatar is None or garment is None:
+                raise TryOnError('Could not decode try-on images', 400)
+            avatar = downscale(avatar, self.max_side)
+            garment = downscale(garment, self.max_side)
+
+            landmarks = self.pose_detector.detect(avatar)
+            if landmarks is None:
+                raise TryOnError('No person detected in avatar image', 422)
+            dst = self._avatar_quad(landmarks)
+
+            mask = garment_mask(garment)
+            shoulders = shoulder_line(mask)
+            if shoulders is None:
+                raise TryOnError('No garment found in clothing image', 422)
+            # Drop whatever sits above the shoulder seams (heads, mannequin necks, hangers)
+            mask[:shoulders[0]] = 0
+            colours = garment[:, :, :3]
+
+            src = self._garment_quad(shoulders, garment.shape[0], dst)
+            transform = cv2.getPerspectiveTransform(src, dst)
+            size = (avatar.shape[1], avatar.shape[0])
+            warped = cv2.warpPerspective(colours, transform, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+            alpha = cv2.warpPerspective(mask, transform, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+            if self.feather:
+                alpha = cv2.GaussianBlur(alpha, (self.feather * 2 + 1, self.feather * 2 + 1), 0)
+
+            alpha = alpha[:, :, None]
+            composite = warped.astype(np.float32) * alpha + avatar.astype(np.float32) * (1.0 - alpha)
+            content = encode_jpeg(composite.astype(np.uint8), self.jpeg_quality)
+        except TryOnError:
+            with self._lock:
+                self.stats['failures'] += 1
+            raise
+
+        elapsed_ms = (time.time() - started) * 1000
+        with self._lock:
+            self.stats['renders'] += 1
+            previous = self.stats['latency_ms']
+            self.stats['latency_ms'] = round(elapsed_ms if previous is None else 0.8 * previous + 0.2 * elapsed_ms, 1)
+        return content, {'elapsed_ms': round(elapsed_ms, 1), 'size': [size[0], size[1]]}
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
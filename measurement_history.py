@@ -0,0 +1,261 @@
+"""
+Append-only measurement history.
+
+Every streamed measurement becomes one fixed-width 32-byte record (session
+hash, timestamp, shoulder/waist cm, confidence, calibration) in a per-day
+binary file. Records are queued by the stream and written in batches by a
+background thread, so the hot path only pays for a queue put. Reads memory-map
+the day's file; rollups and exports work on the mapped columns with NumPy.
+"""
+
+import hashlib
+import io
+import json
+import operator
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional
+    pyarrow = None
+
+RECORD_DTYPE = np.dtype([
+    ('session', '<u8'),
+    ('timestamp', '<f8'),
+    ('shoulder_cm', '<f4'),
+    ('waist_cm', '<f4'),
+    ('confidence', '<f4'),
+    ('pixels_per_cm', '<f4')
+])
+
+
+# Exports are formatted and written this many records at a time
+EXPORT_CHUNK_ROWS = 65536
+# CSV formats of the exported columns (missing values are left empty)
+CSV_FORMATS = {
+    'timestamp': '%.3f',
+    'shoulder_cm': '%.2f',
+    'waist_cm': '%.2f',
+    'confidence': '%.3f',
+    'pixels_per_cm': '%.4f'
+}
+
+
+def session_hash(session_id):
+    """64-bit id stored in each record; the day's .sessions.jsonl maps it back"""
+    return int.from_bytes(hashlib.blake2b(str(session_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def day_of(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def csv_field(value):
+    """A CSV field, quoted when it contains a delimiter, quote or line break"""
+    value = str(value)
+    if any(c in value for c in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+class MeasurementHistory:
+    """Per-day fixed-width record files written off the hot path"""
+
+    def __init__(self, directory='measurement_history', max_queue=100000, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._sessions = {}  # day -> set of session hashes already in its sidecar
+        self._lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'flushes': 0}
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._writer, daemon=True, name='measurement-history').start()
+
+    def _path(self, day, suffix='.bin'):
+        return os.path.join(self.directory, day + suffix)
+
+    def append(self, session_id, measurements, pixels_per_cm=None):
+        """Queue one measurement (never blocks; dropped and counted when the writer falls behind)"""
+        try:
+            self._queue.put_nowait((
+                session_id,
+                measurements.get('timestamp') or time.time(),
+                measurements.get('shoulder_cm'),
+                measurements.get('waist_cm'),
+                measurements.get('confidence') or 0.0,
+                pixels_per_cm
+            ))
+            self.stats['queued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            time.sleep(self.flush_interval)  # Let a batch build up
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"⚠️ Measurement history write failed: {e}")
+
+    def _write(self, batch):
+        """Append a batch of queued rows, one write per day file"""
+        by_day = {}
+        for row in batch:
+            by_day.setdefault(day_of(row[1]), []).append(row)
+        with self._lock:
+            for day, rows in by_day.items():
+                records = np.empty(len(rows), dtype=RECORD_DTYPE)
+                hashes = [session_hash(row[0]) for row in rows]
+                records['session'] = hashes
+                records['timestamp'] = [row[1] for row in rows]
+                for i, name in enumerate(('shoulder_cm', 'waist_cm', 'confidence', 'pixels_per_cm'), start=2):
+                    records[name] = [np.nan if row[i] is None else row[i] for row in rows]
+                self._remember_sessions(day, rows, hashes)
+                with open(self._path(day), 'ab') as f:
+                    f.write(records.tobytes())
+                self.stats['written'] += len(rows)
+            self.stats['flushes'] += 1
+
+    def _remember_sessions(self, day, rows, hashes):
+        known = self._sessions.get(day)
+        if known is None:
+            known = set(self.session_names(day))
+            self._sessions = {day: known}  # Only the current day is kept in memory
+        new = {h: str(row[0]) for h, row in zip(hashes, rows) if h not in known}
+        if new:
+            with open(self._path(day, '.sessions.jsonl'), 'a') as f:
+                for h, name in new.items():
+                    f.write(json.dumps({'hash': h, 'session_id': name}) + '\n')
+            known.update(new)
+
+    def session_names(self, day):
+        """Session hash -> session id for a day"""
+        names = {}
+        try:
+            with open(self._path(day, '.sessions.jsonl'), 'r') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    names[entry['hash']] = entry['session_id']
+        except (OSError, ValueError):
+            pass
+        return names
+
+    def days(self):
+        return sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith('.bin'))
+
+    def read(self, day, session_id=None, start=None, end=None):
+        """A day's records (memory-mapped; filtered copies when session_id/start/end are given)"""
+        if not re.fullmatch(r'\d{4}-\d{2}-\d{2}', day):
+            raise ValueError(f"Invalid day: {day} (expected YYYY-MM-DD)")
+        path = self._path(day)
+        if not os.path.exists(path) or os.path.getsize(path) < RECORD_DTYPE.itemsize:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        count = os.path.getsize(path) // RECORD_DTYPE.itemsize  # Ignore a partially written tail
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+        mask = None
+        if session_id is not None:
+            mask = records['session'] == np.uint64(session_hash(session_id))
+        if start is not None:
+            mask = (records['timestamp'] >= start) if mask is None else mask & (records['timestamp'] >= start)
+        if end is not None:
+            mask = (records['timestamp'] < end) if mask is None else mask & (records['timestamp'] < end)
+        return records if mask is None else records[mask]
+
+    def rollup(self, day, interval=60, session_id=None, start=None, end=None):
+        """Per-interval count and means (NaN-aware) of shoulder, waist and confidence"""
+        records = self.read(day, session_id, start, end)
+        if len(records) == 0:
+            return []
+        buckets = (records['timestamp'] // interval).astype(np.int64)
+        keys, index = np.unique(buckets, return_inverse=True)
+        rows = [{'start': float(key * interval), 'count': int(n)}
+                for key, n in zip(keys, np.bincount(index, minlength=len(keys)))]
+        for name in ('shoulder_cm', 'waist_cm', 'confidence'):
+            values = records[name].astype(np.float64)
+            present = ~np.isnan(values)
+            sums = np.bincount(index[present], weights=values[present], minlength=len(keys))
+            counts = np.bincount(index[present], minlength=len(keys))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums / counts
+            for row, mean in zip(rows, means):
+                row[name] = None if np.isnan(mean) else round(float(mean), 2)
+        return rows
+
+    def _export_chunks(self, day, session_id=None, chunk_rows=EXPORT_CHUNK_ROWS):
+        """(records, session ids, index into them) for successive slices of a day's records"""
+        records = self.read(day, session_id)
+        names = self.session_names(day)
+        for start in range(0, len(records), chunk_rows):
+            chunk = records[start:start + chunk_rows]
+            hashes, index = np.unique(chunk['session'], return_inverse=True)
+            yield chunk, [names.get(int(h), str(int(h))) for h in hashes], index
+
+    def iter_csv(self, day, session_id=None, chunk_rows=EXPORT_CHUNK_ROWS):
+        """A day's records as CSV text, one chunk of rows at a time"""
+        columns = list(CSV_FORMATS)
+        row_format = ''.join(',' + CSV_FORMATS[name] for name in columns)
+        yield ','.join(['session_id'] + columns) + '\r\n'
+        for chunk, sessions, index in self._export_chunks(day, session_id, chunk_rows):
+            sessions = np.array([csv_field(session) for session in sessions], dtype=object)[index]
+            values = np.column_stack([chunk[name].astype(np.float64) for name in columns])
+            buffer = io.StringIO()
+            np.savetxt(buffer, values, fmt=row_format, newline='\r\n')
+            # Every numeric field starts with a comma, so only missing values match
+            lines = buffer.getvalue().replace(',nan', ',').splitlines(True)
+            yield ''.join(map(operator.add, sessions.tolist(), lines))
+
+    def export(self, day, path, format='csv', session_id=None):
+        """Write a day's records (session ids resolved) to CSV or Parquet; returns rows written"""
+        rows = 0
+        if format == 'parquet':
+            if pyarrow is None:
+                raise RuntimeError("Parquet export needs the 'pyarrow' package")
+            columns = [name for name in RECORD_DTYPE.names if name != 'session']
+            schema = pyarrow.schema([('session_id', pyarrow.string())] +
+                                    [(name, pyarrow.from_numpy_dtype(RECORD_DTYPE[name])) for name in columns])
+            with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+                for chunk, sessions, index in self._export_chunks(day, session_id):
+                    table = {'session_id': np.array(sessions, dtype=object)[index].tolist()}
+                    table.update({name: np.asarray(chunk[name]) for name in columns})
+                    writer.write_table(pyarrow.table(table, schema=schema))
+                    rows += len(chunk)
+        elif format == 'csv':
+            with open(path, 'w', newline='') as f:
+                for text in self.iter_csv(day, session_id):
+                    f.write(text)
+            rows = len(self.read(day, session_id))
+        else:
+            raise ValueError(f"Unknown export format: {format}")
+        return rows
+
+    def snapshot(self):
+        return {
+            'directory': self.directory,
+            'pending': self._queue.qsize(),
+            'days': len(self.days()),
+            **self.stats
+        }
+
+
+def create_measurement_history():
+    """Measurement history from the environment, or None when MEASUREMENT_HISTORY=0"""
+    if os.getenv('MEASUREMENT_HISTORY', '1').lower() in ('0', 'false', 'no'):
+        return None
+    return MeasurementHistory(
+        directory=os.getenv('MEASUREMENT_HISTORY_DIR', 'measurement_history'),
+        max_queue=int(os.getenv('MEASUREMENT_HISTORY_QUEUE', 100000))
+    )
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Mock virtual try-on provider for offline testing and benchmarks.
+
+Speaks the same POST /try-on-file contract as the RapidAPI diffusion service
+with a configurable latency distribution, error rate and response size, and
+optionally enforces a per-minute rate limit and a plan quota with RapidAPI's
+rate-limit headers.
+Point the API at it with TRYON_UPSTREAM_URL=http://localhost:9000.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+
+def make_response_image(size_kb):
+    """A JPEG of roughly size_kb kilobytes (noise compresses poorly, so size tracks resolution)"""
+    side = max(16, int((size_kb * 1024 / 0.9) ** 0.5))
+    noise = np.random.default_rng(0).integers(0, 256, (side, side, 3), dtype=np.uint8)
+    ok, buffer = cv2.imencode('.jpg', noise, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+class MockTryOnConfig:
+    """Latency, failure and payload settings shared by the handler threads"""
+
+    def __init__(self, latency=8.0, latency_dist='lognormal', latency_sigma=0.35, error_rate=0.0,
+                 error_statuses=(503,), response_kb=120, seed=None, rate_limit=None, quota=None):
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.image = make_response_image(response_kb)
+        self.random = random.Random(seed)
+        self.rate_limit = rate_limit  # requests per rolling minute, None = unlimited
+        self.quota = quota            # requests for the whole run, None = unlimited
+        self.recent = deque()         # arrival times within the last minute
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'in_flight': 0, 'max_in_flight': 0,
+                      'bytes_received': 0}
+
+    def admit(self):
+        """(allowed, rate-limit headers) for a request arriving now"""
+        now = time.time()
+        headers = {}
+        with self.lock:
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            allowed = True
+            if self.quota is not None:
+                used = self.stats['requests'] - self.stats['rate_limited']
+                allowed = used < self.quota
+                headers.update({'X-RateLimit-Requests-Limit': str(self.quota),
+                                'X-RateLimit-Requests-Remaining': str(max(0, self.quota - used - allowed)),
+                                'X-RateLimit-Requests-Reset': '3600'})
+            if self.rate_limit is not None:
+                if allowed and len(self.recent) >= self.rate_limit:
+                    allowed = False
+                    headers['Retry-After'] = str(max(1, int(60 - (now - self.recent[0])) + 1))
+                if allowed:
+                    self.recent.append(now)
+                reset = 60 - (now - self.recent[0]) if self.recent else 60
+                headers.update({'X-RateLimit-Limit': str(self.rate_limit),
+                                'X-RateLimit-Remaining': str(max(0, self.rate_limit - len(self.recent))),
+                                'X-RateLimit-Reset': str(int(reset) + 1)})
+            if not allowed:
+                self.stats['rate_limited'] += 1
+        return allowed, headers
+
+    def sample_latency(self):
+        """Seconds to 'generate' one try-on"""
+        with self.lock:
+            if self.latency_dist == 'fixed':
+                return self.latency
+            if self.latency_dist == 'uniform':
+                return self.random.uniform(0, 2 * self.latency)
+            # lognormal with the configured median
+            return self.random.lognormvariate(np.log(max(self.latency, 1e-3)), self.latency_sigma)
+
+    def sample_error(self):
+        with self.lock:
+            if self.random.random() < self.error_rate:
+                return self.random.choice(self.error_statuses)
+        return None
+
+
+class MockTryOnHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real provider
+    config = None
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.config.lock:
+                body = json.dumps(self.config.stats).encode('utf-8')
+            self._send(200, body, 'application/json')
+        else:
+            self._send(404, b'{"error": "not found"}', 'application/json')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        config = self.config
+        with config.lock:
+            config.stats['requests'] += 1
+            config.stats['bytes_received'] += length
+            config.stats['in_flight'] += 1
+            config.stats['max_in_flight'] = max(config.stats['max_in_flight'], config.stats['in_flight'])
+        try:
+            if self.path.split('?')[0] != '/try-on-file':
+                self._send(404, b'{"error": "not found"}', 'application/json')
+                return
+            allowed, limit_headers = config.admit()
+            if not allowed:
+                self._send(429, b'{"message": "You have exceeded the rate limit"}', 'application/json', limit_headers)
+                return
+            time.sleep(config.sample_latency())
+            error_status = config.sample_error()
+            if error_status:
+                with config.lock:
+                    config.stats['errors'] += 1
+                headers = dict(limit_headers, **({'Retry-After': '1'} if error_status == 429 else {}))
+                self._send(error_status, json.dumps({'message': 'mock failure'}).encode('utf-8'), 'application/json', headers)
+                return
+            self._send(200, config.image, 'image/jpeg', dict(limit_headers, **{'X-Seed': str(random.randint(0, 2 ** 31))}))
+        finally:
+            with config.lock:
+                config.stats['in_flight'] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(host='127.0.0.1', port=0, **config):
+    """Run the mock provider on a background thread; returns (server, base_url)"""
+    handler = type('ConfiguredMockTryOnHandler', (MockTryOnHandler,), {'config': MockTryOnConfig(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='mock-tryon').start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock virtual try-on provider')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=8.0, help='median seconds per try-on')
+    parser.add_argument('--latency-dist', choices=('lognormal', 'uniform', 'fixed'), default='lognormal')
+    parser.add_argument('--latency-sigma', type=float, default=0.35, help='lognormal shape')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, nargs='+', default=[503], help='statuses failures use')
+    parser.add_argument('--response-kb', type=int, default=120, help='approximate result image size')
+    parser.add_argument('--rate-limit', type=int, help='requests allowed per rolling minute (429 beyond)')
+    parser.add_argument('--quota', type=int, help='requests allowed in total (429 beyond)')
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(
+        args.host, args.port, latency=args.latency, latency_dist=args.latency_dist,
+        latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+        error_statuses=args.error_status, response_kb=args.response_kb,
+        rate_limit=args.rate_limit, quota=args.quota
+    )
+    print(f"🎭 Mock try-on provider listening on {base_url}")
+    print(f"   Latency: {args.latency_dist} median {args.latency}s, error rate {args.error_rate:.0%}, ~{args.response_kb} KB results")
+    print(f"   Use: TRYON_UPSTREAM_URL=http://localhost:{args.port} python streaming_api.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
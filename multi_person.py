@@ -0,0 +1,243 @@
+"""
+Multi-person measurement for shared cameras (store kiosks).
+
+People are found on a downscaled frame, tracked with stable ids by box
+overlap with where each was heading, and measured together: per-person
+landmarks are stacked into one array and every person's shoulder and waist
+widths are computed in a single NumPy pass. With a MediaPipe PoseLandmarker model (POSE_LANDMARKER_MODEL) all
+poses come from one inference. Otherwise new people are found every few
+frames by running pose on a small copy of the frame and masking out each
+person found, and tracked people get one pose pass on a fixed-size crop per
+frame. Either way the cost follows the number of people, not the frame size.
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from shoulder_distance import ShoulderDistanceCalculator
+
+LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP = 11, 12, 23, 24
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU matrix between two (N, 4) arrays of x0, y0, x1, y1 boxes"""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)[:, None, :]
+    b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    overlap = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return overlap / np.maximum(area_a + area_b - overlap, 1e-6)
+
+
+class PersonTracker:
+    """Stable track ids by greedy matching of boxes to where each track is predicted to be
+
+    Each track keeps a smoothed per-frame velocity of its box, so two people
+    walking past each other are matched to their own predicted positions
+    rather than to whichever previous box they happen to overlap more.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missing=15, smoothing=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_missing = max_missing
+        self.smoothing = smoothing  # Weight of the latest movement in the velocity
+        self.tracks = {}  # track id -> {'box', 'velocity', 'missing'}
+        self.next_id = 1
+
+    def predicted_box(self, track):
+        return np.asarray(track['box']) + track['velocity'] * (track['missing'] + 1)
+
+    def update(self, boxes):
+        """Track id for each box, in order; unmatched tracks age out after max_missing frames"""
+        ids = [None] * len(boxes)
+        track_ids = list(self.tracks)
+        if boxes and track_ids:
+            iou = box_iou(boxes, [self.predicted_box(self.tracks[t]) for t in track_ids])
+            while True:
+                i, j = np.unravel_index(iou.argmax(), iou.shape)
+                if iou[i, j] < self.iou_threshold:
+                    break
+                ids[i] = track_ids[j]
+                iou[i, :] = -1
+                iou[:, j] = -1
+        for i, box in enumerate(boxes):
+            track = self.tracks.get(ids[i])
+            if track is None:
+                ids[i] = self.next_id
+                self.next_id += 1
+                velocity = np.zeros(4)
+            else:
+                movement = (np.asarray(box, dtype=float) - track['box']) / (track['missing'] + 1)
+                velocity = (1 - self.smoothing) * track['velocity'] + self.smoothing * movement
+            self.tracks[ids[i]] = {'box': np.asarray(box, dtype=float), 'velocity': velocity, 'missing': 0}
+        for track_id in track_ids:
+            if track_id not in ids:
+                self.tracks[track_id]['missing'] += 1
+                if self.tracks[track_id]['missing'] > self.max_missing:
+                    del self.tracks[track_id]
+        return ids
+
+
+class MultiPersonEstimator:
+    """Detect, track and measure several people per frame"""
+
+    def __init__(self, max_people=4, detect_side=320, crop_side=256, detect_every=5, landmarker_model=None):
+        self.max_people = max_people
+        self.detect_side = detect_side    # Longest side of the frame copy people are detected on
+        self.crop_side = crop_side        # Longest side of each person crop sent to pose
+        self.detect_every = detect_every  # Frames between searches for new people; boxes follow landmarks in between
+        self.tracker = PersonTracker()
+        self.frame_index = 0
+        self._boxes = []
+        self._lock = threading.Lock()  # MediaPipe graphs are not thread-safe
+        self._landmarker = None
+        self._calculator = None
+        if landmarker_model and os.path.exists(landmarker_model):
+            from mediapipe.tasks import python as mp_tasks
+            from mediapipe.tasks.python import vision
+            self._landmarker = vision.PoseLandmarker.create_from_options(vision.PoseLandmarkerOptions(
+                base_options=mp_tasks.BaseOptions(model_asset_path=landmarker_model),
+                running_mode=vision.RunningMode.IMAGE,
+                num_poses=max_people
+            ))
+        self.backend = 'landmarker' if self._landmarker else 'crops'
+
+    def _downscale(self, image, side):
+        height, width = image.shape[:2]
+        scale = min(1.0, side / float(max(height, width)))
+        if scale >= 1.0:
+            return image, 1.0
+        return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA), scale
+
+    def _pose_calculator(self):
+        if self._calculator is None:
+            self._calculator = ShoulderDistanceCalculator(static_image_mode=True, calibration_file=None)
+        return self._calculator
+
+    def _detect_boxes(self, image, known_boxes=()):
+        """Boxes (full-frame pixels) of people not in known_boxes: pose on a small copy, masking each one found"""
+        small, scale = self._downscale(image, self.detect_side)
+        small = small.copy()
+        height, width = small.shape[:2]
+        fill = small.reshape(-1, 3).mean(axis=0)
+        for x0, y0, x1, y1 in known_boxes:
+            small[int(y0 * scale):int(y1 * scale), int(x0 * scale):int(x1 * scale)] = fill
+        boxes = []
+        while len(boxes) + len(known_boxes) < self.max_people:
+            landmarks = self._pose_calculator().detect_landmarks(small)
+            if landmarks is None:
+                break
+            x0, y0, x1, y1 = self._landmark_box(np.asarray(landmarks, dtype=float), width, height)
+            if (x1 - x0) * (y1 - y0) < 0.01 * width * height:
+                break
+            small[int(y0):int(y1), int(x0):int(x1)] = fill
+            boxes.append([x0 / scale, y0 / scale, x1 / scale, y1 / scale])
+        return boxes
+
+    def _crop_poses(self, image, boxes):
+        """Landmarks (33 x [x_px, y_px, visibility]) of the people in boxes, one pose pass per crop"""
+        height, width = image.shape[:2]
+        poses = []
+        for x0, y0, x1, y1 in boxes:
+            pad_x, pad_y = (x1 - x0) * 0.15, (y1 - y0) * 0.1
+            cx0, cy0 = int(max(0, x0 - pad_x)), int(max(0, y0 - pad_y))
+            cx1, cy1 = int(min(width, x1 + pad_x)), int(min(height, y1 + pad_y))
+            if cx1 - cx0 < 16 or cy1 - cy0 < 16:
+                continue
+            crop, scale = self._downscale(image[cy0:cy1, cx0:cx1], self.crop_side)
+            landmarks = self._pose_calculator().detect_landmarks(crop)
+            if landmarks is None:
+                continue
+            points = np.asarray(landmarks, dtype=float)
+            points[:, 0] = points[:, 0] / scale + cx0
+            points[:, 1] = points[:, 1] / scale + cy0
+            poses.append(points)
+        return poses
+
+    def _landmarker_poses(self, image):
+        """Every person's landmarks from one PoseLandmarker inference on a small copy"""
+        import mediapipe as mp
+        small, _ = self._downscale(image, max(self.detect_side, self.crop_side))
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        result = self._landmarker.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb))
+        height, width = image.shape[:2]
+        poses = [np.array([(lm.x * width, lm.y * height, lm.visibility) for lm in pose], dtype=float)
+                 for pose in result.pose_landmarks]
+        return [self._landmark_box(points, width, height) for points in poses], poses
+
+    @staticmethod
+    def _landmark_box(points, width, height):
+        """Box around a pose's landmarks, widened so it still contains the person next frame"""
+        x0, y0 = points[:, 0].min(), points[:, 1].min()
+        x1, y1 = points[:, 0].max(), points[:, 1].max()
+        pad_x, pad_y = (x1 - x0) * 0.2, (y1 - y0) * 0.1
+        return [max(0.0, x0 - pad_x), max(0.0, y0 - pad_y), min(float(width), x1 + pad_x), min(float(height), y1 + pad_y)]
+
+    def detect(self, image):
+        """(boxes, poses) for the people in a BGR frame"""
+        with self._lock:
+            if self._landmarker is not None:
+                return self._landmarker_poses(image)
+            boxes = list(self._boxes)
+            if self.frame_index % self.detect_every == 0 or not boxes:
+                boxes += self._detect_boxes(image, boxes)
+            self.frame_index += 1
+            poses = self._crop_poses(image, boxes)
+            height, width = image.shape[:2]
+            self._boxes = [self._landmark_box(points, width, height) for points in poses]
+            return list(self._boxes), poses
+
+    def process(self, image, pixels_per_cm=None):
+        """Tracked people with their measurements, largest first"""
+        boxes, poses = self.detect(image)
+        if not poses:
+            self.tracker.update([])
+            return []
+        ids = self.tracker.update(boxes)
+        stacked = np.stack(poses)  # (P, 33, 3)
+        shoulder_pixels = np.linalg.norm(stacked[:, LEFT_SHOULDER, :2] - stacked[:, RIGHT_SHOULDER, :2], axis=1)
+        waist_pixels = np.linalg.norm(stacked[:, LEFT_HIP, :2] - stacked[:, RIGHT_HIP, :2], axis=1)
+        confidence = stacked[:, [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP], 2].mean(axis=1)
+        areas = [(box[2] - box[0]) * (box[3] - box[1]) for box in boxes]
+        people = []
+        for i in np.argsort(areas)[::-1]:
+            people.append({
+                'track_id': int(ids[i]),
+                'box': [round(float(v), 1) for v in boxes[i]],
+                'shoulder_pixels': float(shoulder_pixels[i]),
+                'shoulder_cm': float(shoulder_pixels[i] / pixels_per_cm) if pixels_per_cm else None,
+                'waist_pixels': float(waist_pixels[i]),
+                'waist_cm': float(waist_pixels[i] / pixels_per_cm) if pixels_per_cm else None,
+                'confidence': float(confidence[i]),
+                'landmarks': stacked[i]
+            })
+        return people
+
+    def draw(self, image, people, target_id=None):
+        """Boxes, shoulder/hip lines and per-person measurements"""
+        for person in people:
+            color = (0, 255, 0) if person['track_id'] == target_id else (200, 200, 200)
+            x0, y0, x1, y1 = [int(v) for v in person['box']]
+            cv2.rectangle(image, (x0, y0), (x1, y1), color, 2)
+            points = person['landmarks']
+            for a, b in ((LEFT_SHOULDER, RIGHT_SHOULDER), (LEFT_HIP, RIGHT_HIP)):
+                cv2.line(image, tuple(int(v) for v in points[a, :2]), tuple(int(v) for v in points[b, :2]), color, 2)
+            label = f"#{person['track_id']}"
+            if person['shoulder_cm']:
+                label += f" S {person['shoulder_cm']:.1f}cm W {person['waist_cm']:.1f}cm"
+            cv2.putText(image, label, (x0, max(15, y0 - 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        return image
+
+
+def create_multi_person_estimator():
+    """Multi-person estimator configured from the environment"""
+    return MultiPersonEstimator(
+        max_people=int(os.getenv('MULTI_PERSON_MAX', 4)),
+        detect_every=int(os.getenv('MULTI_PERSON_DETECT_EVERY', 5)),
+        landmarker_model=os.getenv('POSE_LANDMARKER_MODEL')
+    )
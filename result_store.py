@@ -0,0 +1,187 @@
+"""
+Storage for virtual try-on results.
+
+Results live in their own directory under sharded names, each with a JSON
+sidecar and a pre-generated thumbnail. Result ids are derived from the image
+bytes, so storing the same image again (a cache hit) refreshes the existing
+copy instead of writing another. An in-memory index (rebuilt from disk at
+startup) supports newest-first listing, and retention by count, total size
+and age evicts the oldest results.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from PIL import Image
+
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_QUALITY = 75
+
+
+def make_thumbnail(content, size=THUMBNAIL_SIZE):
+    """JPEG thumbnail bytes for an image, or None if it cannot be decoded"""
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.thumbnail(size)
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"⚠️ Could not create result thumbnail: {e}")
+        return None
+
+
+class ResultStore:
+    """On-disk try-on results with listing and retention"""
+
+    def __init__(self, directory='tryon_results', max_results=1000, max_bytes=1024 * 1024 * 1024, max_age=None):
+        self.directory = directory
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.max_age = max_age  # seconds, None keeps results until evicted by count/size
+        self._index = OrderedDict()  # result id -> metadata, oldest first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.reused = 0  # puts answered by an already stored copy of the same image
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def path(self, result_id, suffix='.jpg'):
+        return os.path.join(self.directory, result_id[:2], result_id + suffix)
+
+    def thumbnail_path(self, result_id):
+        return self.path(result_id, '_thumb.jpg')
+
+    @staticmethod
+    def _entry_bytes(meta):
+        return meta['size'] + meta.get('thumbnail_size', 0)
+
+    def _load_index(self):
+        """Rebuild the index from the sidecar files"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(root, name), 'r') as f:
+                        meta = json.load(f)
+                    if os.path.exists(self.path(meta['result_id'])):
+                        entries.append(meta)
+                except (OSError, ValueError, KeyError):
+                    continue
+        for meta in sorted(entries, key=lambda m: m['created_at']):
+            self._index[meta['result_id']] = meta
+            self._total_bytes += self._entry_bytes(meta)
+        if entries:
+            print(f"🗂️ Result store: {len(entries)} results ({self._total_bytes / 1e6:.1f} MB) loaded from {self.directory}")
+        self._evict()
+
+    def _write(self, path, data):
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'  # concurrent puts of one image must not share it
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, content, **meta):
+        """Store a result image and its thumbnail; returns the result metadata
+
+        The id is the image's content hash: an image that is already stored
+        keeps its files and only gets this call's metadata and a new created_at.
+        """
+        result_id = hashlib.sha256(content).hexdigest()[:32]
+        with self._lock:
+            existing = self._index.get(result_id)
+            if existing is not None:
+                existing.update(meta, created_at=time.time())
+                self._index.move_to_end(result_id)
+                self.reused += 1
+                meta = dict(existing)
+        if existing is not None:
+            self._write(self.path(result_id, '.json'), json.dumps(meta).encode('utf-8'))
+            return meta
+
+        thumbnail = make_thumbnail(content)
+        meta = dict(
+            meta,
+            result_id=result_id,
+            size=len(content),
+            etag=result_id,
+            thumbnail_size=len(thumbnail) if thumbnail else 0,
+            created_at=time.time()
+        )
+        os.makedirs(os.path.dirname(self.path(result_id)), exist_ok=True)
+        self._write(self.path(result_id), content)
+        if thumbnail:
+            self._write(self.thumbnail_path(result_id), thumbnail)
+        self._write(self.path(result_id, '.json'), json.dumps(meta).encode('utf-8'))
+
+        with self._lock:
+            previous = self._index.pop(result_id, None)  # stored concurrently by another put
+            if previous is not None:
+                self._total_bytes -= self._entry_bytes(previous)
+            self._index[result_id] = meta
+            self._total_bytes += self._entry_bytes(meta)
+        self._evict()
+        return dict(meta)
+
+    def get(self, result_id):
+        """Metadata for a stored result or None"""
+        with self._lock:
+            meta = self._index.get(result_id)
+        if meta:
+            return dict(meta)
+        # Another replica may have written it to a shared results directory
+        if len(result_id) < 2 or not result_id.isalnum():
+            return None
+        try:
+            with open(self.path(result_id, '.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self, offset=0, limit=20):
+        """Newest-first page of result metadata and the total count"""
+        with self._lock:
+            newest_first = list(reversed(self._index.values()))
+        return [dict(meta) for meta in newest_first[offset:offset + limit]], len(newest_first)
+
+    def _evict(self):
+        """Drop the oldest results beyond the count, size and age limits"""
+        cutoff = time.time() - self.max_age if self.max_age else None
+        evicted = []
+        with self._lock:
+            while self._index:
+                oldest = next(iter(self._index.values()))
+                if (len(self._index) <= self.max_results and self._total_bytes <= self.max_bytes
+                        and (cutoff is None or oldest['created_at'] >= cutoff)):
+                    break
+                self._index.popitem(last=False)
+                self._total_bytes -= self._entry_bytes(oldest)
+                self.evictions += 1
+                evicted.append(oldest['result_id'])
+        for result_id in evicted:
+            for path in (self.path(result_id), self.thumbnail_path(result_id), self.path(result_id, '.json')):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'results': len(self._index),
+                'bytes': self._total_bytes,
+                'max_results': self.max_results,
+                'max_bytes': self.max_bytes,
+                'max_age': self.max_age,
+                'evictions': self.evictions,
+                'reused': self.reused
+            }
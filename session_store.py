@@ -0,0 +1,164 @@
+"""
+Session state storage for the streaming API.
+
+Keeps per-session calibration, display calibration and virtual try-on job
+status out of process globals so several API replicas can serve the same
+client. Uses Redis when REDIS_URL is set, otherwise an in-process store.
+"""
+
+import json
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Redis is only needed for multi-node deployments
+    redis = None
+
+SESSION_TTL = 24 * 60 * 60  # Seconds a session survives without activity
+JOB_TTL = 60 * 60           # Seconds try-on job status is kept
+
+
+class InMemorySessionStore:
+    """Single-process session store (development and tests)"""
+
+    backend = 'memory'
+
+    def __init__(self, session_ttl=SESSION_TTL, job_ttl=JOB_TTL):
+        self.session_ttl = session_ttl
+        self.job_ttl = job_ttl
+        self._sessions = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _expired(self, entry):
+        return entry['expires_at'] < time.time()
+
+    def get_session(self, session_id):
+        """Return the stored state for a session (empty dict if unknown)"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or self._expired(entry):
+                self._sessions.pop(session_id, None)
+                return {}
+            return dict(entry['data'])
+
+    def update_session(self, session_id, **fields):
+        """Merge fields into a session and refresh its TTL"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or self._expired(entry):
+                entry = {'data': {}}
+                self._sessions[session_id] = entry
+            entry['data'].update(fields)
+            entry['expires_at'] = time.time() + self.session_ttl
+
+    def delete_session(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_job(self, job_id):
+        """Return try-on job status or None"""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None or self._expired(entry):
+                self._jobs.pop(job_id, None)
+                return None
+            return dict(entry['data'])
+
+    def set_job(self, job_id, data):
+        with self._lock:
+            self._jobs[job_id] = {'data': dict(data), 'expires_at': time.time() + self.job_ttl}
+
+    def update_job(self, job_id, **fields):
+        """Merge fields into a job record, creating it if needed"""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None or self._expired(entry):
+                entry = {'data': {}}
+                self._jobs[job_id] = entry
+            entry['data'].update(fields)
+            entry['expires_at'] = time.time() + self.job_ttl
+            return dict(entry['data'])
+
+    def ping(self):
+        return True
+
+
+class RedisSessionStore:
+    """Redis-backed session store shared by all API replicas"""
+
+    backend = 'redis'
+
+    def __init__(self, redis_url, session_ttl=SESSION_TTL, job_ttl=JOB_TTL, prefix='shoulder_api'):
+        if redis is None:
+            raise RuntimeError("REDIS_URL is set but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.session_ttl = session_ttl
+        self.job_ttl = job_ttl
+        self.prefix = prefix
+
+    def _session_key(self, session_id):
+        return f"{self.prefix}:session:{session_id}"
+
+    def _job_key(self, job_id):
+        return f"{self.prefix}:job:{job_id}"
+
+    def get_session(self, session_id):
+        """Return the stored state for a session (empty dict if unknown)"""
+        raw = self.client.hgetall(self._session_key(session_id))
+        return {field: json.loads(value) for field, value in raw.items()}
+
+    def update_session(self, session_id, **fields):
+        """Merge fields into a session and refresh its TTL"""
+        if not fields:
+            return
+        key = self._session_key(session_id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={field: json.dumps(value) for field, value in fields.items()})
+        pipe.expire(key, self.session_ttl)
+        pipe.execute()
+
+    def delete_session(self, session_id):
+        self.client.delete(self._session_key(session_id))
+
+    def get_job(self, job_id):
+        """Return try-on job status or None"""
+        raw = self.client.hgetall(self._job_key(job_id))
+        if not raw:
+            return None
+        return {field: json.loads(value) for field, value in raw.items()}
+
+    def set_job(self, job_id, data):
+        key = self._job_key(job_id)
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        if data:
+            pipe.hset(key, mapping={field: json.dumps(value) for field, value in data.items()})
+        pipe.expire(key, self.job_ttl)
+        pipe.execute()
+
+    def update_job(self, job_id, **fields):
+        """Merge fields into a job record, creating it if needed"""
+        key = self._job_key(job_id)
+        pipe = self.client.pipeline()
+        if fields:
+            pipe.hset(key, mapping={field: json.dumps(value) for field, value in fields.items()})
+        pipe.expire(key, self.job_ttl)
+        pipe.hgetall(key)
+        raw = pipe.execute()[-1]
+        return {field: json.loads(value) for field, value in raw.items()}
+
+    def ping(self):
+        try:
+            return bool(self.client.ping())
+        except Exception:
+            return False
+
+
+def create_session_store(redis_url=None):
+    """Create the session store for this deployment"""
+    if redis_url:
+        print(f"🗄️ Using Redis session store: {redis_url}")
+        return RedisSessionStore(redis_url)
+    return InMemorySessionStore()
@@ -5,13 +5,14 @@ import math
 import time
 import json
 import os
+from auto_scale import ScaleEstimator
 
 class ShoulderDistanceCalculator:
-    def __init__(self):
-        # Initialize MediaPipe pose detection
+    def __init__(self, static_image_mode=False, calibration_file="calibration.json"):
+        # Initialize MediaPipe pose detection (static_image_mode for unrelated still images)
         self.mp_pose = mp.solutions.pose
         self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
+            static_image_mode=static_image_mode,
             model_complexity=1,
             enable_segmentation=False,
             min_detection_confidence=0.5,
@@ -34,8 +35,8 @@ class ShoulderDistanceCalculator:
         # For FPS calculation
         self.prev_time = 0
         
-        # Calibration settings
-        self.calibration_file = "calibration.json"
+        # Calibration settings (calibration_file=None: the caller manages calibration)
+        self.calibration_file = calibration_file
         
         # User-specific calibration: 650px = 96cm (YOUR DEFAULT)
         self.user_calibration = 650.0 / 96.0  # 6.77 pixels per cm
@@ -49,12 +50,15 @@ class ShoulderDistanceCalculator:
         self.avg_head_width = 15.0      # Average head width
         self.avg_eye_distance = 6.3     # Average distance between eyes
         
+        # Running face-based scale, used when no calibration is set
+        self.scale_estimator = ScaleEstimator()
+        
         # Display settings
         self.show_z_info = True  # Show Z coordinate information by default
         
     def load_calibration(self):
         """Load calibration data from file."""
-        if os.path.exists(self.calibration_file):
+        if self.calibration_file and os.path.exists(self.calibration_file):
             try:
                 with open(self.calibration_file, 'r') as f:
                     data = json.load(f)
@@ -65,6 +69,9 @@ class ShoulderDistanceCalculator:
     
     def save_calibration(self, pixels_per_cm):
         """Save calibration data to file."""
+        if not self.calibration_file:
+            self.pixels_per_cm = pixels_per_cm
+            return
         try:
             with open(self.calibration_file, 'w') as f:
                 json.dump({'pixels_per_cm': pixels_per_cm}, f)
@@ -113,18 +120,14 @@ class ShoulderDistanceCalculator:
     def get_automatic_scale(self, landmarks, width, height):
         """
         Automatically estimate scale using facial features.
+        Eye and ear distances from this frame are folded into a running
+        estimate, which stops sampling every frame once it has converged.
         """
-        # Try eye distance first (more reliable)
-        scale = self.estimate_scale_from_face(landmarks, width, height)
-        if scale:
-            return scale
-            
-        # Fallback to head width
-        scale = self.estimate_scale_from_head(landmarks, width, height)
-        if scale:
-            return scale
-            
-        return None
+        return self.scale_estimator.update(
+            landmarks, width, height,
+            left_eye=self.LEFT_EYE, right_eye=self.RIGHT_EYE,
+            left_ear=self.LEFT_EAR, right_ear=self.RIGHT_EAR
+        )
     
     def calibrate_with_reference(self, image, landmarks):
         """
@@ -425,6 +428,16 @@ class ShoulderDistanceCalculator:
         cv2.putText(image, "Press 'q' to quit, 's' to save, 'z' toggle Z info", (20, y_offset), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
     
+    def detect_landmarks(self, image):
+        """
+        Pose landmarks for a BGR image as (x_px, y_px, visibility) tuples, or None.
+        """
+        results = self.pose.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if not results.pose_landmarks:
+            return None
+        height, width = image.shape[:2]
+        return [(lm.x * width, lm.y * height, lm.visibility) for lm in results.pose_landmarks.landmark]
+    
     def process_frame(self, image):
         """
         Process a single frame for pose detection and distance calculation.
@@ -479,8 +492,9 @@ class ShoulderDistanceCalculator:
             waist_z_diff = abs(waist_left_z - waist_right_z)
             waist_avg_depth = (waist_left_z + waist_right_z) / 2
             
-            # Try to get automatic scale estimation
-            auto_scale = self.get_automatic_scale(results.pose_landmarks, image.shape[1], image.shape[0])
+            # Automatic scale estimation is only needed without a calibration
+            if not self.pixels_per_cm:
+                auto_scale = self.get_automatic_scale(results.pose_landmarks, image.shape[1], image.shape[0])
             
             # Convert to centimeters
             shoulder_cm = self.pixels_to_cm(shoulder_pixels, auto_scale)
@@ -518,7 +532,8 @@ class ShoulderDistanceCalculator:
                 else:
                     scale_info = f"Manual calibration: {self.pixels_per_cm:.2f} px/cm"
             elif auto_scale:
-                scale_info = f"Auto scale (face): {auto_scale:.1f} px/cm"
+                state = "locked" if self.scale_estimator.converged else f"converging, {len(self.scale_estimator.samples)} samples"
+                scale_info = f"Auto scale (face): {auto_scale:.1f} px/cm ({state})"
             else:
                 scale_info = "No scale available"
             
@@ -593,7 +608,8 @@ class ShoulderDistanceCalculator:
             elif key == ord('r'):
                 # Reset calibration
                 self.pixels_per_cm = None
-                if os.path.exists(self.calibration_file):
+                self.scale_estimator.reset()
+                if self.calibration_file and os.path.exists(self.calibration_file):
                     os.remove(self.calibration_file)
                 print("Calibration reset")
             elif key == ord('z'):
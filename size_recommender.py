@@ -0,0 +1,144 @@
+"""
+Size recommendations from body measurements.
+
+Brand size charts are loaded once into padded NumPy arrays (chart x size x
+measurement ranges). A query scores every size of every chart at once by its
+range-normalised distance to the measurements and picks the nearest size per
+chart, so one call covers any number of measurement vectors and SKUs; SKUs
+only select which chart's answer they get.
+"""
+
+import json
+import os
+
+import numpy as np
+
+DEFAULT_CHARTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'size_charts.json')
+
+
+class SizeRecommender:
+    """Nearest size per chart for measurement vectors, vectorised over charts and sizes"""
+
+    def __init__(self, charts, measurements, skus=None, category_keywords=None):
+        self.measurements = list(measurements)
+        self.skus = dict(skus or {})
+        self.category_keywords = dict(category_keywords or {})
+        self.chart_names = sorted(charts)
+        self._chart_index = {name: i for i, name in enumerate(self.chart_names)}
+        max_sizes = max((len(sizes) for sizes in charts.values()), default=0)
+        shape = (len(self.chart_names), max_sizes, len(self.measurements))
+        self.low = np.full(shape, np.nan)
+        self.high = np.full(shape, np.nan)
+        self.valid = np.zeros(shape[:2], dtype=bool)
+        self.size_names = []
+        for c, name in enumerate(self.chart_names):
+            self.size_names.append(list(charts[name]))
+            for s, ranges in enumerate(charts[name].values()):
+                self.valid[c, s] = True
+                for d, measurement in enumerate(self.measurements):
+                    if measurement in ranges:
+                        self.low[c, s, d], self.high[c, s, d] = ranges[measurement]
+        # A measurement missing from a size (e.g. free-size sarees) does not constrain it
+        self.constrained = ~np.isnan(self.low)
+        self.center = np.where(self.constrained, (self.low + self.high) / 2, 0.0)
+        self.half_width = np.where(self.constrained, np.maximum((self.high - self.low) / 2, 1e-6), 1.0)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_CHARTS_FILE):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['charts'], data['measurements'], data.get('skus'), data.get('category_keywords'))
+
+    def chart_for(self, sku):
+        """Chart name for a SKU (explicit mapping first, then keywords in its id), or None"""
+        if sku in self._chart_index:
+            return sku
+        chart = self.skus.get(sku)
+        if chart is None:
+            compact = sku.lower().replace('-', '').replace('_', '')
+            chart = next((name for keyword, name in self.category_keywords.items() if keyword in compact), None)
+        return chart if chart in self._chart_index else None
+
+    def _vectors(self, measurements):
+        """(queries x measurements) array, NaN where a measurement is missing"""
+        return np.array([[np.nan if m.get(name) is None else float(m[name]) for name in self.measurements]
+                         for m in measurements], dtype=float).reshape(len(measurements), len(self.measurements))
+
+    def score(self, measurements):
+        """Best size index and per-measurement normalised offsets for every query and chart"""
+        vectors = self._vectors(measurements)[:, None, None, :]          # (Q, 1, 1, D)
+        offsets = (vectors - self.center) / self.half_width              # (Q, C, S, D); |offset| <= 1 is within range
+        offsets = np.where(self.constrained & ~np.isnan(vectors), offsets, 0.0)
+        distance = np.sqrt((offsets ** 2).sum(axis=-1))
+        distance = np.where(self.valid, distance, np.inf)
+        return distance.argmin(axis=-1), distance, offsets
+
+    def recommend(self, measurements, skus=None):
+        """Recommendations for each measurement dict, for the given SKUs (default: every chart)
+
+        Returns one list per measurement dict with, per SKU: the best size,
+        whether every measurement falls inside it and the margin in cm to the
+        nearest edge of each range (negative when outside: 'tight' above the
+        range, 'loose' below it). Size and fits are None when the dict has none
+        of the measurements the SKU's chart is sized by.
+        """
+        targets = skus if skus is not None else self.chart_names
+        charts = [self.chart_for(sku) for sku in targets]
+        if not measurements:
+            return []
+        best, distance, offsets = self.score(measurements)
+        vectors = self._vectors(measurements)
+        sized_by = self.constrained.any(axis=1)  # (C, D): measurements any size of the chart constrains
+        results = []
+        for q in range(len(measurements)):
+            per_query = []
+            by_chart = {}  # Many SKUs share a chart; build each chart's answer once
+            for sku, chart in zip(targets, charts):
+                if chart is None:
+                    per_query.append({'sku': sku, 'chart': None, 'size': None})
+                    continue
+                if chart in by_chart:
+                    per_query.append(dict(by_chart[chart], sku=sku))
+                    continue
+                c = self._chart_index[chart]
+                present = ~np.isnan(vectors[q])
+                if not present.any() or (sized_by[c].any() and not (sized_by[c] & present).any()):
+                    # Nothing to size by: the nearest size would just be the first one
+                    by_chart[chart] = {'sku': sku, 'chart': chart, 'size': None, 'fits': None, 'margins': {}}
+                    per_query.append(by_chart[chart])
+                    continue
+                s = int(best[q, c])
+                margins = {}
+                fits = True
+                for d, name in enumerate(self.measurements):
+                    if not self.constrained[c, s, d] or np.isnan(vectors[q, d]):
+                        continue
+                    value = vectors[q, d]
+                    margin = min(value - self.low[c, s, d], self.high[c, s, d] - value)
+                    fit = 'ok' if margin >= 0 else ('tight' if value > self.high[c, s, d] else 'loose')
+                    fits = fits and fit == 'ok'
+                    margins[name] = {'cm': round(float(margin), 1), 'fit': fit}
+                by_chart[chart] = {
+                    'sku': sku,
+                    'chart': chart,
+                    'size': self.size_names[c][s],
+                    'fits': fits,
+                    'score': round(float(distance[q, c, s]), 3),
+                    'margins': margins
+                }
+                per_query.append(by_chart[chart])
+            results.append(per_query)
+        return results
+
+    def snapshot(self):
+        return {
+            'charts': len(self.chart_names),
+            'sizes': int(self.valid.sum()),
+            'measurements': self.measurements,
+            'skus': len(self.skus)
+        }
+
+
+def create_size_recommender():
+    """Size recommender loaded from SIZE_CHARTS_FILE (defaults to the bundled charts)"""
+    return SizeRecommender.from_file(os.getenv('SIZE_CHARTS_FILE', DEFAULT_CHARTS_FILE))
@@ -1,5 +1,5 @@
-from flask import Flask, Response, request, jsonify, render_template_string
-from flask_socketio import SocketIO, emit
+from flask import Flask, Response, request, jsonify, render_template_string, send_file, redirect
+from flask_socketio import SocketIO, emit, join_room
 from flask_cors import CORS
 import cv2
 import base64
@@ -9,7 +9,34 @@ import threading
 import time
 import os
 import requests
+import socket
+import queue
+import tempfile
+import gzip
+import hashlib
+import atexit
+from collections import deque
 from shoulder_distance import ShoulderDistanceCalculator
+from session_store import create_session_store
+from admission import create_admission_controller, TIER_REDUCED_FPS
+from tryon_jobs import TryOnJobQueue, TryOnError, QueueFullError, FINISHED_STATES, JOB_FAILED, JOB_SUCCEEDED
+from upstream_client import create_tryon_client, CircuitOpenError
+from upstream_scheduler import UpstreamBusyError, PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_SPECULATIVE
+from tryon_uploads import StagedUpload
+from tryon_cache import TryOnResultCache, SingleFlight, cache_key
+from result_store import ResultStore
+from tryon_preprocess import create_preprocessor, PoseDetector, SharedPreparation
+from local_tryon import LocalTryOnRenderer
+from garment_registry import GarmentRegistry
+from garment_recolor import create_garment_recolorer, parse_colour, COLOURS as GARMENT_COLOURS
+from size_recommender import create_size_recommender
+from catalog_service import create_catalog_service, FACETS as CATALOG_FACETS
+from multi_person import create_multi_person_estimator
+from measurement_history import create_measurement_history
+from asset_pipeline import load_asset_catalog
+from tryon_prefetch import PrefetchQueue
+from calibration_profiles import create_profile_store, DEFAULT_DEVICE
+from device_calibration import create_device_calibration_table
 import io
 from PIL import Image
 
@@ -24,7 +51,30 @@ CORS(app, resources={
         "allow_headers": ["Content-Type", "Authorization"]
     }
 })
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+# Multi-node support: with REDIS_URL set, Socket.IO events are relayed through
+# Redis and session state is shared by every API replica behind nginx
+REDIS_URL = os.getenv('REDIS_URL')
+NODE_ID = os.getenv('NODE_ID', socket.gethostname())
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=REDIS_URL)
+
+def unbuffered_writes(wsgi_app):
+    """eventlet.wsgi holds streamed writes until 4 KB have built up; send each chunk as it is produced
+    (set outside Flask-SocketIO's middleware, which hands the view a copy of the environ)"""
+    def middleware(environ, start_response):
+        environ['eventlet.minimum_write_chunk_size'] = 0
+        return wsgi_app(environ, start_response)
+    return middleware
+
+app.wsgi_app = unbuffered_writes(app.wsgi_app)
+session_store = create_session_store(REDIS_URL)
+calibration_profiles = create_profile_store()
+device_calibration = create_device_calibration_table()
+measurement_history = create_measurement_history()  # None when MEASUREMENT_HISTORY=0
+asset_catalog = load_asset_catalog()  # None until `python asset_pipeline.py` has been run
+
+# In-app admission control: concurrency limits, queueing and load shedding
+admission = create_admission_controller(sleep=socketio.sleep)
 
 # Add security headers to all responses
 @app.after_request
@@ -46,7 +96,6 @@ def add_security_headers(response):
     return response
 
 # Global variables
-calculator = ShoulderDistanceCalculator()
 current_frame = None
 processed_frame = None
 frame_lock = threading.Lock()
@@ -54,7 +103,8 @@ is_processing = False
 
 class VideoStreamProcessor:
     def __init__(self):
-        self.calculator = ShoulderDistanceCalculator()
+        # Calibration comes from the session's profile, never the shared calibration.json
+        self.calculator = ShoulderDistanceCalculator(calibration_file=None)
         self.frame_count = 0
         self.fps = 0
         self.last_time = time.time()
@@ -68,23 +118,29 @@ class VideoStreamProcessor:
         # Display calibration for frontend
         self.display_calibration = None
         self.display_multiplier = 1.0
+        self.learned_multiplier = None  # From the device calibration table, resolved per resolution
+        
+        # User calibration choice (manual px/cm or multiplier on top of dynamic calibration)
+        self.calibration_override = None
         
         # Store latest frame for virtual try-on
         self.latest_frame = None
         self.latest_processed_frame = None
         
-    def calculate_resolution_multiplier(self, frame_width, frame_height):
-        """Calculate resolution multiplier to maintain consistent measurements"""
-        ref_width, ref_height = self.reference_resolution
-        
-        # Calculate scaling factors for both dimensions
-        width_scale = frame_width / ref_width
-        height_scale = frame_height / ref_height
+        # Recent confident measurements, summarised for size recommendations
+        self.recent_measurements = deque(maxlen=30)
         
-        # Use average of both scales to maintain aspect ratio compensation
-        resolution_multiplier = (width_scale + height_scale) / 2
+        # Multi-person mode (kiosks): several tracked people, the client picks the target
+        self.multi_person = None
+        self.target_track_id = None
         
-        return 1/(1.13)
+    def calculate_resolution_multiplier(self, frame_width, frame_height):
+        """Multiplier over the reference calibration before anything is learned for this setup
+
+        The device calibration table's default rather than a ratio of frame sizes:
+        per-resolution corrections come from the multipliers users confirm.
+        """
+        return device_calibration.default_multiplier
     
     def set_display_calibration(self, video_width, video_height, display_width, display_height, screen_width, screen_height, device_pixel_ratio):
         """Set display calibration based on frontend dimensions"""
@@ -109,6 +165,11 @@ class VideoStreamProcessor:
         print(f"   Screen: {screen_width}x{screen_height}")
         print(f"   Device Pixel Ratio: {device_pixel_ratio}")
         print(f"   Display Multiplier: {self.display_multiplier:.2f}")
+        
+        # Calibrate for the reported capture resolution now rather than on the first frame
+        self.current_resolution = None
+        if video_width and video_height:
+            self.update_dynamic_calibration(int(video_width), int(video_height))
 
     def update_dynamic_calibration(self, frame_width, frame_height):
         """Update calibration based on current frame resolution and display size"""
@@ -116,22 +177,95 @@ class VideoStreamProcessor:
         
         if self.current_resolution != current_res:
             self.current_resolution = current_res
+            if (self.calibration_override or {}).get('auto'):
+                self.calculator.scale_estimator.reset()  # Samples were in the old resolution's pixels
             base_multiplier = self.calculate_resolution_multiplier(frame_width, frame_height)
             
-            # Apply display scaling correction
-            total_multiplier = base_multiplier * self.display_multiplier
+            # What users with the same setup confirmed, else the display scaling correction
+            self.learned_multiplier = None
+            if self.display_calibration:
+                self.learned_multiplier = device_calibration.resolve(frame_width, frame_height, self.display_calibration)
+            total_multiplier = self.learned_multiplier or base_multiplier * self.display_multiplier
             
             # Always adjust calibration for current resolution and display
             self.dynamic_calibration = self.reference_calibration * total_multiplier
             
             # Force update the calculator's calibration for consistency
-            self.calculator.pixels_per_cm = self.dynamic_calibration
+            self.calculator.pixels_per_cm = self.effective_calibration()
             
             print(f"🎯 Resolution: {frame_width}x{frame_height}")
-            print(f"📐 Base Multiplier: {base_multiplier:.2f}, Display Multiplier: {self.display_multiplier:.2f}")
+            print(f"📐 Base Multiplier: {base_multiplier:.2f}, Display Multiplier: {self.display_multiplier:.2f}"
+                  + (f", Learned Multiplier: {self.learned_multiplier:.2f}" if self.learned_multiplier else ""))
             print(f"🔧 Total Multiplier: {total_multiplier:.2f}, Final Calibration: {self.dynamic_calibration:.2f} px/cm")
             print(f"📏 Expected for 96cm: {650 * total_multiplier:.0f}px at current setup")
         
+    def effective_calibration(self):
+        """Dynamic calibration with the user's manual override or multiplier applied"""
+        base = self.dynamic_calibration or self.reference_calibration
+        override = self.calibration_override
+        if override:
+            if override.get('auto'):
+                return None  # Face-based scale estimated by the calculator
+            if override.get('pixels_per_cm'):
+                return override['pixels_per_cm']
+            if override.get('multiplier'):
+                return base * override['multiplier']
+        return base
+    
+    def set_calibration_override(self, override):
+        """Apply a calibration override ({'pixels_per_cm': x}, {'multiplier': m} or {'auto': True}, None resets)"""
+        if (override or {}).get('auto') and not (self.calibration_override or {}).get('auto'):
+            self.calculator.scale_estimator.reset()
+        self.calibration_override = override
+        self.calculator.pixels_per_cm = self.effective_calibration()
+        return self.calculator.pixels_per_cm
+    
+    def confirm_calibration(self):
+        """Teach the device table the multiplier this user just confirmed for their setup
+
+        The recorded multiplier already includes a {'multiplier': m} override, so
+        the override is folded into this session's learned multiplier and
+        cleared; keeping it would apply m again on top of the learned value.
+        """
+        effective = self.effective_calibration()
+        if not self.display_calibration or not self.current_resolution or not effective:
+            return None
+        width, height = self.current_resolution
+        multiplier = effective / self.reference_calibration
+        learned = device_calibration.record(width, height, self.display_calibration, multiplier)
+        if learned is not None and (self.calibration_override or {}).get('multiplier'):
+            self.learned_multiplier = multiplier
+            self.dynamic_calibration = effective
+            self.set_calibration_override(None)
+        return learned
+    
+    def set_multi_person(self, enabled):
+        """Switch multi-person mode on or off (the detector is built on first use)"""
+        if enabled and self.multi_person is None:
+            self.multi_person = create_multi_person_estimator()
+        elif not enabled:
+            self.multi_person = None
+            self.target_track_id = None
+    
+    def export_state(self):
+        """Session state that must survive reconnects and move between nodes"""
+        return {
+            'calibration': self.calibration_override,
+            'display_calibration': self.display_calibration,
+            'show_z_info': self.calculator.show_z_info,
+            'multi_person': self.multi_person is not None
+        }
+    
+    def apply_state(self, state):
+        """Restore session state exported by export_state (possibly on another node)"""
+        if state.get('display_calibration'):
+            self.set_display_calibration(**state['display_calibration'])
+        if 'show_z_info' in state:
+            self.calculator.show_z_info = bool(state['show_z_info'])
+        self.current_resolution = None  # Recompute dynamic calibration on the next frame
+        self.set_calibration_override(state.get('calibration'))
+        self.set_multi_person(bool(state.get('multi_person')))
+    
     def process_frame(self, frame):
         """Process a frame and return the processed frame with measurements"""
         try:
@@ -142,6 +276,9 @@ class VideoStreamProcessor:
             frame_height, frame_width = frame.shape[:2]
             self.update_dynamic_calibration(frame_width, frame_height)
             
+            if self.multi_person is not None:
+                return self.process_people(frame)
+            
             # Process the frame using shoulder distance calculator
             processed_frame, shoulder_3d, shoulder_pixels, shoulder_cm, waist_3d, waist_pixels, waist_cm, confidence, scale_info, z_info = self.calculator.process_frame(frame)
             
@@ -171,6 +308,7 @@ class VideoStreamProcessor:
                 'fps': float(self.fps),
                 'frame_count': self.frame_count,
                 'scale_info': scale_info,
+                'auto_scale': self.calculator.scale_estimator.state() if self.calculator.pixels_per_cm is None else None,
                 'z_info': z_info,
                 'timestamp': current_time,
                                  'resolution': {
@@ -179,23 +317,136 @@ class VideoStreamProcessor:
                      'multiplier': self.calculate_resolution_multiplier(frame_width, frame_height),
                      'display_multiplier': float(self.display_multiplier),
                      'dynamic_calibration': float(self.dynamic_calibration) if self.dynamic_calibration else None,
+                     'learned_multiplier': self.learned_multiplier,
                      'display_info': self.display_calibration
                  }
             }
             
+            if shoulder_cm and waist_cm and confidence >= 0.5:
+                self.recent_measurements.append((float(shoulder_cm), float(waist_cm), float(confidence)))
+            
             return processed_frame, measurements
             
         except Exception as e:
             print(f"Error processing frame: {e}")
             return frame, None
+    
+    def process_people(self, frame):
+        """Multi-person variant of process_frame: the target person's measurements plus everyone tracked"""
+        processed_frame = frame.copy()
+        people = self.multi_person.process(frame, self.calculator.pixels_per_cm)
+        ids = [person['track_id'] for person in people]
+        if self.target_track_id not in self.multi_person.tracker.tracks:
+            # Target left: the largest (usually nearest) person until the client picks someone
+            if self.target_track_id is not None:
+                self.recent_measurements.clear()
+            self.target_track_id = ids[0] if ids else None
+        target = next((person for person in people if person['track_id'] == self.target_track_id), None)
+        self.multi_person.draw(processed_frame, people, self.target_track_id)
+        self.latest_processed_frame = processed_frame.copy()
+        
+        current_time = time.time()
+        if current_time - self.last_time > 0:
+            self.fps = 1 / (current_time - self.last_time)
+        self.last_time = current_time
+        self.frame_count += 1
+        
+        if target and target['shoulder_cm'] and target['confidence'] >= 0.5:
+            self.recent_measurements.append((target['shoulder_cm'], target['waist_cm'], target['confidence']))
+        
+        frame_height, frame_width = frame.shape[:2]
+        measurements = {
+            'shoulder_3d': None,
+            'shoulder_pixels': target['shoulder_pixels'] if target else 0.0,
+            'shoulder_cm': target['shoulder_cm'] if target else None,
+            'waist_3d': None,
+            'waist_pixels': target['waist_pixels'] if target else 0.0,
+            'waist_cm': target['waist_cm'] if target else None,
+            'confidence': target['confidence'] if target else 0.0,
+            'fps': float(self.fps),
+            'frame_count': self.frame_count,
+            'scale_info': f"Calibration: {self.calculator.pixels_per_cm:.2f} px/cm" if self.calculator.pixels_per_cm else "No calibration",
+            'z_info': None,
+            'timestamp': current_time,
+            'target_id': self.target_track_id,
+            'people': [{key: value for key, value in person.items() if key != 'landmarks'} for person in people],
+            'detector': self.multi_person.backend,
+            'resolution': {
+                'width': frame_width,
+                'height': frame_height,
+                'display_multiplier': float(self.display_multiplier),
+                'dynamic_calibration': float(self.dynamic_calibration) if self.dynamic_calibration else None
+            }
+        }
+        return processed_frame, measurements
+    
+    def final_measurements(self):
+        """Median of the recent confident measurements, or None before any"""
+        if not self.recent_measurements:
+            return None
+        values = np.array(self.recent_measurements)
+        return {
+            'shoulder_cm': round(float(np.median(values[:, 0])), 1),
+            'waist_cm': round(float(np.median(values[:, 1])), 1),
+            'confidence': round(float(values[:, 2].mean()), 3),
+            'frames': len(values)
+        }
 
-# Global video processor
+# Global video processor (REST /process_image)
 video_processor = VideoStreamProcessor()
 
-@app.route('/')
-def index():
-    """Serve the main interface"""
-    html = """
+# Per-session processors for Socket.IO clients on this node. State lives in the
+# session store; processors are rebuilt from it on whichever node a client lands.
+session_processors = {}
+socket_sessions = {}  # Socket.IO sid -> session id
+session_profiles = {}  # session id -> (user id, device id) of its calibration profile
+session_lock = threading.Lock()
+
+def current_session_id():
+    """Session id of the Socket.IO client handling the current event"""
+    return socket_sessions.get(request.sid, request.sid)
+
+def get_session_processor(session_id=None):
+    """Return (creating and hydrating if needed) the processor for a session"""
+    session_id = session_id or current_session_id()
+    with session_lock:
+        processor = session_processors.get(session_id)
+        if processor is None:
+            processor = VideoStreamProcessor()
+            processor.apply_state(session_store.get_session(session_id))
+            session_processors[session_id] = processor
+    return processor
+
+def save_session_state(session_id=None, processor=None):
+    """Write a session's processor state through to the shared store"""
+    session_id = session_id or current_session_id()
+    processor = processor or get_session_processor(session_id)
+    session_store.update_session(session_id, node_id=NODE_ID, **processor.export_state())
+
+def apply_calibration_profile(session_id, processor):
+    """Apply the session's stored calibration profile (once, when the client connects)"""
+    profile_key = session_profiles.get(session_id)
+    profile = calibration_profiles.get(*profile_key) if profile_key else None
+    if profile is None:
+        return False
+    state = processor.export_state()
+    state.update({field: profile[field] for field in ('calibration', 'display_calibration')})
+    processor.apply_state(state)
+    save_session_state(session_id, processor)
+    return True
+
+def save_calibration_profile(session_id=None, processor=None):
+    """Write a session's calibration through to its user/device profile"""
+    session_id = session_id or current_session_id()
+    profile_key = session_profiles.get(session_id)
+    if profile_key is None:
+        return
+    processor = processor or get_session_processor(session_id)
+    calibration_profiles.save(*profile_key, calibration=processor.calibration_override,
+                              display_calibration=processor.display_calibration)
+
+# The main interface is static: encoded, compressed and hashed once at import
+INDEX_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -245,6 +496,7 @@ def index():
                      <label>Calibration Multiplier: </label>
                      <input type="range" id="multiplierSlider" min="0.1" max="3.0" step="0.1" value="1.0" onchange="updateMultiplier(this.value)">
                      <span id="multiplierValue">1.0x</span>
+                                           <button onclick="confirmCalibration()">Save</button>
                                            <button onclick="resetCalibration()">Reset</button>
                   </div>
                   <div style="margin-top: 10px;">
@@ -289,14 +541,21 @@ def index():
             let ctx;
             let isStreaming = false;
             let mediaStream;
+            let frameInterval = 100; // ~10 FPS, raised when the server throttles
 
             function initializeComponents() {
                 inputVideo = document.getElementById('inputVideo');
                 outputCanvas = document.getElementById('outputCanvas');
                 ctx = outputCanvas.getContext('2d');
                 
-                // Connect to WebSocket
-                socket = io();
+                // Connect to WebSocket with a stable session id so calibration
+                // survives reconnects and moves with us between API replicas
+                let sessionId = localStorage.getItem('shoulderApiSessionId');
+                if (!sessionId) {
+                    sessionId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+                    localStorage.setItem('shoulderApiSessionId', sessionId);
+                }
+                socket = io({ auth: { session_id: sessionId } });
                 
                 socket.on('connect', function() {
                     document.getElementById('status').textContent = 'Connected to server';
@@ -318,15 +577,28 @@ def index():
                      showStatusMessage('Error: ' + data.message, 'error');
                  });
                 
+                socket.on('throttle', function(data) {
+                    // Server is shedding load: slow down (or back off after a rejection)
+                    frameInterval = data.max_fps ? 1000 / data.max_fps : 100;
+                    if (data.rejected) {
+                        showStatusMessage('Server busy, retrying in ' + data.retry_after + 's', 'error');
+                    }
+                });
+                
                 socket.on('processed_frame', function(data) {
-                    // Display processed frame
-                    const img = new Image();
-                    img.onload = function() {
-                        outputCanvas.width = img.width;
-                        outputCanvas.height = img.height;
-                        ctx.drawImage(img, 0, 0);
-                    };
-                    img.src = 'data:image/jpeg;base64,' + data.frame;
+                    // Display processed frame (omitted when the server sends landmarks only)
+                    if (data.frame) {
+                        const img = new Image();
+                        img.onload = function() {
+                            outputCanvas.width = img.width;
+                            outputCanvas.height = img.height;
+                            ctx.drawImage(img, 0, 0);
+                        };
+                        img.src = 'data:image/jpeg;base64,' + data.frame;
+                    }
+                    if (data.quality_tier === 'normal') {
+                        frameInterval = 100;
+                    }
                     
                     // Update measurements
                     if (data.measurements) {
@@ -407,7 +679,7 @@ def index():
                 
                 socket.emit('process_frame', { frame: base64Data });
                 
-                setTimeout(sendFrames, 100); // Send ~10 FPS
+                setTimeout(sendFrames, frameInterval); // Send ~10 FPS unless throttled
             }
 
             function updateMeasurements(measurements) {
@@ -464,6 +736,13 @@ def index():
                  socket.emit('calibrate', { multiplier: parseFloat(value) });
              }
 
+                           function confirmCalibration() {
+                  // The confirmed multiplier becomes the new base: the slider starts again from 1.0x
+                  document.getElementById('multiplierSlider').value = '1.0';
+                  document.getElementById('multiplierValue').textContent = '1.0x';
+                  socket.emit('confirm_calibration');
+              }
+
                            function resetCalibration() {
                   document.getElementById('multiplierSlider').value = '1.0';
                   document.getElementById('multiplierValue').textContent = '1.0x';
@@ -496,7 +775,7 @@ def index():
                   .then(response => response.json())
                   .then(data => {
                       if (data.success) {
-                          showTryOnResult(data.result_image, data.result_filename, data.seed);
+                          showTryOnResult(data.result_url, data.result_filename, data.seed);
                           showTryOnStatus('✅ Virtual try-on completed successfully!', 'success');
                       } else {
                           showTryOnStatus('❌ Error: ' + data.error, 'error');
@@ -531,12 +810,12 @@ def index():
                   }
               }
               
-              function showTryOnResult(imageBase64, filename, seed) {
+              function showTryOnResult(imageUrl, filename, seed) {
                   const resultDiv = document.getElementById('tryOnResult');
                   const resultImg = document.getElementById('resultImage');
                   const resultInfo = document.getElementById('resultInfo');
                   
-                  resultImg.src = imageBase64;
+                  resultImg.src = imageUrl;
                   resultInfo.innerHTML = `<strong>Result saved as:</strong> ${filename}<br><strong>Seed:</strong> ${seed}`;
                   resultDiv.style.display = 'block';
                   
@@ -570,7 +849,36 @@ def index():
     </body>
     </html>
     """
-    return html
+INDEX_HTML_BYTES = INDEX_HTML.encode('utf-8')
+INDEX_HTML_GZIP = gzip.compress(INDEX_HTML_BYTES, compresslevel=9, mtime=0)
+INDEX_HTML_ETAG = hashlib.sha256(INDEX_HTML_BYTES).hexdigest()[:32]
+
+@app.route('/')
+def index():
+    """Serve the main interface"""
+    gzip_ok = 'gzip' in request.headers.get('Accept-Encoding', '')
+    response = Response(INDEX_HTML_GZIP if gzip_ok else INDEX_HTML_BYTES, mimetype='text/html')
+    if gzip_ok:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(INDEX_HTML_ETAG + ('-gzip' if gzip_ok else ''))
+    return response.make_conditional(request)
+
+@app.route('/app/')
+@app.route('/app/<path:filename>')
+def app_asset(filename='index.html'):
+    """Built frontend assets: fingerprinted files are immutable, the rest revalidate by ETag"""
+    if asset_catalog is None:
+        return jsonify({'error': 'Frontend assets are not built (run python asset_pipeline.py)'}), 404
+    resolved = asset_catalog.resolve(filename, request.headers.get('Accept-Encoding', ''))
+    if resolved is None:
+        return jsonify({'error': 'Unknown asset'}), 404
+    path, headers = resolved
+    response = send_file(path, mimetype=headers.pop('Content-Type'), conditional=True,
+                         etag=headers.pop('ETag').strip('"'))
+    response.headers.update(headers)
+    return response
 
 @app.route('/health')
 def health():
@@ -578,6 +886,9 @@ def health():
     return jsonify({
         'status': 'healthy',
         'service': 'shoulder-distance-api',
+        'node_id': NODE_ID,
+        'session_store': session_store.backend,
+        'session_store_ok': session_store.ping(),
         'timestamp': time.time()
     })
 
@@ -587,11 +898,29 @@ def status():
     return jsonify({
         'is_processing': is_processing,
         'calibration': {
-            'pixels_per_cm': calculator.pixels_per_cm,
-            'user_calibration': calculator.user_calibration,
-            'has_saved_calibration': calculator.pixels_per_cm is not None
+            'pixels_per_cm': video_processor.calculator.pixels_per_cm,
+            'user_calibration': video_processor.calculator.user_calibration,
+            'override': video_processor.calibration_override
         },
-        'show_z_info': calculator.show_z_info,
+        'show_z_info': video_processor.calculator.show_z_info,
+        'node_id': NODE_ID,
+        'active_sessions': len(session_processors),
+        'calibration_profiles': calibration_profiles.snapshot(),
+        'device_calibration': device_calibration.snapshot(),
+        'admission': admission.snapshot(),
+        'tryon_jobs': tryon_jobs.stats(),
+        'tryon_upstream': tryon_upstream.snapshot(),
+        'tryon_cache': {**tryon_cache.snapshot(), 'shared_in_flight': tryon_singleflight.shared},
+        'result_store': result_store.snapshot(),
+        'tryon_preprocess': tryon_preprocessor.snapshot() if tryon_preprocessor else None,
+        'garments': garment_registry.snapshot(),
+        'garment_recolor': garment_recolorer.snapshot(),
+        'size_charts': size_recommender.snapshot(),
+        'catalog': catalog_service.snapshot(),
+        'local_tryon': {'default_backend': TRYON_BACKEND, **local_renderer.snapshot()},
+        'tryon_prefetch': tryon_prefetch.snapshot() if tryon_prefetch else None,
+        'measurement_history': measurement_history.snapshot() if measurement_history else None,
+        'assets': asset_catalog.snapshot() if asset_catalog else None,
         'endpoints': {
             'websocket': 'ws://localhost:8000',
             'web_interface': 'http://localhost:8000',
@@ -602,135 +931,916 @@ def status():
         'timestamp': time.time()
     })
 
+def prepare_tryon_request():
+    """Validate a try-on upload and stage it for a worker. Returns (payload, None) or (None, error response)."""
+    # Catalog garments are referenced by id instead of being uploaded
+    garment_id = request.form.get('garment_id')
+    garment = None
+    if garment_id:
+        garment = garment_registry.get(garment_id)
+        if garment is None:
+            return None, (jsonify({'error': f'Unknown garment_id: {garment_id}', 'garments_url': '/garments'}), 404)
+        garment_content, garment_extension = garment.content, garment.extension
+        colour = request.form.get('colour')
+        if colour:
+            # Colourways are rendered from the registry garment, not uploaded
+            try:
+                garment_content, garment_extension = garment_recolorer.render(garment, colour), '.jpg'
+            except ValueError as e:
+                return None, (jsonify({'error': str(e), 'colours': list(GARMENT_COLOURS)}), 400)
+    
+    # Otherwise check if clothing image is provided
+    elif 'clothing_image' not in request.files:
+        return None, (jsonify({'error': 'No clothing image provided'}), 400)
+    
+    elif request.files['clothing_image'].filename == '':
+        return None, (jsonify({'error': 'No clothing image selected'}), 400)
+    
+    # Check if avatar image is provided (now required)
+    if 'avatar_image' not in request.files:
+        return None, (jsonify({'error': 'No avatar image provided. Please upload both clothing and avatar images.'}), 400)
+        
+    avatar_file = request.files['avatar_image']
+    if avatar_file.filename == '':
+        return None, (jsonify({'error': 'No avatar image selected. Please upload both clothing and avatar images.'}), 400)
+    
+    backend = request.form.get('backend', TRYON_BACKEND)
+    error = check_tryon_backend(backend)
+    if error:
+        return None, error
+    
+    # Stage uploads in memory before the request ends (spooled to a private
+    # temp dir only when large); the worker streams them upstream
+    if garment:
+        clothing = StagedUpload(garment_content, 'clothing', garment_extension)
+    else:
+        clothing = StagedUpload.from_file_storage(request.files['clothing_image'], 'clothing')
+    
+    # Use uploaded avatar image
+    print(f"📸 Using uploaded avatar image: {avatar_file.filename}")
+    avatar = StagedUpload.from_file_storage(avatar_file, 'avatar', extension='.jpg')
+    return make_tryon_payload(clothing, avatar, garment_id if garment else None, backend, user=tryon_user()), None
+
+def tryon_user():
+    """Who a try-on is for, for fair sharing of the provider's rate limit: session, else client address"""
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    return request.form.get('session_id') or forwarded.split(',')[0].strip() or request.remote_addr
+
+def check_tryon_backend(backend):
+    """Error response when a try-on cannot use this backend, else None"""
+    # remote: diffusion service, local: CPU warp preview, auto: remote with local fallback
+    if backend not in TRYON_BACKENDS:
+        return jsonify({'error': f'Unknown backend: {backend}', 'backends': list(TRYON_BACKENDS)}), 400
+    
+    if backend == 'remote' and RAPIDAPI_KEY == 'YOUR_RAPIDAPI_KEY_HERE':
+        return jsonify({
+            'error': 'RapidAPI key not configured',
+            'message': 'Please set the RAPIDAPI_KEY environment variable with your RapidAPI key',
+            'instructions': 'export RAPIDAPI_KEY=your_actual_key_here'
+        }), 400
+    return None
+
+def make_tryon_payload(clothing, avatar, garment_id, backend, prepared_avatar=None, user=None,
+                       priority=PRIORITY_INTERACTIVE):
+    """Worker payload for staged uploads, keyed by the content address of the try-on"""
+    # Identical inputs give identical results
+    return {
+        'clothing': clothing,
+        'avatar': avatar,
+        'garment_id': garment_id,
+        'backend': backend,
+        'prepared_avatar': prepared_avatar,
+        'user': user,
+        'priority': priority,
+        'cache_key': cache_key(clothing.file, avatar.file, tryon_cache_params())
+    }
+
+def tryon_cache_params():
+    """Request parameters that are part of every try-on's cache key"""
+    return {
+        'endpoint': '/try-on-file',
+        'preprocess': tryon_preprocessor.settings() if tryon_preprocessor else None
+    }
+
+def discard_tryon_payload(payload):
+    """Release a staged try-on's uploads"""
+    payload['clothing'].close()
+    payload['avatar'].close()
+
+def call_tryon_upstream(clothing, avatar, user=None, priority=PRIORITY_INTERACTIVE, on_wait=None, key=None):
+    """Call the RapidAPI try-on service as `user` at `priority`; returns (image bytes, seed)"""
+    # Stream the staged uploads with proper MIME types
+    files = {
+        'clothing_image': clothing.multipart(),
+        'avatar_image': avatar.multipart()
+    }
+    
+    print(f"🎭 Calling virtual try-on API...")
+    print(f"   Clothing: {clothing.filename} ({clothing.mimetype}, {clothing.size} bytes)")
+    print(f"   Avatar: {avatar.filename} ({avatar.mimetype}, {avatar.size} bytes) - Uploaded")
+    try:
+        response = tryon_upstream.post('/try-on-file', files=files, user=user, priority=priority, on_wait=on_wait, key=key)
+    except CircuitOpenError as e:
+        raise TryOnError(str(e), 503)
+    except UpstreamBusyError as e:
+        raise TryOnError(str(e), 503)
+    except requests.exceptions.RequestException as e:
+        raise TryOnError(f'Try-on service request failed: {e}', 504 if isinstance(e, requests.exceptions.Timeout) else 502)
+    
+    if response.status_code != 200:
+        error_msg = f"RapidAPI error: {response.status_code}"
+        try:
+            error_detail = response.json()
+            error_msg += f" - {error_detail}"
+        except:
+            error_msg += f" - {response.text[:200]}"
+        
+        print(f"❌ Virtual try-on failed: {error_msg}")
+        raise TryOnError(error_msg, response.status_code)
+    
+    return response.content, response.headers.get('X-Seed', 'unknown')
+
+def save_tryon_result(job_id, content, seed, cached=False, backend='remote'):
+    """Store a job's result image and return the job's result fields"""
+    result = result_store.put(content, job_id=job_id, seed=seed, cached=cached, backend=backend)
+    result_id = result['result_id']
+    
+    print(f"✅ Virtual try-on successful! Result stored as {result_id}{' (cached)' if cached else ''} [{backend}]")
+    return {
+        'result_id': result_id,
+        'result_filename': f'{result_id}.jpg',
+        'result_url': f'/results/{result_id}',
+        'thumbnail_url': f'/results/{result_id}/thumbnail',
+        'seed': seed,
+        'cached': cached,
+        'backend': backend
+    }
+
+def render_local_tryon(payload):
+    """Composite the garment onto the avatar on this machine; returns (image bytes, info)"""
+    content, info = local_renderer.render(payload['clothing'].read(), payload['avatar'].read())
+    print(f"🧵 Local try-on rendered in {info['elapsed_ms']} ms")
+    return content, info
+
+def local_fallback_reason(backend):
+    """Why an auto try-on should be rendered locally right away, or None to go upstream"""
+    if backend == 'local':
+        return 'requested'
+    if backend == 'auto':
+        if RAPIDAPI_KEY == 'YOUR_RAPIDAPI_KEY_HERE':
+            return 'no_api_key'
+        if tryon_upstream.breaker.is_open():
+            return 'circuit_open'
+    return None
+
+def preprocess_tryon_uploads(clothing, avatar, report, garment_id=None, prepared_avatar=None):
+    """Crop and shrink staged uploads before they go upstream; fills report with the byte savings"""
+    started = time.time()
+    if garment_id:
+        # Registry garments were normalised at startup
+        clothing_bytes = clothing.read()
+        report['clothing'] = {'kind': 'garment', 'garment_id': garment_id, 'bytes': clothing.size, 're_encoded': False}
+    else:
+        clothing_bytes, report['clothing'] = tryon_preprocessor.prepare_garment(clothing.read())
+    if prepared_avatar:
+        # Batch try-ons crop the shared avatar once
+        avatar_bytes, avatar_report = prepared_avatar.get()
+        report['avatar'] = dict(avatar_report, shared=True)
+    else:
+        avatar_bytes, report['avatar'] = tryon_preprocessor.prepare_avatar(avatar.read())
+    report['bytes_saved'] = (clothing.size + avatar.size) - (len(clothing_bytes) + len(avatar_bytes))
+    report['elapsed_ms'] = round((time.time() - started) * 1000, 1)
+    print(f"🪄 Pre-processed try-on images: {clothing.size + avatar.size} -> "
+          f"{len(clothing_bytes) + len(avatar_bytes)} bytes in {report['elapsed_ms']} ms")
+    
+    if report['clothing']['re_encoded']:
+        clothing = StagedUpload(clothing_bytes, 'clothing', '.jpg')
+    if report['avatar']['re_encoded']:
+        avatar = StagedUpload(avatar_bytes, 'avatar', '.jpg')
+    return clothing, avatar
+
+def generate_tryon(payload, report, progress):
+    """Pre-process a staged try-on, call the provider and cache the result; returns (image bytes, seed)"""
+    clothing, avatar = payload['clothing'], payload['avatar']
+    if tryon_preprocessor:
+        progress(20, 'Preparing images')
+        clothing, avatar = preprocess_tryon_uploads(clothing, avatar, report, payload['garment_id'],
+                                                    payload['prepared_avatar'])
+    def waiting(position, eta):
+        # Place in the provider's rate-limit line (0 once the call goes out)
+        if position:
+            progress(25, f'Waiting for the try-on service (position {position})',
+                     upstream_position=position, upstream_eta=round(eta, 1))
+        else:
+            progress(30, 'Generating try-on', upstream_position=0, upstream_eta=0)
+    
+    try:
+        progress(30, 'Generating try-on')
+        content, seed = call_tryon_upstream(clothing, avatar, payload['user'], payload['priority'], waiting,
+                                            payload['cache_key'])
+    finally:
+        if clothing is not payload['clothing']:
+            clothing.close()
+        if avatar is not payload['avatar']:
+            avatar.close()
+    tryon_cache.put(payload['cache_key'], content, seed=seed)
+    return content, seed
+
+def run_tryon_job(job_id, payload, progress):
+    """Produce a queued job's result from the cache or the try-on service (runs on a worker thread)"""
+    cache_key = payload['cache_key']
+    cached = tryon_cache.get(cache_key)
+    if cached:
+        content, meta = cached
+        return save_tryon_result(job_id, content, meta.get('seed', 'unknown'), cached=True)
+    
+    report = {}
+    
+    # Identical try-ons already in flight (including prefetches) share one upstream call
+    try:
+        (content, seed), shared = tryon_singleflight.do(cache_key, lambda: generate_tryon(payload, report, progress))
+    except TryOnError as e:
+        # Provider down, throttled or out of quota: fall back to a local preview
+        if payload['backend'] != 'auto' or not (e.status_code == 429 or e.status_code >= 500):
+            raise
+        print(f"🧵 Try-on service failed ({e}), rendering locally instead")
+        content, info = render_local_tryon(payload)
+        return {**save_tryon_result(job_id, content, None, backend='local'),
+                'local_reason': 'upstream_failed', 'upstream_error': str(e)}
+    
+    # Save the result image
+    progress(90, 'Saving result')
+    result = save_tryon_result(job_id, content, seed, cached=shared)
+    if report:
+        result['preprocess'] = report
+    return result
+
+def notify_tryon_job(job):
+    """Push job status to subscribers of the job and to its owning session"""
+    socketio.emit('tryon_progress', job, to=f"tryon_job:{job['job_id']}")
+    if job.get('session_id'):
+        socketio.emit('tryon_progress', job, to=f"session:{job['session_id']}")
+
+# Get RapidAPI key from environment or use placeholder
+RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY', '3b32b26a5bmshc04f14a1db17c69p175b48jsnbc94d160d90d')
+
+# Shared keep-alive client for the try-on provider (pooling, retries, circuit breaker)
+tryon_upstream = create_tryon_client(RAPIDAPI_KEY)
+TRYON_SYNC_TIMEOUT = tryon_upstream.timeout[0] + tryon_upstream.timeout[1] + 30
+
+# Default try-on backend when a request does not choose one
+TRYON_BACKENDS = ('remote', 'local', 'auto')
+TRYON_BACKEND = os.getenv('TRYON_BACKEND', 'auto')
+
+# Result images never change once stored, so browsers and proxies may keep them
+RESULT_MAX_AGE = 365 * 24 * 3600
+
+# Avatar crop / garment trim / downscale before uploads go upstream (TRYON_PREPROCESS=0 disables)
+pose_detector = PoseDetector()
+tryon_preprocessor = create_preprocessor(pose_detector)
+
+# Local warp-and-blend renderer: per-request backend=local, or automatic fallback
+local_renderer = LocalTryOnRenderer(pose_detector)
+
+# Catalog garments, normalised once and referenced by garment_id
+garment_registry = GarmentRegistry(
+    os.getenv('GARMENT_CATALOG_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'virtual-try-on-app')),
+    preprocessor=tryon_preprocessor
+)
+
+# Colourways of registry garments, rendered on demand and cached
+garment_recolorer = create_garment_recolorer(garment_registry)
+
+# Brand size charts for size recommendations from measurements
+size_recommender = create_size_recommender()
+
+# Catalog item metadata, indexed once for filtered search
+catalog_service = create_catalog_service()
+
+# Result images are served from /results/<id> under a retention cap
+result_store = ResultStore(
+    directory=os.getenv('TRYON_RESULTS_DIR', 'tryon_results'),
+    max_results=int(os.getenv('TRYON_RESULTS_MAX_COUNT', 1000)),
+    max_bytes=int(os.getenv('TRYON_RESULTS_MAX_MB', 1024)) * 1024 * 1024,
+    max_age=float(os.getenv('TRYON_RESULTS_MAX_AGE_HOURS', 0)) * 3600 or None
+)
+
+# Content-addressed result cache; identical in-flight try-ons share one upstream call
+tryon_cache = TryOnResultCache(
+    directory=os.getenv('TRYON_CACHE_DIR', 'tryon_cache'),
+    max_bytes=int(os.getenv('TRYON_CACHE_MAX_MB', 512)) * 1024 * 1024
+)
+atexit.register(tryon_cache.flush_access_times)  # Hits since the last batched write
+tryon_singleflight = SingleFlight()
+
+tryon_jobs = TryOnJobQueue(
+    run_tryon_job,
+    session_store,
+    notify=notify_tryon_job,
+    max_workers=int(os.getenv('TRYON_WORKERS', 4)),
+    max_pending=int(os.getenv('TRYON_MAX_PENDING', 32)),
+    sleep=socketio.sleep
+)
+
+def tryon_has_spare_capacity():
+    """Idle workers, nothing queued, a rate-limit token free and the provider healthy: room for speculative try-ons"""
+    stats = tryon_jobs.stats()
+    if stats['queued'] or stats['running'] >= stats['workers'] or tryon_upstream.breaker.retry_after() > 0:
+        return False
+    return tryon_upstream.scheduler is None or tryon_upstream.scheduler.idle()
+
+def run_tryon_prefetch(session_id, garment_id, avatar):
+    """Generate one predicted try-on into the cache (prefetch thread); returns its cache key"""
+    garment = garment_registry.get(garment_id)
+    if garment is None:
+        return None
+    payload = make_tryon_payload(StagedUpload(garment.content, 'clothing', garment.extension),
+                                 StagedUpload(avatar['data'], 'avatar', '.jpg'),
+                                 garment_id, 'remote', avatar['prepared'], session_id, PRIORITY_SPECULATIVE)
+    try:
+        if payload['cache_key'] in tryon_cache:
+            return None
+        print(f"🔮 Prefetching try-on of {garment_id} for session {session_id}")
+        tryon_singleflight.do(payload['cache_key'], lambda: generate_tryon(payload, {}, lambda *args, **fields: None))
+        return payload['cache_key']
+    finally:
+        discard_tryon_payload(payload)
+
+# Speculative try-ons of garments the frontend predicts, on spare capacity only (TRYON_PREFETCH=0 disables)
+tryon_prefetch = None
+if os.getenv('TRYON_PREFETCH', '1').lower() not in ('0', 'false', 'no') and RAPIDAPI_KEY != 'YOUR_RAPIDAPI_KEY_HERE':
+    tryon_prefetch = PrefetchQueue(
+        run_tryon_prefetch,
+        tryon_has_spare_capacity,
+        max_per_session=int(os.getenv('TRYON_PREFETCH_PER_SESSION', 3)),
+        avatar_ttl=float(os.getenv('TRYON_PREFETCH_AVATAR_TTL', 1800))
+    )
+
+# Batch try-ons: garments per batch, and how many of a batch's jobs may be queued at once
+TRYON_BATCH_MAX_ITEMS = int(os.getenv('TRYON_BATCH_MAX_ITEMS', 20))
+TRYON_BATCH_CONCURRENCY = int(os.getenv('TRYON_BATCH_CONCURRENCY', 4))
+
+def dispatch_tryon_payload(payload, session_id=None, on_finished=None):
+    """Answer a staged try-on from the cache or locally, or queue it. Returns (job, None) or (None, (error fields, status)).
+    
+    Raises QueueFullError with the payload still staged so the caller can retry or discard it."""
+    # The shopper has chosen: speculative work for their session gives way, and a
+    # prefetch of this very try-on that is waiting for a rate-limit slot moves up
+    if session_id and tryon_prefetch:
+        tryon_prefetch.cancel(session_id)
+    if tryon_upstream.scheduler:
+        tryon_upstream.scheduler.promote(payload['cache_key'], payload['priority'])
+    
+    # Repeat (or prefetched) try-ons are answered from the cache without queueing
+    cached = tryon_cache.get(payload['cache_key']) if payload['backend'] != 'local' else None
+    if cached:
+        discard_tryon_payload(payload)
+        content, meta = cached
+        prefetched = bool(tryon_prefetch and tryon_prefetch.claim(payload['cache_key']))
+        job = tryon_jobs.record_completed(
+            lambda job_id: {**save_tryon_result(job_id, content, meta.get('seed', 'unknown'), cached=True),
+                            'prefetched': prefetched},
+            session_id=session_id)
+        return job, None
+    
+    # Local renders take well under a second, so they are answered inline
+    reason = local_fallback_reason(payload['backend'])
+    if reason:
+        try:
+            content, info = render_local_tryon(payload)
+        except TryOnError as e:
+            return None, ({'error': str(e)}, e.status_code)
+        finally:
+            discard_tryon_payload(payload)
+        job = tryon_jobs.record_completed(
+            lambda job_id: {**save_tryon_result(job_id, content, None, backend='local'),
+                            'local_reason': reason, 'render_ms': info['elapsed_ms']},
+            session_id=session_id)
+        return job, None
+    
+    # Fail fast while the provider is known to be down instead of queueing doomed work
+    retry_after = tryon_upstream.breaker.retry_after()
+    if retry_after > 0:
+        discard_tryon_payload(payload)
+        return None, ({'error': 'Try-on service temporarily unavailable', 'retry_after': int(retry_after) + 1}, 503)
+    
+    def finished():
+        discard_tryon_payload(payload)
+        if on_finished:
+            on_finished()
+    
+    return tryon_jobs.submit(payload, session_id=session_id, on_discard=finished), None
+
+def tryon_error_response(fields, status_code):
+    """JSON error response, with a Retry-After header when the fields carry retry_after"""
+    response = jsonify(fields)
+    if 'retry_after' in fields:
+        response.headers['Retry-After'] = str(fields['retry_after'])
+    return response, status_code
+
+def submit_tryon_job():
+    """Validate and queue a try-on from the current request. Returns (job, None) or (None, error response)."""
+    payload, error = prepare_tryon_request()
+    if error:
+        return None, error
+    
+    try:
+        job, failure = dispatch_tryon_payload(payload, session_id=request.form.get('session_id'))
+    except QueueFullError as e:
+        discard_tryon_payload(payload)
+        failure = ({'error': str(e), 'retry_after': 5}, 503)
+    if failure:
+        return None, tryon_error_response(*failure)
+    return job, None
+
+def tryon_job_links(job_id):
+    return {
+        'status_url': f'/virtual-tryon/jobs/{job_id}',
+        'events_url': f'/virtual-tryon/jobs/{job_id}/events'
+    }
+
+@app.route('/virtual-tryon/jobs', methods=['POST'])
+def create_virtual_tryon_job():
+    """Queue a virtual try-on and return its job id immediately"""
+    try:
+        job, error = submit_tryon_job()
+        if error:
+            return error
+        return jsonify({'success': True, **job, **tryon_job_links(job['job_id'])}), 202
+    except Exception as e:
+        print(f"❌ Virtual try-on error: {str(e)}")
+        return jsonify({'error': f'Virtual try-on failed: {str(e)}'}), 500
+
 @app.route('/virtual-tryon', methods=['POST'])
+@admission.limit('tryon')
 def virtual_tryon():
     """Virtual try-on endpoint requiring both clothing and avatar images"""
     for i in range(10):
         print("virtual try on api called")
     try:
-        # Check if clothing image is provided
-        if 'clothing_image' not in request.files:
-            return jsonify({'error': 'No clothing image provided'}), 400
-        
-        clothing_file = request.files['clothing_image']
-        if clothing_file.filename == '':
-            return jsonify({'error': 'No clothing image selected'}), 400
-        
-        # Check if avatar image is provided (now required)
-        if 'avatar_image' not in request.files:
-            return jsonify({'error': 'No avatar image provided. Please upload both clothing and avatar images.'}), 400
-            
-        avatar_file = request.files['avatar_image']
-        if avatar_file.filename == '':
-            return jsonify({'error': 'No avatar image selected. Please upload both clothing and avatar images.'}), 400
-        
-        # Get original file extension for clothing image
-        original_filename = clothing_file.filename.lower()
-        if original_filename.endswith(('.png', '.jpg', '.jpeg', '.webp')):
-            if original_filename.endswith('.png'):
-                clothing_ext = '.png'
-            elif original_filename.endswith('.webp'):
-                clothing_ext = '.webp'
-            else:
-                clothing_ext = '.jpg'
-        else:
-            clothing_ext = '.jpg'  # Default to JPG
-            
-        # Save clothing image temporarily with proper extension
-        clothing_filename = f"temp_clothing_{int(time.time())}{clothing_ext}"
-        clothing_path = os.path.join(os.getcwd(), clothing_filename)
-        clothing_file.save(clothing_path)
-        
-        # Handle avatar image - use uploaded file
-        avatar_filename = f"temp_avatar_{int(time.time())}.jpg"
-        avatar_path = os.path.join(os.getcwd(), avatar_filename)
+        job, error = submit_tryon_job()
+        if error:
+            return error
+        job_id = job['job_id']
         
-        # Use uploaded avatar image
-        print(f"📸 Using uploaded avatar image: {avatar_file.filename}")
-        avatar_file.save(avatar_path)
+        # Asynchronous mode: same as POST /virtual-tryon/jobs
+        if request.form.get('async') in ('1', 'true') or 'respond-async' in request.headers.get('Prefer', ''):
+            return jsonify({'success': True, **job, **tryon_job_links(job_id)}), 202
         
-        # Get RapidAPI key from environment or use placeholder
-        rapidapi_key = os.getenv('RAPIDAPI_KEY', '3b32b26a5bmshc04f14a1db17c69p175b48jsnbc94d160d90d')
+        # Synchronous mode: wait for the worker and answer with the result URL
+        job = tryon_jobs.wait(job_id, timeout=TRYON_SYNC_TIMEOUT)
+        if job is None or job['status'] not in FINISHED_STATES:
+            return jsonify({'error': 'Virtual try-on is still running', 'job_id': job_id, **tryon_job_links(job_id)}), 504
+        if job['status'] == JOB_FAILED:
+            return jsonify({'error': job.get('error'), 'job_id': job_id}), job.get('error_status', 500)
         
-        if rapidapi_key == 'YOUR_RAPIDAPI_KEY_HERE':
-            # Cleanup temp files
-            try:
-                os.remove(clothing_path)
-                os.remove(avatar_path)
-            except:
-                pass
-            return jsonify({
-                'error': 'RapidAPI key not configured',
-                'message': 'Please set the RAPIDAPI_KEY environment variable with your RapidAPI key',
-                'instructions': 'export RAPIDAPI_KEY=your_actual_key_here'
-            }), 400
-        
-        # Call RapidAPI Try-On service
-        url = "https://try-on-diffusion.p.rapidapi.com/try-on-file"
-        
-        headers = {
-            "x-rapidapi-host": "try-on-diffusion.p.rapidapi.com",
-            "x-rapidapi-key": rapidapi_key
+        response = {
+            'success': True,
+            'job_id': job_id,
+            'message': 'Virtual try-on completed successfully',
+            'result_id': job['result_id'],
+            'result_url': job['result_url'],
+            'thumbnail_url': job['thumbnail_url'],
+            'result_filename': job['result_filename'],
+            'seed': job['seed'],
+            'cached': job.get('cached', False),
+            'backend': job.get('backend', 'remote')
         }
         
-        # Prepare files with proper MIME types
-        with open(clothing_path, 'rb') as clothing_img, open(avatar_path, 'rb') as avatar_img:
-            # Determine MIME types based on file extensions
-            clothing_mime = 'image/png' if clothing_ext == '.png' else 'image/webp' if clothing_ext == '.webp' else 'image/jpeg'
-            avatar_mime = 'image/jpeg'
+        # Inline image only for legacy clients that ask for it
+        if request.values.get('include_base64') in ('1', 'true'):
+            with open(result_store.path(job['result_id']), 'rb') as f:
+                response['result_image_base64'] = base64.b64encode(f.read()).decode('utf-8')
+        
+        return jsonify(response)
             
-            files = {
-                'clothing_image': (clothing_filename, clothing_img, clothing_mime),
-                'avatar_image': (avatar_filename, avatar_img, avatar_mime)
-            }
+    except Exception as e:
+        print(f"❌ Virtual try-on error: {str(e)}")
+        return jsonify({'error': f'Virtual try-on failed: {str(e)}'}), 500
+
+def form_garment_ids():
+    """garment_id form values, repeated and/or comma-separated"""
+    return [g.strip() for value in request.form.getlist('garment_id') for g in value.split(',') if g.strip()]
+
+def prepare_tryon_batch():
+    """Validate a batch try-on and stage one payload per garment. Returns (items, None) or (None, error response)."""
+    garment_ids = form_garment_ids()
+    uploads = [f for f in request.files.getlist('clothing_image') if f.filename]
+    if not garment_ids and not uploads:
+        return None, (jsonify({'error': 'No garments provided. Send garment_id and/or clothing_image fields.'}), 400)
+    if len(garment_ids) + len(uploads) > TRYON_BATCH_MAX_ITEMS:
+        return None, (jsonify({'error': f'A batch may contain at most {TRYON_BATCH_MAX_ITEMS} garments'}), 400)
+    
+    garments = [garment_registry.get(garment_id) for garment_id in garment_ids]
+    unknown = [garment_id for garment_id, garment in zip(garment_ids, garments) if garment is None]
+    if unknown:
+        return None, (jsonify({'error': f"Unknown garment_id: {', '.join(unknown)}", 'garments_url': '/garments'}), 404)
+    
+    avatar_file = request.files.get('avatar_image')
+    if avatar_file is None or avatar_file.filename == '':
+        return None, (jsonify({'error': 'No avatar image provided'}), 400)
+    
+    backend = request.form.get('backend', TRYON_BACKEND)
+    error = check_tryon_backend(backend)
+    if error:
+        return None, error
+    
+    # The avatar is uploaded once and cropped once for the whole batch
+    avatar_bytes = avatar_file.read()
+    prepared_avatar = SharedPreparation(tryon_preprocessor.prepare_avatar, avatar_bytes) if tryon_preprocessor else None
+    print(f"📸 Batch try-on: {avatar_file.filename} against {len(garments) + len(uploads)} garments")
+    
+    user = tryon_user()
+    items = []
+    for garment in garments:
+        clothing = StagedUpload(garment.content, 'clothing', garment.extension)
+        avatar = StagedUpload(avatar_bytes, 'avatar', '.jpg')
+        items.append({'garment_id': garment.garment_id, 'filename': garment.filename,
+                      'payload': make_tryon_payload(clothing, avatar, garment.garment_id, backend, prepared_avatar,
+                                                    user, PRIORITY_BATCH)})
+    for upload in uploads:
+        clothing = StagedUpload.from_file_storage(upload, 'clothing')
+        avatar = StagedUpload(avatar_bytes, 'avatar', '.jpg')
+        items.append({'garment_id': None, 'filename': upload.filename,
+                      'payload': make_tryon_payload(clothing, avatar, None, backend, prepared_avatar,
+                                                    user, PRIORITY_BATCH)})
+    return items, None
+
+def next_finished(finished, timeout, interval=0.05):
+    """Next item workers put on the queue, or None after timeout; polls with socketio.sleep so
+    the event loop keeps serving other requests while the batch waits"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return finished.get_nowait()
+        except queue.Empty:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            socketio.sleep(min(remaining, interval))
+
+def run_tryon_batch(items, concurrency, session_id=None):
+    """NDJSON lines for a batch: one per garment as it finishes, with at most `concurrency` jobs queued at once"""
+    started = time.time()
+    pending = deque(range(len(items)))
+    in_flight = {}  # item index -> job id
+    finished = queue.Queue()
+    counts = {'succeeded': 0, 'failed': 0}
+    
+    def item_line(index, job=None, error=None, status_code=None):
+        item = items[index]
+        fields = {'index': index, 'garment_id': item['garment_id'], 'filename': item['filename']}
+        if job:
+            fields.update(job)
+        else:
+            fields.update(status=JOB_FAILED, error=error, error_status=status_code)
+        counts['succeeded' if fields['status'] == JOB_SUCCEEDED else 'failed'] += 1
+        return json.dumps(fields) + '\n'
+    
+    yield json.dumps({'items': len(items), 'concurrency': concurrency}) + '\n'
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < concurrency:
+                index = pending[0]
+                try:
+                    job, failure = dispatch_tryon_payload(items[index]['payload'], session_id=session_id,
+                                                          on_finished=lambda index=index: finished.put(index))
+                except QueueFullError as e:
+                    if in_flight:
+                        break  # retry once one of this batch's jobs frees a slot
+                    pending.popleft()
+                    discard_tryon_payload(items[index]['payload'])
+                    yield item_line(index, error=str(e), status_code=503)
+                    continue
+                pending.popleft()
+                if failure:
+                    yield item_line(index, error=failure[0]['error'], status_code=failure[1])
+                elif job['status'] in FINISHED_STATES:
+                    yield item_line(index, job)
+                else:
+                    in_flight[index] = job['job_id']
             
-            print(f"🎭 Calling virtual try-on API...")
-            print(f"   Clothing: {clothing_filename} ({clothing_mime})")
-            print(f"   Avatar: {avatar_filename} ({avatar_mime}) - Uploaded")
-            response = requests.post(url, headers=headers, files=files, timeout=30)
+            if in_flight:
+                index = next_finished(finished, TRYON_SYNC_TIMEOUT)
+                if index is None:
+                    break
+                yield item_line(index, tryon_jobs.get(in_flight.pop(index)))
         
-        # Cleanup temp files
+        # Timed out: report what is still running (pollable by job id) and drop the rest
+        for index, job_id in in_flight.items():
+            yield item_line(index, tryon_jobs.get(job_id))
+        for index in pending:
+            yield item_line(index, error='Batch timed out before this garment was started', status_code=504)
+    finally:
+        for index in pending:
+            discard_tryon_payload(items[index]['payload'])
+    
+    print(f"✅ Batch try-on finished: {counts['succeeded']} succeeded, {counts['failed']} failed")
+    yield json.dumps({'done': True, **counts, 'elapsed_ms': round((time.time() - started) * 1000, 1)}) + '\n'
+
+@app.route('/virtual-tryon/batch', methods=['POST'])
+@admission.limit('tryon')
+def virtual_tryon_batch():
+    """Try one avatar against many garments; results stream back as NDJSON as each finishes"""
+    try:
+        items, error = prepare_tryon_batch()
+        if error:
+            return error
         try:
-            os.remove(clothing_path)
-            os.remove(avatar_path)
-        except:
-            pass
+            concurrency = int(request.form.get('concurrency', TRYON_BATCH_CONCURRENCY))
+        except ValueError:
+            concurrency = TRYON_BATCH_CONCURRENCY
+        concurrency = max(1, min(concurrency, TRYON_BATCH_CONCURRENCY))
+        return Response(run_tryon_batch(items, concurrency, request.form.get('session_id')),
+                        mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    except Exception as e:
+        print(f"❌ Batch try-on error: {str(e)}")
+        return jsonify({'error': f'Batch try-on failed: {str(e)}'}), 500
+
+@app.route('/virtual-tryon/prefetch', methods=['POST'])
+def prefetch_virtual_tryon():
+    """Speculatively generate the try-ons a shopper is likely to request next"""
+    try:
+        session_id = request.form.get('session_id')
+        if not session_id:
+            return jsonify({'error': 'session_id is required'}), 400
+        if tryon_prefetch is None:
+            return jsonify({'success': True, 'enabled': False, 'queued': []})
         
-        if response.status_code == 200:
-            # Save the result image
-            result_filename = f"tryon_result_{int(time.time())}.jpg"
-            result_path = os.path.join(os.getcwd(), result_filename)
-            
-            with open(result_path, 'wb') as f:
-                f.write(response.content)
-            
-            # Convert result to base64 for frontend display
-            result_base64 = base64.b64encode(response.content).decode('utf-8')
-            
-            print(f"✅ Virtual try-on successful! Result saved as {result_filename}")
-            
-            return jsonify({
-                'success': True,
-                'message': 'Virtual try-on completed successfully',
-                'result_image_base64': result_base64,
-                'result_image': f'data:image/jpeg;base64,{result_base64}',
-                'result_filename': result_filename,
-                'seed': response.headers.get('X-Seed', 'unknown')
-            })
-        else:
-            error_msg = f"RapidAPI error: {response.status_code}"
-            try:
-                error_detail = response.json()
-                error_msg += f" - {error_detail}"
-            except:
-                error_msg += f" - {response.text}"
-            
-            print(f"❌ Virtual try-on failed: {error_msg}")
-            return jsonify({'error': error_msg}), response.status_code
-            
+        # The avatar is sent once per session; later predictions only name garments
+        avatar_file = request.files.get('avatar_image')
+        if avatar_file and avatar_file.filename:
+            data = avatar_file.read()
+            prepared = SharedPreparation(tryon_preprocessor.prepare_avatar, data) if tryon_preprocessor else None
+            tryon_prefetch.set_avatar(session_id, data, prepared)
+        avatar = tryon_prefetch.avatar(session_id)
+        if avatar is None:
+            return jsonify({'error': 'No avatar registered for this session', 'avatar_required': True}), 409
+        
+        cached, unknown, predicted = [], [], []
+        for garment_id in form_garment_ids():
+            garment = garment_registry.get(garment_id)
+            if garment is None:
+                unknown.append(garment_id)
+            elif cache_key(garment.content, avatar['data'], tryon_cache_params()) in tryon_cache:
+                cached.append(garment_id)
+            else:
+                predicted.append(garment_id)
+        queued = tryon_prefetch.predict(session_id, predicted)
+        return jsonify({'success': True, 'enabled': True, 'avatar': avatar['digest'],
+                        'queued': queued, 'cached': cached, 'unknown': unknown}), 202
     except Exception as e:
-        print(f"❌ Virtual try-on error: {str(e)}")
-        return jsonify({'error': f'Virtual try-on failed: {str(e)}'}), 500
+        print(f"❌ Try-on prefetch error: {str(e)}")
+        return jsonify({'error': f'Try-on prefetch failed: {str(e)}'}), 500
+
+@app.route('/virtual-tryon/jobs/<job_id>')
+def virtual_tryon_job(job_id):
+    """Get try-on job status (served by any replica)"""
+    job = session_store.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown try-on job'}), 404
+    return jsonify({**job, **tryon_job_links(job_id)})
+
+@app.route('/virtual-tryon/jobs/<job_id>/events')
+def virtual_tryon_job_events(job_id):
+    """Server-Sent Events stream of a try-on job's progress"""
+    if session_store.get_job(job_id) is None:
+        return jsonify({'error': 'Unknown try-on job'}), 404
+    
+    def stream():
+        last = None
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            job = session_store.get_job(job_id)
+            if job is None:
+                break
+            if job != last:
+                yield f"event: tryon_progress\ndata: {json.dumps(job)}\n\n"
+                last = job
+            if job['status'] in FINISHED_STATES:
+                break
+            socketio.sleep(0.5)  # Yields to the event loop under eventlet
+    
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/virtual-tryon/jobs/<job_id>/result')
+def virtual_tryon_job_result(job_id):
+    """Redirect to a finished try-on's result image"""
+    job = session_store.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown try-on job'}), 404
+    if job['status'] != JOB_SUCCEEDED:
+        return jsonify({'error': f"Try-on job is {job['status']}", 'status': job['status']}), 409
+    return redirect(job['result_url'])
+
+def result_links(result):
+    result_id = result['result_id']
+    return {
+        'result_url': f'/results/{result_id}',
+        'thumbnail_url': f'/results/{result_id}/thumbnail'
+    }
+
+@app.route('/garments')
+def list_garments():
+    """Catalog garments that can be tried on by garment_id"""
+    garments = garment_registry.list()
+    for garment in garments:
+        garment['image_url'] = f"/garments/{garment['garment_id']}/image"
+    return jsonify({'garments': garments, 'count': len(garments), 'colours': list(GARMENT_COLOURS)})
+
+@app.route('/garments/<garment_id>/image')
+def get_garment_image(garment_id):
+    """A garment exactly as it is sent to the try-on provider (?colour=navy or #1e2c5c for a colourway)"""
+    garment = garment_registry.get(garment_id)
+    if garment is None:
+        return jsonify({'error': 'Unknown garment'}), 404
+    colour = request.args.get('colour')
+    if colour:
+        try:
+            name, _ = parse_colour(colour)
+            content = garment_recolorer.render(garment, name)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'colours': list(GARMENT_COLOURS)}), 400
+        # Keyed on the normalised name so '1e2c5c' and '#1e2c5c' share one cached copy
+        etag = hashlib.sha256(f"{garment.sha256}:{name}".encode('utf-8')).hexdigest()[:32]
+        response = send_file(io.BytesIO(content), mimetype='image/jpeg', conditional=True, etag=etag)
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        return response
+    mimetype = {'.png': 'image/png', '.webp': 'image/webp'}.get(garment.extension, 'image/jpeg')
+    response = send_file(io.BytesIO(garment.content), mimetype=mimetype, conditional=True, etag=garment.sha256[:32])
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+def catalog_item_links(item):
+    """A catalog item with its try-on garment and built image variants"""
+    item = dict(item)
+    garment = garment_registry.get(item['sku'])
+    item['garment_id'] = garment.garment_id if garment else None
+    item['image_url'] = f"/garments/{garment.garment_id}/image" if garment else None
+    variants = asset_catalog.manifest['images'].get(item.get('image'), []) if asset_catalog else []
+    item['variants'] = [{'format': v['format'], 'width': v['width'], 'url': f"/app/{v['path']}"} for v in variants]
+    return item
+
+@app.route('/catalog')
+def search_catalog():
+    """Filtered, paginated catalog search (q, category, colour, fabric, collection, price_band, sort, page, per_page)"""
+    try:
+        filters = {facet: [v for value in request.args.getlist(facet) for v in value.split(',') if v]
+                   for facet in CATALOG_FACETS}
+        results = catalog_service.search(
+            query=request.args.get('q', ''),
+            filters=filters,
+            sort=request.args.get('sort', 'featured'),
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', 24, type=int)
+        )
+        results['items'] = [catalog_item_links(item) for item in results['items']]
+        return jsonify(results)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/catalog/<sku>')
+def get_catalog_item(sku):
+    """One catalog item by SKU"""
+    item = catalog_service.get(sku)
+    if item is None:
+        return jsonify({'error': 'Unknown catalog item'}), 404
+    return jsonify(catalog_item_links(item))
+
+def catalog_skus():
+    """Catalog garments that have a size chart (every chart when the catalog is empty)"""
+    skus = [garment['garment_id'] for garment in garment_registry.list()
+            if size_recommender.chart_for(garment['garment_id'])]
+    return skus or None
+
+@app.route('/size-recommendation', methods=['POST'])
+def size_recommendation():
+    """Best size per SKU for one or many measurement sets"""
+    try:
+        data = request.get_json(silent=True) or {}
+        measurements = data.get('measurements')
+        if isinstance(measurements, dict):
+            measurements = [measurements]
+        if not measurements or not all(isinstance(m, dict) for m in measurements):
+            return jsonify({'error': 'measurements must be an object or a list of objects'}), 400
+        skus = data.get('skus')
+        if skus is not None and (not isinstance(skus, list) or not all(isinstance(sku, str) for sku in skus)):
+            return jsonify({'error': 'skus must be a list of strings'}), 400
+        if skus is None:
+            skus = catalog_skus()
+        results = size_recommender.recommend(measurements, skus)
+        return jsonify({
+            'measurements': size_recommender.measurements,
+            'results': results if isinstance(data.get('measurements'), list) else results[0]
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid measurements: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/history')
+def list_history_days():
+    """Days with recorded measurement history"""
+    if measurement_history is None:
+        return jsonify({'error': 'Measurement history is disabled'}), 404
+    return jsonify({'days': measurement_history.days()})
+
+@app.route('/history/<day>/rollup')
+def history_rollup(day):
+    """Per-interval measurement counts and means for a day (optionally one session)"""
+    if measurement_history is None:
+        return jsonify({'error': 'Measurement history is disabled'}), 404
+    try:
+        interval = float(request.args.get('interval', 60))
+        if interval <= 0:
+            return jsonify({'error': 'interval must be positive'}), 400
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        rows = measurement_history.rollup(day, interval, request.args.get('session_id'), start, end)
+        return jsonify({'day': day, 'interval': interval, 'buckets': rows})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/history/<day>/export')
+def history_export(day):
+    """Download a day's measurements as CSV (default) or Parquet"""
+    if measurement_history is None:
+        return jsonify({'error': 'Measurement history is disabled'}), 404
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'parquet'):
+        return jsonify({'error': 'format must be csv or parquet'}), 400
+    if day not in measurement_history.days():
+        return jsonify({'error': 'No history for that day'}), 404
+    session_id = request.args.get('session_id')
+    download_name = f'measurements-{day}.{export_format}'
+    if export_format == 'csv':
+        # Formatted a chunk at a time from the memory-mapped day, never held whole
+        def stream():
+            for text in measurement_history.iter_csv(day, session_id):
+                yield text.encode('utf-8')
+                socketio.sleep(0)  # Let other requests run between chunks
+        return Response(stream(), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={download_name}'})
+    handle, path = tempfile.mkstemp(suffix='.parquet')
+    os.close(handle)
+    try:
+        measurement_history.export(day, path, export_format, session_id)
+    except RuntimeError as e:
+        os.remove(path)
+        return jsonify({'error': str(e)}), 501
+    except Exception as e:
+        os.remove(path)
+        return jsonify({'error': str(e)}), 500
+    # Parquet is written a row group at a time to disk and streamed from there
+    response = send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=download_name)
+    response.call_on_close(lambda: os.remove(path))
+    return response
+
+@app.route('/results')
+def list_results():
+    """Newest-first page of stored try-on results"""
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    
+    results, total = result_store.list(offset=offset, limit=limit)
+    return jsonify({
+        'results': [{**result, **result_links(result)} for result in results],
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'next_offset': offset + limit if offset + limit < total else None
+    })
+
+def send_result_file(path, etag):
+    """Serve an immutable result file with ETag and Range support"""
+    response = send_file(path, mimetype='image/jpeg', conditional=True, etag=etag, max_age=RESULT_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={RESULT_MAX_AGE}, immutable'
+    return response
+
+@app.route('/results/<result_id>')
+def get_result(result_id):
+    """Try-on result image"""
+    result = result_store.get(result_id)
+    if result is None:
+        return jsonify({'error': 'Unknown result'}), 404
+    return send_result_file(result_store.path(result_id), result['etag'])
+
+@app.route('/results/<result_id>/thumbnail')
+def get_result_thumbnail(result_id):
+    """Pre-generated thumbnail of a try-on result (the full image if none could be made)"""
+    result = result_store.get(result_id)
+    if result is None:
+        return jsonify({'error': 'Unknown result'}), 404
+    if not result.get('thumbnail_size'):
+        return send_result_file(result_store.path(result_id), result['etag'])
+    return send_result_file(result_store.thumbnail_path(result_id), result['etag'] + '-thumb')
 
 @app.route('/test-upload', methods=['POST'])
 def test_upload():
@@ -750,36 +1860,13 @@ def test_upload():
         if avatar_file.filename == '':
             return jsonify({'error': 'No avatar image selected'}), 400
         
-        # Test the same file processing logic
-        original_filename = clothing_file.filename.lower()
-        if original_filename.endswith(('.png', '.jpg', '.jpeg', '.webp')):
-            if original_filename.endswith('.png'):
-                clothing_ext = '.png'
-            elif original_filename.endswith('.webp'):
-                clothing_ext = '.webp'
-            else:
-                clothing_ext = '.jpg'
-        else:
-            clothing_ext = '.jpg'
-            
-        clothing_filename = f"test_clothing_{int(time.time())}{clothing_ext}"
-        avatar_filename = f"test_avatar_{int(time.time())}.jpg"
-        
-        # Test avatar image save
-        avatar_path = os.path.join(os.getcwd(), avatar_filename)
-        avatar_file.save(avatar_path)
-        
-        # Get file sizes
-        clothing_size = len(clothing_file.read())
-        clothing_file.seek(0)  # Reset file pointer
-        
-        avatar_size = os.path.getsize(avatar_path)
-        
-        # Cleanup
-        try:
-            os.remove(avatar_path)
-        except:
-            pass
+        # Test the same staging logic as /virtual-tryon (in memory, no temp files)
+        clothing = StagedUpload.from_file_storage(clothing_file, 'test_clothing')
+        avatar = StagedUpload.from_file_storage(avatar_file, 'test_avatar', extension='.jpg')
+        clothing_filename, clothing_ext, clothing_size = clothing.filename, os.path.splitext(clothing.filename)[1], clothing.size
+        avatar_filename, avatar_size = avatar.filename, avatar.size
+        clothing.close()
+        avatar.close()
         
         return jsonify({
             'success': True,
@@ -801,6 +1888,7 @@ def test_upload():
         return jsonify({'error': f'Test failed: {str(e)}'}), 500
 
 @app.route('/process_image', methods=['POST'])
+@admission.limit('process_image')
 def process_image():
     """Process a single image via REST API"""
     try:
@@ -836,14 +1924,36 @@ def process_image():
         return jsonify({'error': str(e)}), 500
 
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     """Handle WebSocket connection"""
-    print('Client connected')
-    emit('status', {'message': 'Connected to Shoulder Distance API'})
+    # Clients pass a stable session_id (auth payload or query string) so their
+    # calibration follows them across reconnects and API replicas
+    auth = auth if isinstance(auth, dict) else {}
+    session_id = auth.get('session_id') or request.args.get('session_id')
+    # Calibration profiles are per user and device; anonymous sockets get none
+    user_id = auth.get('user_id') or request.args.get('user_id') or session_id
+    device_id = auth.get('device_id') or request.args.get('device_id') or DEFAULT_DEVICE
+    session_id = session_id or request.sid
+    socket_sessions[request.sid] = session_id
+    if user_id:
+        session_profiles[session_id] = (str(user_id), str(device_id))
+    join_room(f"session:{session_id}")  # Try-on job updates for this session
+    processor = get_session_processor(session_id)
+    has_profile = apply_calibration_profile(session_id, processor)
+    print(f'Client connected (session {session_id} on node {NODE_ID}{", calibration profile loaded" if has_profile else ""})')
+    emit('status', {'message': 'Connected to Shoulder Distance API', 'session_id': session_id, 'node_id': NODE_ID,
+                    'calibration_profile': has_profile})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle WebSocket disconnection"""
+    session_id = socket_sessions.pop(request.sid, request.sid)
+    with session_lock:
+        if session_id not in socket_sessions.values():
+            # State is already in the session store; free the local pose graph
+            session_processors.pop(session_id, None)
+            session_profiles.pop(session_id, None)
+            admission.forget_session(session_id)
     print('Client disconnected')
 
 @socketio.on('process_frame')
@@ -851,6 +1961,20 @@ def handle_process_frame(data):
     """Process incoming frame from WebSocket"""
     global is_processing
     
+    # Admission control: under load, degrade (quality -> landmarks only -> lower
+    # frame rate) before rejecting frames outright
+    session_id = current_session_id()
+    # Optional client frame id, echoed so clients can match replies to frames
+    frame_id = data.get('frame_id') if isinstance(data, dict) else None
+    tier = admission.current_tier('stream')
+    if not admission.allow_frame(session_id, tier):
+        emit('throttle', {**admission.throttle_payload('stream', tier), 'frame_id': frame_id, 'dropped': True})
+        return
+    ticket = admission.try_acquire('stream')
+    if ticket is None:
+        emit('throttle', {**admission.throttle_payload('stream', rejected=True), 'frame_id': frame_id, 'dropped': True})
+        return
+    
     try:
         is_processing = True
         
@@ -861,72 +1985,159 @@ def handle_process_frame(data):
         
         if frame is not None:
             # Process frame
-            processed_frame, measurements = video_processor.process_frame(frame)
+            processor = get_session_processor(session_id)
+            processed_frame, measurements = processor.process_frame(frame)
+            if measurements and measurement_history:
+                measurement_history.append(session_id, measurements, processor.calculator.pixels_per_cm)
             
-            # Encode processed frame
-            _, buffer = cv2.imencode('.jpg', processed_frame)
-            encoded_frame = base64.b64encode(buffer).decode('utf-8')
+            # Encode processed frame (skipped in landmarks-only tiers)
+            encoded_frame = None
+            if ticket.jpeg_quality is not None:
+                _, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, ticket.jpeg_quality])
+                encoded_frame = base64.b64encode(buffer).decode('utf-8')
             
             # Send back processed frame and measurements
             emit('processed_frame', {
                 'frame': encoded_frame,
-                'measurements': measurements
+                'measurements': measurements,
+                'quality_tier': ticket.tier_name,
+                'frame_id': frame_id
             })
+            if ticket.tier >= TIER_REDUCED_FPS:
+                emit('throttle', admission.throttle_payload('stream', ticket.tier))
         
         is_processing = False
         
     except Exception as e:
         print(f"Error processing frame: {e}")
         is_processing = False
-        emit('error', {'message': str(e)})
+        emit('error', {'message': str(e), 'frame_id': frame_id})
+    finally:
+        admission.release(ticket)
+
+@socketio.on('subscribe_tryon')
+def handle_subscribe_tryon(data):
+    """Follow a try-on job's progress (also used to resume after reconnecting)"""
+    job = session_store.get_job(data.get('job_id', ''))
+    if job is None:
+        emit('error', {'message': 'Unknown try-on job'})
+        return
+    join_room(f"tryon_job:{job['job_id']}")
+    emit('tryon_progress', job)
 
 @socketio.on('calibrate')
 def handle_calibrate(data):
     """Handle calibration request"""
     try:
+        processor = get_session_processor()
         if data.get('preset', False):
             # Reset to automatic resolution-aware calibration
-            if video_processor.current_resolution:
-                video_processor.calculator.pixels_per_cm = video_processor.dynamic_calibration
-                emit('status', {'message': f'Reset to auto calibration: {video_processor.dynamic_calibration:.2f} px/cm for {video_processor.current_resolution[0]}x{video_processor.current_resolution[1]}'})
+            new_calibration = processor.set_calibration_override(None)
+            if processor.current_resolution:
+                emit('status', {'message': f'Reset to auto calibration: {new_calibration:.2f} px/cm for {processor.current_resolution[0]}x{processor.current_resolution[1]}'})
             else:
-                video_processor.calculator.pixels_per_cm = video_processor.reference_calibration
-                emit('status', {'message': f'Reset to base calibration: {video_processor.reference_calibration:.2f} px/cm'})
+                emit('status', {'message': f'Reset to base calibration: {new_calibration:.2f} px/cm'})
         elif 'pixels_per_cm' in data:
             # Manual calibration override
-            new_calibration = float(data['pixels_per_cm'])
-            calculator.pixels_per_cm = new_calibration
+            new_calibration = processor.set_calibration_override({'pixels_per_cm': float(data['pixels_per_cm'])})
             emit('status', {'message': f'Applied manual calibration: {new_calibration:.2f} px/cm'})
+        elif data.get('auto', False):
+            # Estimate scale from facial landmarks; locks once the estimate settles
+            processor.set_calibration_override({'auto': True})
+            emit('status', {'message': 'Auto calibration from facial features: hold still, facing the camera'})
         elif 'multiplier' in data:
             # Apply custom multiplier to current dynamic calibration
             multiplier = float(data['multiplier'])
-            if video_processor.dynamic_calibration:
-                new_calibration = video_processor.dynamic_calibration * multiplier
-                calculator.pixels_per_cm = new_calibration
-                resolution_text = f"{video_processor.current_resolution[0]}x{video_processor.current_resolution[1]}" if video_processor.current_resolution else "unknown"
+            new_calibration = processor.set_calibration_override({'multiplier': multiplier})
+            if processor.dynamic_calibration:
+                resolution_text = f"{processor.current_resolution[0]}x{processor.current_resolution[1]}" if processor.current_resolution else "unknown"
                 emit('status', {'message': f'Applied {multiplier:.1f}x multiplier: {new_calibration:.2f} px/cm ({resolution_text})'})
             else:
                 # Fallback to base calibration
-                new_calibration = video_processor.reference_calibration * multiplier
-                calculator.pixels_per_cm = new_calibration
                 emit('status', {'message': f'Applied {multiplier:.1f}x to base: {new_calibration:.2f} px/cm'})
         else:
             emit('error', {'message': 'Invalid calibration data'})
+            return
+        save_session_state(processor=processor)
+        save_calibration_profile(processor=processor)
+    except Exception as e:
+        emit('error', {'message': f'Calibration error: {str(e)}'})
+
+@socketio.on('confirm_calibration')
+def handle_confirm_calibration():
+    """The user is happy with the current calibration: learn it for their device setup"""
+    try:
+        processor = get_session_processor()
+        learned = processor.confirm_calibration()
+        if learned is None:
+            emit('error', {'message': 'Nothing to confirm: start the camera and calibrate first'})
+            return
+        save_session_state(processor=processor)
+        save_calibration_profile(processor=processor)
+        emit('status', {'message': f'Calibration saved: {processor.effective_calibration():.2f} px/cm '
+                                   f'({learned:.2f}x learned for this setup)'})
     except Exception as e:
         emit('error', {'message': f'Calibration error: {str(e)}'})
 
+@socketio.on('recommend_size')
+def handle_recommend_size(data=None):
+    """Settle the session's recent measurements and recommend sizes for them"""
+    data = data or {}
+    final = get_session_processor().final_measurements()
+    if final is None:
+        emit('error', {'message': 'No confident measurements yet: stand in view of the camera'})
+        return
+    skus = data.get('skus') or catalog_skus()
+    if not isinstance(skus, list) or not all(isinstance(sku, str) for sku in skus):
+        emit('error', {'message': 'skus must be a list of strings'})
+        return
+    try:
+        emit('measurement_final', {
+            'measurements': final,
+            'recommendations': size_recommender.recommend([final], skus)[0]
+        })
+    except Exception as e:
+        emit('error', {'message': f'Size recommendation error: {str(e)}'})
+
+@socketio.on('multi_person')
+def handle_multi_person(data=None):
+    """Turn multi-person mode on or off for this session"""
+    enabled = bool((data or {}).get('enabled', True))
+    processor = get_session_processor()
+    processor.set_multi_person(enabled)
+    save_session_state(processor=processor)
+    emit('status', {'message': f'Multi-person mode: {"ON" if enabled else "OFF"}'})
+
+@socketio.on('select_person')
+def handle_select_person(data):
+    """Measure the tracked person with this id (from measurements.people)"""
+    processor = get_session_processor()
+    if processor.multi_person is None:
+        emit('error', {'message': 'Multi-person mode is off'})
+        return
+    track_id = data.get('track_id')
+    if track_id not in processor.multi_person.tracker.tracks:
+        emit('error', {'message': f'Unknown person {track_id}'})
+        return
+    processor.target_track_id = track_id
+    processor.recent_measurements.clear()  # Earlier measurements were of someone else
+    emit('status', {'message': f'Measuring person #{track_id}'})
+
 @socketio.on('toggle_z_info')
 def handle_toggle_z_info():
     """Toggle Z coordinate information display"""
-    calculator.show_z_info = not calculator.show_z_info
-    status = "ON" if calculator.show_z_info else "OFF"
+    processor = get_session_processor()
+    processor.calculator.show_z_info = not processor.calculator.show_z_info
+    save_session_state(processor=processor)
+    status = "ON" if processor.calculator.show_z_info else "OFF"
     emit('status', {'message': f'Z coordinate display: {status}'})
 
 @socketio.on('display_calibration')
 def handle_display_calibration(data):
     """Handle display calibration from frontend"""
     try:
-        video_processor.set_display_calibration(
+        processor = get_session_processor()
+        processor.set_display_calibration(
             data['video_width'],
             data['video_height'], 
             data['display_width'],
@@ -935,17 +2146,22 @@ def handle_display_calibration(data):
             data['screen_height'],
             data['device_pixel_ratio']
         )
+        save_session_state(processor=processor)
+        save_calibration_profile(processor=processor)
         emit('status', {'message': f'Display calibration updated: {data["video_width"]}x{data["video_height"]} → {data["display_width"]}x{data["display_height"]}'})
     except Exception as e:
         emit('error', {'message': f'Display calibration error: {str(e)}'})
 
 @socketio.on('reset_calibration')
 def handle_reset_calibration():
-    """Reset calibration to default"""
-    calculator.pixels_per_cm = None
-    import os
-    if os.path.exists(calculator.calibration_file):
-        os.remove(calculator.calibration_file)
+    """Reset this session's calibration (and its profile) to default"""
+    session_id = current_session_id()
+    processor = get_session_processor(session_id)
+    processor.set_calibration_override(None)
+    save_session_state(session_id, processor)
+    profile_key = session_profiles.get(session_id)
+    if profile_key:
+        calibration_profiles.delete(*profile_key)
     emit('status', {'message': 'Calibration reset to default'})
 
 if __name__ == '__main__':
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def api_client(tmp_path_factory):
+    """Flask test client for streaming_api, with its stores in a scratch directory"""
+    pytest.importorskip('mediapipe')
+    scratch = tmp_path_factory.mktemp('api')
+    for name in ('TRYON_CACHE_DIR', 'TRYON_RESULTS_DIR', 'MEASUREMENT_HISTORY_DIR'):
+        os.environ.setdefault(name, str(scratch / name.lower()))
+    os.environ.setdefault('CALIBRATION_DB', str(scratch / 'calibration.json'))
+    os.environ.setdefault('RAPIDAPI_KEY', 'test')
+    os.environ.setdefault('TRYON_PREFETCH', '0')
+    import streaming_api
+    return streaming_api.app.test_client()
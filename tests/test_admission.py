@@ -0,0 +1,79 @@
+"""Admission control: immediate admission, the queued path and rejection"""
+
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController
+
+
+def test_admits_until_route_limit_then_rejects_without_queueing():
+    admission = AdmissionController(max_in_flight=4, route_limits={'tryon': 1})
+    ticket = admission.try_acquire('tryon')
+    assert ticket is not None
+    assert admission.try_acquire('tryon') is None
+    assert admission.try_acquire('frames') is not None
+    admission.release(ticket)
+    assert admission.try_acquire('tryon') is not None
+    assert admission.stats['rejected'] == 1
+
+
+@pytest.mark.parametrize('sleep', [None, time.sleep], ids=['condition', 'polling'])
+def test_queued_request_is_admitted_when_a_slot_frees(sleep):
+    admission = AdmissionController(max_in_flight=1, sleep=sleep, poll_interval=0.01)
+    ticket = admission.try_acquire('tryon')
+    threading.Timer(0.1, admission.release, args=(ticket,)).start()
+
+    started = time.time()
+    queued = admission.try_acquire('tryon', timeout=2)
+    assert queued is not None
+    assert 0.05 < time.time() - started < 1.5
+    assert admission.stats['queued'] == 1
+    assert admission.snapshot()['queued'] == 0
+
+
+@pytest.mark.parametrize('sleep', [None, time.sleep], ids=['condition', 'polling'])
+def test_queued_request_times_out(sleep):
+    admission = AdmissionController(max_in_flight=1, sleep=sleep, poll_interval=0.01)
+    admission.try_acquire('tryon')
+    started = time.time()
+    assert admission.try_acquire('tryon', timeout=0.1) is None
+    assert time.time() - started >= 0.1
+    assert admission.stats['rejected'] == 1
+    assert admission.snapshot()['queued'] == 0
+
+
+def test_rejects_when_the_queue_is_full():
+    admission = AdmissionController(max_in_flight=1, max_queue_depth=1, sleep=time.sleep, poll_interval=0.01)
+    ticket = admission.try_acquire('tryon')
+    waiter = threading.Thread(target=admission.try_acquire, args=('tryon',), kwargs={'timeout': 0.5})
+    waiter.start()
+    time.sleep(0.05)
+    assert admission.try_acquire('tryon', timeout=0.5) is None
+    admission.release(ticket)
+    waiter.join()
+    assert admission.stats['queued'] == 1
+
+
+def test_queued_request_does_not_block_other_greenlets():
+    """Under eventlet (without monkey-patching) a queued request must yield to the hub"""
+    eventlet = pytest.importorskip('eventlet')
+    admission = AdmissionController(max_in_flight=1, sleep=eventlet.sleep, poll_interval=0.01)
+    ticket = admission.try_acquire('tryon')
+    ticks = []
+
+    def ticker():
+        for _ in range(5):
+            ticks.append(time.time())
+            eventlet.sleep(0.01)
+
+    def release_later():
+        eventlet.sleep(0.1)
+        admission.release(ticket)
+
+    waiter = eventlet.spawn(admission.try_acquire, 'tryon', 2)
+    eventlet.spawn(ticker)
+    eventlet.spawn(release_later)
+    assert waiter.wait() is not None
+    assert len(ticks) == 5
@@ -0,0 +1,39 @@
+"""Frontend build: <img> rewriting for responsive catalog images"""
+
+import pytest
+
+pytest.importorskip('PIL')
+
+from asset_pipeline import IMG_TAG, picture_tag
+
+VARIANTS = {
+    'blue_shirt.png': [
+        {'format': 'webp', 'width': 150, 'path': 'blue_shirt-150w.1a2b3c4d.webp'},
+        {'format': 'webp', 'width': 300, 'path': 'blue_shirt-300w.5e6f7a8b.webp'},
+        {'format': 'avif', 'width': 300, 'path': 'blue_shirt-300w.9c0d1e2f.avif'}
+    ]
+}
+
+
+def rewrite(html):
+    return IMG_TAG.sub(lambda match: picture_tag(match, VARIANTS), html)
+
+
+def test_rewritten_img_keeps_the_garment_id():
+    html = rewrite('<img src="blue_shirt.png" alt="Blue Shirt">')
+    assert html.startswith('<picture')
+    assert 'src="blue_shirt-300w.5e6f7a8b.webp"' in html
+    assert 'data-garment-id="blue_shirt"' in html
+    assert 'alt="Blue Shirt"' in html
+    assert '<source type="image/avif"' in html
+
+
+def test_existing_garment_id_is_not_duplicated():
+    html = rewrite('<img src="blue_shirt.png" data-garment-id="shirt-1">')
+    assert html.count('data-garment-id=') == 1
+    assert 'data-garment-id="shirt-1"' in html
+
+
+def test_images_without_variants_are_left_alone():
+    html = '<img src="logo.png" alt="Logo">'
+    assert rewrite(html) == html
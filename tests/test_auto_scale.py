@@ -0,0 +1,100 @@
+"""Face-based scale estimate: weighted median, outlier rejection, locking and reset"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from auto_scale import AVG_EYE_DISTANCE_CM, AVG_HEAD_WIDTH_CM, ScaleEstimator, weighted_median
+
+WIDTH, HEIGHT = 640, 480
+
+
+def face(pixels_per_cm, yaw_z=0.0, visibility=1.0):
+    """Pose landmarks (MediaPipe indices) for a face at a given scale, optionally turned"""
+    points = [SimpleNamespace(x=0.5, y=0.3, z=0.0, visibility=visibility) for _ in range(9)]
+    eyes = AVG_EYE_DISTANCE_CM * pixels_per_cm / WIDTH
+    ears = AVG_HEAD_WIDTH_CM * pixels_per_cm / WIDTH
+    points[1].x, points[4].x = 0.5 + eyes / 2, 0.5 - eyes / 2
+    points[7].x, points[8].x = 0.5 + ears / 2, 0.5 - ears / 2
+    points[1].z, points[7].z = yaw_z, yaw_z
+    return SimpleNamespace(landmark=points)
+
+
+def test_weighted_median():
+    assert weighted_median([(1.0, 1.0), (2.0, 1.0), (3.0, 1.0)]) == 2.0
+    # Heavy weight pulls the median towards it
+    assert weighted_median([(1.0, 5.0), (2.0, 1.0), (3.0, 1.0)]) == 1.0
+    assert weighted_median([(3.0, 1.0), (1.0, 1.0)]) == 1.0
+    assert weighted_median([]) is None
+
+
+def test_each_frame_gives_eye_and_ear_samples():
+    estimator = ScaleEstimator()
+    samples = estimator.frame_samples(face(7.0), WIDTH, HEIGHT)
+    assert [value for value, _ in samples] == pytest.approx([7.0, 7.0])
+    # Ears count half as much as eyes
+    assert samples[0][1] == pytest.approx(1.0) and samples[1][1] == pytest.approx(0.5)
+
+
+def test_turned_or_hidden_faces_are_rejected():
+    estimator = ScaleEstimator()
+    assert estimator.frame_samples(face(7.0, visibility=0.1), WIDTH, HEIGHT) == []
+    # Turned far enough that cos(yaw)^2 falls below min_weight
+    assert estimator.frame_samples(face(7.0, yaw_z=0.5), WIDTH, HEIGHT) == []
+    # Slightly turned: still used, with less weight
+    (_, weight), _ = estimator.frame_samples(face(7.0, yaw_z=0.02), WIDTH, HEIGHT)
+    assert estimator.min_weight < weight < 1.0
+    # Too small to measure
+    assert estimator.frame_samples(face(0.5), WIDTH, HEIGHT) == []
+
+
+def test_outlier_frames_do_not_move_the_estimate():
+    estimator = ScaleEstimator(min_samples=100)
+    for ppcm in [7.0, 7.1, 6.9, 7.0, 14.0, 7.05, 3.0, 6.95]:
+        estimator.update(face(ppcm), WIDTH, HEIGHT)
+    assert estimator.estimate == pytest.approx(7.0, abs=0.06)
+
+
+def test_converges_and_locks_then_rechecks():
+    estimator = ScaleEstimator(min_samples=8, recheck_every=5)
+    for _ in range(3):
+        estimator.update(face(7.0), WIDTH, HEIGHT)
+    assert not estimator.converged  # 6 samples
+    estimator.update(face(7.0), WIDTH, HEIGHT)
+    assert estimator.converged
+    assert estimator.state() == {'pixels_per_cm': 7.0, 'converged': True, 'samples': 8, 'spread': 0.0}
+
+    # Locked: frames are skipped until the periodic re-check
+    for _ in range(4):
+        assert estimator.update(face(9.0), WIDTH, HEIGHT) == pytest.approx(7.0)
+    assert len(estimator.samples) == 8
+    estimator.update(face(7.0), WIDTH, HEIGHT)
+    assert len(estimator.samples) == 10
+
+
+def test_disagreeing_samples_do_not_converge():
+    estimator = ScaleEstimator(min_samples=8)
+    for ppcm in [6.0, 7.0, 8.0, 9.0] * 3:
+        estimator.update(face(ppcm), WIDTH, HEIGHT)
+    assert not estimator.converged
+    assert estimator.spread > estimator.tolerance
+
+
+def test_reset_forgets_everything():
+    estimator = ScaleEstimator(min_samples=2)
+    estimator.update(face(7.0), WIDTH, HEIGHT)
+    assert estimator.converged
+    estimator.reset()
+    assert estimator.state() == {'pixels_per_cm': None, 'converged': False, 'samples': 0, 'spread': None}
+    assert estimator.update(face(5.0), WIDTH, HEIGHT) == pytest.approx(5.0)
+
+
+def test_calculator_uses_the_estimator_without_a_calibration():
+    pytest.importorskip('mediapipe')
+    from shoulder_distance import ShoulderDistanceCalculator
+    calculator = ShoulderDistanceCalculator(calibration_file=None)
+    calculator.pixels_per_cm = None  # What the 'auto' calibration override sets
+    for _ in range(4):
+        scale = calculator.get_automatic_scale(face(7.0), WIDTH, HEIGHT)
+    assert scale == pytest.approx(7.0)
+    assert calculator.scale_estimator.converged
@@ -0,0 +1,93 @@
+"""Calibration profiles: SQLite persistence, the write-through LRU and loading on connect"""
+
+import pytest
+
+from calibration_profiles import CalibrationProfileStore
+
+DISPLAY = {'video_width': 640, 'video_height': 480, 'display_width': 1280, 'display_height': 960,
+           'screen_width': 1920, 'screen_height': 1080, 'device_pixel_ratio': 1.0}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'profiles.db')
+
+
+def test_profiles_persist_per_user_and_device(path):
+    store = CalibrationProfileStore(path)
+    store.save('alice', 'phone', calibration={'pixels_per_cm': 7.5})
+    store.save('alice', 'laptop', calibration={'multiplier': 1.2})
+
+    reopened = CalibrationProfileStore(path)
+    assert reopened.get('alice', 'phone')['calibration'] == {'pixels_per_cm': 7.5}
+    assert reopened.get('alice', 'laptop')['calibration'] == {'multiplier': 1.2}
+    assert reopened.get('bob', 'phone') is None
+    assert reopened.snapshot()['profiles'] == 2
+
+
+def test_save_merges_fields(path):
+    store = CalibrationProfileStore(path)
+    store.save('alice', 'phone', calibration={'pixels_per_cm': 7.5})
+    store.save('alice', 'phone', display_calibration=DISPLAY)
+    # A fresh store merges into the row on disk rather than its (empty) cache
+    CalibrationProfileStore(path).save('alice', 'phone', calibration={'multiplier': 0.9})
+
+    profile = CalibrationProfileStore(path).get('alice', 'phone')
+    assert profile['calibration'] == {'multiplier': 0.9}
+    assert profile['display_calibration'] == DISPLAY
+
+
+def test_cache_is_written_through_and_bounded(path):
+    store = CalibrationProfileStore(path, cache_size=2)
+    store.save('alice', 'phone', calibration={'pixels_per_cm': 7.5})
+    assert store.get('alice', 'phone')['calibration'] == {'pixels_per_cm': 7.5}
+    assert store.stats == {'hits': 1, 'misses': 0, 'writes': 1, 'deletes': 0}
+
+    # Unknown profiles are cached too, so repeated connects do not query SQLite
+    store.get('bob', 'phone')
+    store.get('bob', 'phone')
+    assert store.stats['misses'] == 1 and store.stats['hits'] == 2
+
+    # The least recently used entry is evicted and reloaded from SQLite
+    store.get('carol', 'phone')
+    assert store.snapshot()['cached'] == 2
+    assert store.get('alice', 'phone')['calibration'] == {'pixels_per_cm': 7.5}
+    assert store.stats['misses'] == 3
+
+
+def test_returned_profiles_are_copies(path):
+    store = CalibrationProfileStore(path)
+    store.save('alice', 'phone', calibration={'pixels_per_cm': 7.5})
+    store.get('alice', 'phone')['calibration'] = None
+    assert store.get('alice', 'phone')['calibration'] == {'pixels_per_cm': 7.5}
+
+
+def test_delete_removes_the_row_and_the_cached_copy(path):
+    store = CalibrationProfileStore(path)
+    store.save('alice', 'phone', calibration={'pixels_per_cm': 7.5})
+    store.delete('alice', 'phone')
+    assert store.get('alice', 'phone') is None
+    assert CalibrationProfileStore(path).get('alice', 'phone') is None
+
+
+def test_profile_is_applied_when_the_client_connects(api_client):
+    import streaming_api
+    streaming_api.calibration_profiles.save('profile-test', 'kiosk', calibration={'pixels_per_cm': 7.25},
+                                            display_calibration=DISPLAY)
+    client = streaming_api.socketio.test_client(
+        streaming_api.app, auth={'session_id': 'profile-session', 'user_id': 'profile-test', 'device_id': 'kiosk'})
+    status = client.get_received()[0]['args'][0]
+    assert status['calibration_profile'] is True
+
+    processor = streaming_api.get_session_processor('profile-session')
+    assert processor.calibration_override == {'pixels_per_cm': 7.25}
+    assert processor.calculator.pixels_per_cm == 7.25
+    assert processor.display_calibration == DISPLAY
+
+    # Another device of the same user has no profile yet
+    other = streaming_api.socketio.test_client(
+        streaming_api.app, auth={'session_id': 'other-session', 'user_id': 'profile-test', 'device_id': 'phone'})
+    assert other.get_received()[0]['args'][0]['calibration_profile'] is False
+    assert streaming_api.get_session_processor('other-session').calibration_override is None
+    client.disconnect()
+    other.disconnect()
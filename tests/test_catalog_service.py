@@ -0,0 +1,160 @@
+"""Catalog search: index-based filtering, sorting and paging checked against a linear scan"""
+
+import itertools
+import json
+import random
+
+import pytest
+
+from catalog_service import DEFAULT_CATALOG_FILE, FACETS, TEXT_FIELDS, CatalogService, price_band, tokenize
+
+with open(DEFAULT_CATALOG_FILE, 'r', encoding='utf-8') as f:
+    CATALOG = json.load(f)
+
+
+def linear_search(items, bands, query='', filters=None, sort='featured'):
+    """The same search done the slow way: every item checked against every condition"""
+    matches = []
+    for item in items:
+        item = dict(item, price_band=price_band(item.get('price', 0), bands))
+        if any(str(item.get(facet)).lower() not in {str(v).lower() for v in values}
+               for facet, values in (filters or {}).items()):
+            continue
+        words = [w for field in TEXT_FIELDS for w in tokenize(item.get(field, ''))]
+        words += [w for tag in item.get('tags', ()) for w in tokenize(tag)]
+        if all(any(w.startswith(q) for w in words) for q in tokenize(query)):
+            matches.append(item)
+    keys = {
+        'featured': None,
+        'price_asc': lambda item: item.get('price', 0),
+        'price_desc': lambda item: -item.get('price', 0),
+        'rating': lambda item: -item.get('rating', 0),
+        'name': lambda item: item.get('name', '').lower()
+    }
+    return sorted(matches, key=keys[sort]) if keys[sort] else matches
+
+
+def skus(items):
+    return [item['sku'] for item in items]
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return CatalogService.from_file()
+
+
+def filter_cases(items):
+    """Single values, ORed values and ANDed facets drawn from the catalog itself"""
+    values = {facet: sorted({str(item.get(facet)).lower() for item in items if item.get(facet)})
+              for facet in FACETS if facet != 'price_band'}
+    cases = [{}]
+    cases += [{facet: [value]} for facet, options in values.items() for value in options]
+    cases += [{facet: options[:2]} for facet, options in values.items() if len(options) > 1]
+    cases += [{a: [values[a][0]], b: [values[b][-1]]} for a, b in itertools.combinations(values, 2)]
+    cases += [{'category': ['SHIRTS']}, {'colour': ['no-such-colour']}]
+    return cases
+
+
+@pytest.mark.parametrize('filters', filter_cases(CATALOG['items']), ids=str)
+def test_filters_match_a_linear_scan(catalog, filters):
+    result = catalog.search(filters=filters, per_page=100)
+    expected = linear_search(CATALOG['items'], CATALOG['price_bands'], filters=filters)
+    assert skus(result['items']) == skus(expected)
+    assert result['total'] == len(expected)
+
+
+@pytest.mark.parametrize('query', ['cotton', 'cot', 'blue shirt', 'silk sa', 'PREMIUM', 'eco', 'zzz'])
+def test_text_search_matches_a_linear_scan(catalog, query):
+    result = catalog.search(query=query, per_page=100)
+    assert skus(result['items']) == skus(linear_search(CATALOG['items'], CATALOG['price_bands'], query=query))
+
+
+@pytest.mark.parametrize('sort', ['featured', 'price_asc', 'price_desc', 'rating', 'name'])
+def test_sorts_match_a_linear_scan(catalog, sort):
+    for filters in ({}, {'fabric': ['cotton']}, {'price_band': ['1000-2000', '2000-5000']}):
+        result = catalog.search(filters=filters, sort=sort, per_page=100)
+        expected = linear_search(CATALOG['items'], CATALOG['price_bands'], filters=filters, sort=sort)
+        assert skus(result['items']) == skus(expected)
+
+
+def test_facet_counts_ignore_their_own_filter(catalog):
+    filters = {'category': ['shirts'], 'fabric': ['cotton']}
+    facets = catalog.search(filters=filters)['facets']
+    for facet in FACETS:
+        others = {other: values for other, values in filters.items() if other != facet}
+        expected = {}
+        for item in linear_search(CATALOG['items'], CATALOG['price_bands'], filters=others):
+            if item.get(facet) is not None:
+                value = str(item[facet]).lower()
+                expected[value] = expected.get(value, 0) + 1
+        assert facets[facet] == expected
+
+
+def test_pages_cover_the_results_once(catalog):
+    everything = skus(catalog.search(sort='price_asc', per_page=100)['items'])
+    first = catalog.search(sort='price_asc', per_page=5)
+    assert first['pages'] == -(-len(everything) // 5)
+    paged = []
+    for page in range(1, first['pages'] + 1):
+        paged += skus(catalog.search(sort='price_asc', page=page, per_page=5)['items'])
+    assert paged == everything
+    assert catalog.search(page=first['pages'] + 1, per_page=5)['items'] == []
+    assert catalog.search(per_page=1000)['per_page'] == 100
+    assert catalog.search(page=0, per_page=0)['page'] == 1
+
+
+def test_rejects_unknown_sorts_and_filters(catalog):
+    with pytest.raises(ValueError):
+        catalog.search(sort='cheapest')
+    with pytest.raises(ValueError):
+        catalog.search(filters={'size': ['M']})
+
+
+def test_large_random_catalog_matches_a_linear_scan():
+    rng = random.Random(7)
+    words = ['silk', 'cotton', 'festive', 'slim', 'classic', 'embroidered', 'linen', 'printed']
+    options = {
+        'category': ['shirts', 'kurtas', 'sarees', 'salwar'],
+        'colour': ['red', 'blue', 'green', 'gold', 'black'],
+        'fabric': ['cotton', 'silk', 'linen'],
+        'collection': ['standard', 'premium', 'luxury'],
+        'price_band': [band['id'] for band in CATALOG['price_bands']]
+    }
+    items = [{
+        'sku': f'sku{i}',
+        'name': ' '.join(rng.sample(words, 2)) + f' {i}',
+        'description': ' '.join(rng.sample(words, 3)),
+        **{facet: rng.choice(values) for facet, values in options.items() if facet != 'price_band'},
+        'price': rng.randrange(300, 9000, 50),
+        'rating': round(rng.uniform(3, 5), 1),
+        'tags': rng.sample(['Eco', 'Handloom', 'Wedding', 'Office'], 2)
+    } for i in range(3000)]
+    catalog = CatalogService(items, CATALOG['price_bands'])
+    for _ in range(40):
+        filters = {facet: rng.sample(options[facet], rng.randint(1, 2))
+                   for facet in rng.sample(list(options), rng.randint(0, 3))}
+        query = rng.choice(['', '', 'sil', 'festive cot', 'wedding', '12'])
+        sort = rng.choice(['featured', 'price_asc', 'price_desc', 'rating', 'name'])
+        result = catalog.search(query, filters, sort, page=2, per_page=50)
+        expected = linear_search(items, CATALOG['price_bands'], query, filters, sort)
+        assert result['total'] == len(expected)
+        assert skus(result['items']) == skus(expected[50:100])
+
+
+def test_catalog_endpoint(api_client):
+    response = api_client.get('/catalog?category=shirts,kurtas&sort=price_asc&per_page=100')
+    assert response.status_code == 200
+    body = response.get_json()
+    expected = linear_search(CATALOG['items'], CATALOG['price_bands'],
+                             filters={'category': ['shirts', 'kurtas']}, sort='price_asc')
+    assert skus(body['items']) == skus(expected)
+    assert all('variants' in item and 'image_url' in item for item in body['items'])
+
+    # Repeated parameters are ORed like comma-separated ones
+    repeated = api_client.get('/catalog?category=shirts&category=kurtas&sort=price_asc&per_page=100').get_json()
+    assert skus(repeated['items']) == skus(expected)
+
+    assert api_client.get('/catalog?sort=cheapest').status_code == 400
+    sku = CATALOG['items'][0]['sku']
+    assert api_client.get(f'/catalog/{sku}').get_json()['sku'] == sku
+    assert api_client.get('/catalog/no-such-sku').status_code == 404
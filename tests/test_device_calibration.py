@@ -0,0 +1,125 @@
+"""Device calibration table: exact lookups, interpolation, running means and the confirm round trip"""
+
+import pytest
+
+from device_calibration import DeviceCalibrationTable
+
+LAPTOP = {'display_width': 1280, 'display_height': 960, 'screen_width': 1920, 'screen_height': 1080,
+          'device_pixel_ratio': 1.0}
+PHONE = {'display_width': 360, 'display_height': 640, 'screen_width': 390, 'screen_height': 844,
+         'device_pixel_ratio': 3.0}
+
+
+@pytest.fixture
+def table(tmp_path):
+    return DeviceCalibrationTable(path=str(tmp_path / 'calibration.db'))
+
+
+def test_exact_match_and_unknown_setups(table):
+    assert table.resolve(640, 480, LAPTOP) is None
+    assert table.record(640, 480, LAPTOP, 1.2) == 1.2
+    assert table.resolve(640, 480, LAPTOP) == 1.2
+    # Another kind of display learns nothing from the laptop
+    assert table.resolve(640, 480, PHONE) is None
+    assert table.stats['exact'] == 1 and table.stats['unknown'] == 2
+
+
+def test_nearby_display_sizes_share_an_entry(table):
+    table.record(640, 480, LAPTOP, 1.2)
+    assert table.resolve(640, 480, dict(LAPTOP, display_width=1300)) == 1.2
+
+
+def test_interpolates_between_known_capture_widths(table):
+    table.record(640, 480, LAPTOP, 1.0)
+    table.record(1280, 720, LAPTOP, 2.0)
+    assert table.resolve(960, 540, LAPTOP) == pytest.approx(1.5)
+    # Outside the known range the nearest entry is used
+    assert table.resolve(320, 240, LAPTOP) == 1.0
+    assert table.resolve(1920, 1080, LAPTOP) == 2.0
+    assert table.stats['interpolated'] == 3
+
+
+def test_running_mean_per_setup(table):
+    for multiplier in (1.0, 1.2, 1.4):
+        mean = table.record(640, 480, LAPTOP, multiplier)
+    assert mean == pytest.approx(1.2)
+    assert table.resolve(640, 480, LAPTOP) == pytest.approx(1.2)
+
+
+def test_ignores_implausible_multipliers(table):
+    assert table.record(640, 480, LAPTOP, 10.0) is None
+    assert table.resolve(640, 480, LAPTOP) is None
+
+
+def test_min_samples_before_an_entry_is_used(tmp_path):
+    table = DeviceCalibrationTable(path=str(tmp_path / 'calibration.db'), min_samples=2)
+    table.record(640, 480, LAPTOP, 1.2)
+    assert table.resolve(640, 480, LAPTOP) is None
+    table.record(640, 480, LAPTOP, 1.2)
+    assert table.resolve(640, 480, LAPTOP) == pytest.approx(1.2)
+
+
+def test_entries_persist_in_sqlite(tmp_path):
+    path = str(tmp_path / 'calibration.db')
+    DeviceCalibrationTable(path=path).record(640, 480, LAPTOP, 1.2)
+    reloaded = DeviceCalibrationTable(path=path)
+    assert reloaded.resolve(640, 480, LAPTOP) == 1.2
+    assert reloaded.record(640, 480, LAPTOP, 1.4) == pytest.approx(1.3)
+
+
+@pytest.fixture
+def api(api_client, table, monkeypatch):
+    """streaming_api with an empty device calibration table"""
+    import streaming_api
+    monkeypatch.setattr(streaming_api, 'device_calibration', table)
+    return streaming_api
+
+
+def display_payload(display, width=640, height=480):
+    return {'video_width': width, 'video_height': height, **display}
+
+
+def test_confirmed_multiplier_is_not_applied_twice(api, table):
+    processor = api.VideoStreamProcessor()
+    processor.set_display_calibration(**display_payload(LAPTOP))
+    base = processor.effective_calibration()
+    processor.set_calibration_override({'multiplier': 1.2})
+    confirmed = processor.effective_calibration()
+    assert confirmed == pytest.approx(base * 1.2)
+    processor.confirm_calibration()
+    assert processor.effective_calibration() == pytest.approx(confirmed)
+
+    # A capture resolution change and back resolves the learned value alone
+    processor.update_dynamic_calibration(1280, 720)
+    processor.update_dynamic_calibration(640, 480)
+    assert processor.effective_calibration() == pytest.approx(confirmed)
+
+    # Reconnecting with the saved session state at the same resolution
+    reconnected = api.VideoStreamProcessor()
+    reconnected.apply_state(processor.export_state())
+    reconnected.update_dynamic_calibration(640, 480)
+    assert reconnected.effective_calibration() == pytest.approx(confirmed)
+    assert table.stats['recorded'] == 1
+
+
+def test_only_confirm_teaches_the_table_and_survives_reconnect(api, table):
+    auth = {'session_id': 'calibration-test', 'device_id': 'laptop'}
+    client = api.socketio.test_client(api.app, auth=auth)
+    client.emit('display_calibration', display_payload(LAPTOP))
+    for multiplier in (1.1, 1.3, 1.2):
+        client.emit('calibrate', {'multiplier': multiplier})
+    assert table.stats['recorded'] == 0
+
+    client.emit('confirm_calibration')
+    assert table.stats['recorded'] == 1
+    processor = api.get_session_processor('calibration-test')
+    confirmed = processor.effective_calibration()
+    assert table.resolve(640, 480, LAPTOP) == pytest.approx(confirmed / processor.reference_calibration)
+    client.disconnect()
+
+    # The profile brings the display back on connect; the table brings the multiplier
+    client = api.socketio.test_client(api.app, auth=auth)
+    processor = api.get_session_processor('calibration-test')
+    processor.update_dynamic_calibration(640, 480)
+    assert processor.effective_calibration() == pytest.approx(confirmed)
+    client.disconnect()
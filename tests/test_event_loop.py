@@ -0,0 +1,137 @@
+"""The API server keeps answering while try-ons wait on a slow provider
+
+Runs streaming_api as a real Socket.IO server (eventlet when installed, as in
+production) in a subprocess, against the mock provider with a fixed latency.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+from mock_tryon_server import start_mock_server
+
+requests = pytest.importorskip('requests')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_DIR, 'virtual-try-on-app')
+UPSTREAM_LATENCY = 3.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope='module')
+def mock_provider():
+    server, url = start_mock_server(latency=UPSTREAM_LATENCY, latency_dist='fixed', response_kb=8)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope='module')
+def live_server(mock_provider):
+    scratch = tempfile.mkdtemp(prefix='tryon-loop-test-')
+    port = free_port()
+    env = dict(
+        os.environ,
+        TRYON_UPSTREAM_URL=f'http://127.0.0.1:{mock_provider.server_port}',
+        RAPIDAPI_KEY='test',
+        TRYON_PREFETCH='0',
+        TRYON_CACHE_DIR=os.path.join(scratch, 'cache'),
+        TRYON_RESULTS_DIR=os.path.join(scratch, 'results'),
+        MEASUREMENT_HISTORY_DIR=os.path.join(scratch, 'history'),
+        CALIBRATION_DB=os.path.join(scratch, 'calibration.json')
+    )
+    code = (f"import streaming_api as s; "
+            f"s.socketio.run(s.app, host='127.0.0.1', port={port}, allow_unsafe_werkzeug=True)")
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=REPO_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 90
+    while True:
+        try:
+            requests.get(f'{base_url}/health', timeout=1)
+            break
+        except requests.ConnectionError:
+            if process.poll() is not None or time.time() > deadline:
+                process.kill()
+                pytest.fail('API server did not start')
+            time.sleep(0.5)
+    yield base_url
+    process.terminate()
+    process.wait(10)
+
+
+def tryon_files(tag):
+    with open(os.path.join(APP_DIR, 'salwar_suit.jpg'), 'rb') as f:
+        avatar = f.read()
+    with open(os.path.join(APP_DIR, 'blue_shirt.png'), 'rb') as f:
+        garment = f.read()
+    # Bytes after the JPEG end marker change the cache key but not the image
+    return {
+        'avatar_image': ('avatar.jpg', avatar + tag.encode(), 'image/jpeg'),
+        'clothing_image': ('shirt.png', garment, 'image/png')
+    }
+
+
+def wait_for_upstream_request(mock_provider, count):
+    stats = mock_provider.RequestHandlerClass.config.stats
+    deadline = time.time() + 10
+    while stats['in_flight'] < count:
+        assert time.time() < deadline, 'try-on never reached the provider'
+        time.sleep(0.05)
+
+
+def assert_health_is_prompt(base_url):
+    started = time.time()
+    response = requests.get(f'{base_url}/health', timeout=UPSTREAM_LATENCY)
+    assert response.status_code == 200
+    assert time.time() - started < 1.0
+
+
+def test_health_answers_while_a_synchronous_tryon_waits(live_server, mock_provider):
+    result = {}
+
+    def tryon():
+        response = requests.post(f'{live_server}/virtual-tryon', files=tryon_files('sync'),
+                                 data={'backend': 'remote'}, timeout=60)
+        result['status'] = response.status_code
+
+    worker = threading.Thread(target=tryon)
+    worker.start()
+    wait_for_upstream_request(mock_provider, 1)
+    assert_health_is_prompt(live_server)
+    worker.join()
+    assert result['status'] == 200
+
+
+def test_health_answers_while_a_job_event_stream_is_open(live_server, mock_provider):
+    response = requests.post(f'{live_server}/virtual-tryon', files=tryon_files('sse'),
+                             data={'backend': 'remote', 'async': '1'}, timeout=10)
+    assert response.status_code == 202
+    job_id = response.json()['job_id']
+    events = requests.get(f'{live_server}/virtual-tryon/jobs/{job_id}/events', stream=True, timeout=60)
+    wait_for_upstream_request(mock_provider, 1)
+    assert_health_is_prompt(live_server)
+    body = b''.join(events.iter_content(None))
+    assert b'"status": "succeeded"' in body
+
+
+def test_health_answers_while_a_batch_waits(live_server, mock_provider):
+    files = tryon_files('batch')
+    response = requests.post(f'{live_server}/virtual-tryon/batch', files={'avatar_image': files['avatar_image']},
+                             data={'backend': 'remote', 'garment_id': 'blue_shirt,red_tshirt'},
+                             stream=True, timeout=60)
+    assert response.status_code == 200
+    wait_for_upstream_request(mock_provider, 1)
+    assert_health_is_prompt(live_server)
+    lines = [line for line in response.iter_lines() if line]
+    assert b'"done": true' in lines[-1]
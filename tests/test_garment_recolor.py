@@ -0,0 +1,61 @@
+"""Garment colourways: only the garment is recoloured, and colour spellings share an ETag"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from garment_recolor import GarmentRecolorer
+from garment_registry import GarmentRegistry
+from tryon_preprocess import decode_image, flatten_alpha
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'virtual-try-on-app')
+
+
+@pytest.fixture(scope='module')
+def recolorer():
+    return GarmentRecolorer(GarmentRegistry(APP_DIR))
+
+
+def rendered(recolorer, garment_id, colour):
+    """(original, recoloured) BGR images of a catalog garment"""
+    garment, content = recolorer.render_by_id(garment_id, colour)
+    original = flatten_alpha(decode_image(garment.content, keep_alpha=True))
+    return original.astype(np.int16), cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR).astype(np.int16)
+
+
+def top_corners(image, fraction=0.15):
+    """Pixels of the top-left and top-right corners, where these photos show only the wall"""
+    height, width = image.shape[:2]
+    y, x = int(height * fraction), int(width * fraction)
+    return np.concatenate([image[:y, :x].reshape(-1, 3), image[:y, -x:].reshape(-1, 3)])
+
+
+@pytest.mark.parametrize('garment_id', ['gold_saree', 'white_kurta'])
+def test_background_of_photographed_garments_is_unchanged(recolorer, garment_id):
+    original, recoloured = rendered(recolorer, garment_id, 'navy')
+    # Within JPEG re-encoding noise: the wall behind the garment is not turned navy
+    difference = np.abs(top_corners(recoloured) - top_corners(original)).max(axis=1)
+    assert np.mean(difference > 40) < 0.01
+
+    height, width = original.shape[:2]
+    centre = (slice(height * 2 // 5, height * 3 // 5), slice(width * 2 // 5, width * 3 // 5))
+    assert np.abs(recoloured[centre] - original[centre]).max(axis=2).mean() > 40
+
+
+def test_colour_spellings_share_an_etag(api_client):
+    etags = set()
+    for colour in ('1e2c5c', '%231e2c5c', '%231E2C5C'):
+        response = api_client.get(f'/garments/blue_shirt/image?colour={colour}')
+        assert response.status_code == 200
+        etags.add(response.headers['ETag'])
+    assert len(etags) == 1
+    navy = api_client.get('/garments/blue_shirt/image?colour=navy')
+    assert navy.headers['ETag'] not in etags
+
+
+def test_unknown_colour_is_rejected(api_client):
+    response = api_client.get('/garments/blue_shirt/image?colour=notacolour')
+    assert response.status_code == 400
+    assert 'navy' in response.get_json()['colours']
@@ -0,0 +1,86 @@
+"""Measurement history exports: chunked CSV matches the records, and the endpoint streams it"""
+
+import csv
+import io
+import math
+
+import pytest
+
+from measurement_history import MeasurementHistory
+
+DAY = '2025-07-25'
+MIDNIGHT = 1753401600.0  # 2025-07-25T00:00:00Z
+
+
+def rows(count, sessions=('alice', 'bob, "the builder"')):
+    """Queued-row tuples as append() produces them, with some missing waists"""
+    return [(sessions[i % len(sessions)], MIDNIGHT + i * 0.5, 40.0 + i % 7 * 0.25,
+             None if i % 5 == 0 else 80.0 + i % 3, 0.9, 6.7734)
+            for i in range(count)]
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = MeasurementHistory(str(tmp_path / 'history'))
+    history._write(rows(1000))
+    return history
+
+
+def parse(text):
+    reader = csv.reader(io.StringIO(text, newline=''))
+    return next(reader), list(reader)
+
+
+def test_csv_export_matches_the_records(history):
+    header, exported = parse(''.join(history.iter_csv(DAY, chunk_rows=128)))
+    assert header == ['session_id', 'timestamp', 'shoulder_cm', 'waist_cm', 'confidence', 'pixels_per_cm']
+    expected = rows(1000)
+    assert len(exported) == len(expected)
+    for row, (session, timestamp, shoulder, waist, confidence, pixels_per_cm) in zip(exported, expected):
+        assert row[0] == session
+        assert float(row[1]) == pytest.approx(timestamp, abs=1e-3)
+        assert float(row[2]) == pytest.approx(shoulder, abs=0.01)
+        assert row[3] == ('' if waist is None else f'{waist:.2f}')
+        assert float(row[4]) == pytest.approx(confidence, abs=1e-3)
+        assert float(row[5]) == pytest.approx(pixels_per_cm, abs=1e-4)
+
+
+def test_chunking_does_not_change_the_output(history):
+    assert ''.join(history.iter_csv(DAY, chunk_rows=7)) == ''.join(history.iter_csv(DAY))
+    assert len(list(history.iter_csv(DAY, chunk_rows=100))) == 1 + 10
+
+
+def test_csv_export_of_one_session(history, tmp_path):
+    path = str(tmp_path / 'alice.csv')
+    assert history.export(DAY, path, session_id='alice') == 500
+    with open(path, newline='') as f:
+        _, exported = parse(f.read())
+    assert {row[0] for row in exported} == {'alice'}
+    assert len(exported) == 500
+
+
+def test_export_endpoint_streams_csv(api_client):
+    import streaming_api
+    streaming_api.measurement_history._write(rows(300))
+    response = api_client.get(f'/history/{DAY}/export')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert f'measurements-{DAY}.csv' in response.headers['Content-Disposition']
+    _, exported = parse(response.get_data(as_text=True))
+    assert len(exported) == len(streaming_api.measurement_history.read(DAY))
+    assert math.isclose(float(exported[0][1]), MIDNIGHT, abs_tol=1e-3)
+
+
+def test_export_endpoint_rejects_unknown_days_and_formats(api_client):
+    assert api_client.get('/history/2001-01-01/export').status_code == 404
+    assert api_client.get(f'/history/{DAY}/export?format=xlsx').status_code == 400
+
+
+def test_parquet_export_is_written_in_row_groups(history, tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'day.parquet')
+    assert history.export(DAY, path, format='parquet') == 1000
+    table = parquet.read_table(path)
+    assert table.num_rows == 1000
+    assert table.column('session_id').to_pylist()[:2] == ['alice', 'bob, "the builder"']
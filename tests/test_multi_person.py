@@ -0,0 +1,90 @@
+"""Multi-person tracking: stable ids, expiry and people crossing"""
+
+import pytest
+
+from multi_person import PersonTracker, box_iou
+
+
+def box(x, y=100, width=100, height=250):
+    return [x, y, x + width, y + height]
+
+
+def test_box_iou():
+    iou = box_iou([box(0), box(50)], [box(0), box(500)])
+    assert iou.shape == (2, 2)
+    assert iou[0, 0] == pytest.approx(1.0)
+    assert iou[1, 0] == pytest.approx(50 / 150)
+    assert iou[0, 1] == 0.0
+
+
+def test_ids_stay_stable_while_people_move():
+    tracker = PersonTracker()
+    assert tracker.update([box(100), box(400)]) == [1, 2]
+    for step in range(1, 20):
+        # Detection order changes from frame to frame; ids follow the boxes, not the order
+        boxes = [box(100 + step * 5), box(400 - step * 5)]
+        if step % 2:
+            assert tracker.update(boxes[::-1]) == [2, 1]
+        else:
+            assert tracker.update(boxes) == [1, 2]
+
+
+def test_new_people_get_new_ids():
+    tracker = PersonTracker()
+    tracker.update([box(100)])
+    assert tracker.update([box(105), box(600)]) == [1, 2]
+    assert tracker.next_id == 3
+
+
+def test_tracks_survive_short_gaps_and_expire_after_max_missing():
+    tracker = PersonTracker(max_missing=3)
+    tracker.update([box(100), box(400)])
+    for _ in range(3):
+        assert tracker.update([box(400)]) == [2]
+    # Missing for max_missing frames: still known
+    assert tracker.update([box(100), box(400)]) == [1, 2]
+
+    for _ in range(4):
+        tracker.update([box(400)])
+    assert 1 not in tracker.tracks
+    # Coming back after expiry is a new person
+    assert tracker.update([box(100), box(400)]) == [3, 2]
+
+
+def test_no_people_ages_every_track():
+    tracker = PersonTracker(max_missing=1)
+    tracker.update([box(100)])
+    assert tracker.update([]) == []
+    assert tracker.update([]) == []
+    assert tracker.tracks == {}
+
+
+@pytest.mark.parametrize('speed', [10, 20, 25, 30, 40])
+@pytest.mark.parametrize('depth', ['same', 'front'])
+def test_people_crossing_keep_their_ids(speed, depth):
+    tracker = PersonTracker()
+    # One walks right and one left (at the same distance, or closer to the camera);
+    # the detector reports them left to right, so the order flips as they cross
+    size = {'width': 100, 'height': 250} if depth == 'same' else {'y': 80, 'width': 120, 'height': 300}
+    left, right = 100, 500
+    walker, passer = tracker.update([box(left), box(right, **size)])
+    for _ in range(400 // speed):
+        left += speed
+        right -= speed
+        boxes = {walker: box(left), passer: box(right, **size)}
+        ordered = sorted(boxes.items(), key=lambda item: item[1][0])
+        assigned = tracker.update([b for _, b in ordered])
+        if boxes[walker] != boxes[passer]:  # Identical boxes cannot be told apart
+            assert assigned == [track_id for track_id, _ in ordered]
+    assert set(tracker.tracks) == {walker, passer}
+
+
+def test_tracks_follow_their_motion_through_a_short_gap():
+    tracker = PersonTracker()
+    for step in range(10):
+        assert tracker.update([box(40 * step)]) == [1]
+    tracker.update([])
+    tracker.update([])
+    # 120px on from the last box: no overlap with it, but where the track was heading
+    assert box_iou([box(480)], [box(360)])[0, 0] == 0
+    assert tracker.update([box(480)]) == [1]
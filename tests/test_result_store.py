@@ -0,0 +1,56 @@
+"""Try-on result storage: one copy per distinct image, retention"""
+
+import io
+import os
+
+from PIL import Image
+
+from result_store import ResultStore
+
+
+def jpeg(colour):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), colour).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def stored_files(directory):
+    return sorted(name for _, _, files in os.walk(directory) for name in files)
+
+
+def test_storing_the_same_image_again_shares_one_copy(tmp_path):
+    store = ResultStore(str(tmp_path))
+    first = store.put(jpeg('red'), job_id='job-1', cached=False)
+    files = stored_files(tmp_path)
+    again = store.put(jpeg('red'), job_id='job-2', cached=True)
+
+    assert again['result_id'] == first['result_id']
+    assert stored_files(tmp_path) == files
+    assert store.snapshot()['results'] == 1
+    assert store.snapshot()['bytes'] == first['size'] + first['thumbnail_size']
+    assert store.snapshot()['reused'] == 1
+    assert store.get(first['result_id'])['job_id'] == 'job-2'
+
+
+def test_distinct_images_get_distinct_ids(tmp_path):
+    store = ResultStore(str(tmp_path))
+    red = store.put(jpeg('red'))
+    blue = store.put(jpeg('blue'))
+    assert red['result_id'] != blue['result_id']
+    results, total = store.list()
+    assert total == 2
+    assert [r['result_id'] for r in results] == [blue['result_id'], red['result_id']]
+
+
+def test_a_reused_result_counts_as_newest_for_retention(tmp_path):
+    store = ResultStore(str(tmp_path), max_results=2)
+    red = store.put(jpeg('red'))
+    blue = store.put(jpeg('blue'))
+    store.put(jpeg('red'))
+    store.put(jpeg('green'))
+    assert store.get(red['result_id']) is not None
+    assert store.get(blue['result_id']) is None
+
+    reopened = ResultStore(str(tmp_path), max_results=2)
+    assert reopened.snapshot()['results'] == 2
+    assert reopened.list()[0][1]['result_id'] == red['result_id']
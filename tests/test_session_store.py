@@ -0,0 +1,114 @@
+"""Parity of the in-process and Redis session stores, and Socket.IO fan-out over Redis"""
+
+import time
+
+import pytest
+
+import session_store
+from session_store import InMemorySessionStore, RedisSessionStore
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """Every redis.Redis.from_url() connects to one shared in-process fake server"""
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(session_store.redis.Redis, 'from_url',
+                        classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs)))
+    return server
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def make_store(request):
+    if request.param == 'redis':
+        request.getfixturevalue('redis_server')
+
+    def make(**ttls):
+        if request.param == 'memory':
+            return InMemorySessionStore(**ttls)
+        return RedisSessionStore('redis://fake', **ttls)
+    return make
+
+
+def test_session_fields_merge_and_delete(make_store):
+    store = make_store()
+    assert store.get_session('s1') == {}
+    store.update_session('s1', calibration={'pixels_per_cm': 7.5})
+    store.update_session('s1', display_calibration={'dpr': 2})
+    assert store.get_session('s1') == {'calibration': {'pixels_per_cm': 7.5}, 'display_calibration': {'dpr': 2}}
+    store.delete_session('s1')
+    assert store.get_session('s1') == {}
+
+
+def test_job_set_update_and_get(make_store):
+    store = make_store()
+    assert store.get_job('j1') is None
+    store.set_job('j1', {'job_id': 'j1', 'status': 'queued', 'progress': 0})
+    job = store.update_job('j1', status='running', progress=10)
+    assert job == {'job_id': 'j1', 'status': 'running', 'progress': 10}
+    assert store.get_job('j1') == job
+    # set_job replaces the record rather than merging
+    store.set_job('j1', {'job_id': 'j1', 'status': 'succeeded'})
+    assert store.get_job('j1') == {'job_id': 'j1', 'status': 'succeeded'}
+
+
+def test_sessions_and_jobs_expire(make_store):
+    store = make_store(session_ttl=1, job_ttl=1)
+    store.update_session('s1', calibration=1)
+    store.set_job('j1', {'status': 'queued'})
+    assert store.get_session('s1') and store.get_job('j1')
+    time.sleep(1.2)
+    assert store.get_session('s1') == {}
+    assert store.get_job('j1') is None
+
+
+def test_activity_refreshes_ttl(make_store):
+    store = make_store(session_ttl=1, job_ttl=1)
+    store.update_session('s1', calibration=1)
+    store.set_job('j1', {'status': 'queued'})
+    time.sleep(0.7)
+    store.update_session('s1', display_calibration=2)
+    store.update_job('j1', status='running')
+    time.sleep(0.7)
+    assert store.get_session('s1') == {'calibration': 1, 'display_calibration': 2}
+    assert store.get_job('j1') == {'status': 'running'}
+
+
+def test_redis_replicas_share_state(redis_server):
+    node_a = RedisSessionStore('redis://fake')
+    node_b = RedisSessionStore('redis://fake')
+    node_a.update_session('s1', calibration={'pixels_per_cm': 6.1})
+    node_a.set_job('j1', {'status': 'queued'})
+    node_b.update_job('j1', status='succeeded')
+    assert node_b.get_session('s1') == {'calibration': {'pixels_per_cm': 6.1}}
+    assert node_a.get_job('j1') == {'status': 'succeeded'}
+    assert node_a.ping() and node_b.ping()
+
+
+def test_socketio_emits_fan_out_to_other_replicas(redis_server):
+    """An emit on one replica reaches the other replica's manager through the Redis message queue"""
+    socketio = pytest.importorskip('socketio')
+
+    class RecordingManager(socketio.RedisManager):
+        def _handle_emit(self, message):
+            self.received.append(message)
+
+    node_a = socketio.Server(client_manager=socketio.RedisManager('redis://fake'), async_mode='threading')
+    manager_b = RecordingManager('redis://fake')
+    manager_b.received = []
+    socketio.Server(client_manager=manager_b, async_mode='threading')
+    manager_b.initialize()
+    time.sleep(0.3)  # Let replica B subscribe
+
+    node_a.emit('tryon_progress', {'job_id': 'j1', 'status': 'running'}, to='job-j1')
+    deadline = time.time() + 5
+    while not manager_b.received and time.time() < deadline:
+        time.sleep(0.05)
+    assert manager_b.received, 'emit was not relayed through Redis'
+    message = manager_b.received[0]
+    assert (message['event'], message['room'], message['data']) == ('tryon_progress', 'job-j1', [{'job_id': 'j1', 'status': 'running'}])
+
+
+def test_create_session_store_picks_backend(redis_server):
+    assert session_store.create_session_store(None).backend == 'memory'
+    assert session_store.create_session_store('redis://fake').backend == 'redis'
@@ -0,0 +1,57 @@
+"""Size recommendations from the bundled size charts"""
+
+import pytest
+
+from size_recommender import SizeRecommender
+
+
+@pytest.fixture(scope='module')
+def recommender():
+    return SizeRecommender.from_file()
+
+
+def test_recommends_a_fitting_size(recommender):
+    result, = recommender.recommend([{'shoulder_cm': 43.5, 'waist_cm': 29.5}], ['default/shirt'])[0]
+    assert result['size'] == 'M'
+    assert result['fits'] is True
+    assert set(result['margins']) == {'shoulder_cm', 'waist_cm'}
+
+
+@pytest.mark.parametrize('measurements', [{}, {'shoulder_cm': None, 'waist_cm': None}])
+def test_no_measurements_gives_no_size(recommender, measurements):
+    result, = recommender.recommend([measurements], ['default/shirt'])[0]
+    assert result['size'] is None
+    assert result['fits'] is None
+    assert result['margins'] == {}
+
+
+def test_one_measurement_is_enough(recommender):
+    result, = recommender.recommend([{'shoulder_cm': 43.5, 'waist_cm': None}], ['default/shirt'])[0]
+    assert result['size'] is not None
+    assert list(result['margins']) == ['shoulder_cm']
+
+
+def test_free_size_charts_fit_any_measurements(recommender):
+    result, = recommender.recommend([{'shoulder_cm': 43.5}], ['default/saree'])[0]
+    assert result['size'] == 'Free Size'
+    assert result['fits'] is True
+
+
+def test_unknown_sku_has_no_chart(recommender):
+    result, = recommender.recommend([{'shoulder_cm': 43.5}], ['no-such-garment'])[0]
+    assert result == {'sku': 'no-such-garment', 'chart': None, 'size': None}
+
+
+@pytest.mark.parametrize('skus', [[123], ['blue_kurta', None], 'blue_kurta'])
+def test_endpoint_rejects_skus_that_are_not_strings(api_client, skus):
+    response = api_client.post('/size-recommendation', json={'measurements': {'shoulder_cm': 43.5}, 'skus': skus})
+    assert response.status_code == 400
+    assert 'skus' in response.get_json()['error']
+
+
+def test_endpoint_answers_null_size_without_measurements(api_client):
+    response = api_client.post('/size-recommendation',
+                           json={'measurements': {'shoulder_cm': None, 'waist_cm': None}, 'skus': ['blue_kurta']})
+    assert response.status_code == 200
+    result, = response.get_json()['results']
+    assert result['size'] is None and result['fits'] is None
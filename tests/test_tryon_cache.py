@@ -0,0 +1,47 @@
+"""Try-on result cache: LRU eviction and persisted access times"""
+
+import json
+import time
+
+from tryon_cache import TryOnResultCache, cache_key
+
+
+def sidecar(cache, key):
+    with open(cache._path(key, '.json')) as f:
+        return json.load(f)
+
+
+def test_cache_key_depends_on_every_input():
+    key = cache_key(b'shirt', b'avatar', {'seed': 1})
+    assert key == cache_key(b'shirt', b'avatar', {'seed': 1})
+    assert key != cache_key(b'shirt', b'avatar', {'seed': 2})
+    assert key != cache_key(b'avatar', b'shirt', {'seed': 1})
+
+
+def test_hits_are_persisted_in_batches(tmp_path):
+    cache = TryOnResultCache(str(tmp_path), flush_batch=2, flush_interval=3600)
+    for name in ('a', 'b'):
+        cache.put(name * 64, b'jpeg-' + name.encode())
+    written = sidecar(cache, 'a' * 64)['last_access']
+
+    time.sleep(0.01)
+    assert cache.get('a' * 64)[0] == b'jpeg-a'
+    assert sidecar(cache, 'a' * 64)['last_access'] == written  # waiting for the batch
+    cache.get('b' * 64)
+    assert sidecar(cache, 'a' * 64)['last_access'] > written
+    assert cache.snapshot()['access_flushes'] == 1
+
+
+def test_lru_order_survives_a_restart(tmp_path):
+    cache = TryOnResultCache(str(tmp_path), max_bytes=300)
+    for name in ('a', 'b', 'c'):
+        cache.put(name * 64, name.encode() * 100)
+        time.sleep(0.01)
+    cache.get('a' * 64)  # 'b' is now the least recently used
+    cache.flush_access_times()
+
+    reopened = TryOnResultCache(str(tmp_path), max_bytes=300)
+    reopened.put('d' * 64, b'd' * 100)
+    assert 'a' * 64 in reopened
+    assert 'b' * 64 not in reopened
+    assert 'c' * 64 in reopened
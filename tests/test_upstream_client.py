@@ -0,0 +1,148 @@
+"""Upstream try-on client against the mock provider: retries, circuit breaker and pooling"""
+
+import time
+
+import pytest
+import requests
+
+from mock_tryon_server import start_mock_server
+from upstream_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+from upstream_scheduler import UpstreamBusyError
+
+
+@pytest.fixture
+def provider():
+    """Start a mock provider; returns (server, base_url) and shuts it down afterwards"""
+    servers = []
+
+    def start(**config):
+        config.setdefault('latency', 0)
+        config.setdefault('latency_dist', 'fixed')
+        config.setdefault('response_kb', 1)
+        server, url = start_mock_server(**config)
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def upstream_requests(server):
+    return server.RequestHandlerClass.config.stats['requests']
+
+
+class BusyScheduler:
+    """Scheduler stand-in that never grants a slot"""
+
+    def acquire(self, user=None, priority=None, on_wait=None, timeout=None, key=None):
+        raise UpstreamBusyError('Try-on service is at its rate limit, try again shortly', 1.0)
+
+    def observe(self, response):
+        pass
+
+
+def test_busy_scheduler_gives_back_the_half_open_probe(provider):
+    server, url = provider()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+
+    busy = UpstreamClient(url, breaker=breaker, scheduler=BusyScheduler())
+    with pytest.raises(UpstreamBusyError):
+        busy.post('/try-on-file')
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    # The next call may probe, and a good response closes the breaker again
+    client = UpstreamClient(url, breaker=breaker)
+    assert client.post('/try-on-file').status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert upstream_requests(server) == 1
+
+
+def make_client(url, **kwargs):
+    kwargs.setdefault('backoff_base', 0.01)
+    kwargs.setdefault('backoff_max', 0.02)
+    return UpstreamClient(url, **kwargs)
+
+
+def test_retries_retryable_5xx_then_returns_the_last_response(provider):
+    server, url = provider(error_rate=1.0, error_statuses=[503])
+    client = make_client(url, max_retries=2)
+    response = client.post('/try-on-file')
+    assert response.status_code == 503
+    assert upstream_requests(server) == 3
+    assert client.metrics['retries'] == 2
+    assert client.metrics['failures'] == 1
+
+
+def test_recovers_when_a_retry_succeeds(provider):
+    server, url = provider(error_rate=0.5, error_statuses=[502], seed=3)
+    client = make_client(url, max_retries=5)
+    for _ in range(5):
+        assert client.post('/try-on-file').status_code == 200
+    assert client.metrics['retries'] == upstream_requests(server) - 5 > 0
+    assert client.metrics['failures'] == 0
+
+
+@pytest.mark.parametrize('status', [400, 422])
+def test_does_not_retry_client_errors(provider, status):
+    server, url = provider(error_rate=1.0, error_statuses=[status])
+    client = make_client(url, max_retries=2)
+    assert client.post('/try-on-file').status_code == status
+    assert upstream_requests(server) == 1
+    assert client.metrics['retries'] == 0
+    # The provider answered: a rejected request is not a provider failure
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_then_recovers_through_a_half_open_probe(provider):
+    server, url = provider(error_rate=1.0, error_statuses=[500])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    client = make_client(url, max_retries=0, breaker=breaker)
+    for _ in range(2):
+        assert client.post('/try-on-file').status_code == 500
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Open: calls fail fast without reaching the provider
+    with pytest.raises(CircuitOpenError):
+        client.post('/try-on-file')
+    assert upstream_requests(server) == 2
+    assert client.metrics['short_circuited'] == 1
+
+    # A failed probe re-opens the breaker straight away
+    time.sleep(0.25)
+    assert client.post('/try-on-file').status_code == 500
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+    # Once the provider is healthy the next probe closes it
+    server.RequestHandlerClass.config.error_rate = 0.0
+    time.sleep(0.25)
+    assert client.post('/try-on-file').status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert client.post('/try-on-file').status_code == 200
+    assert upstream_requests(server) == 5
+
+
+def test_reuses_one_keep_alive_connection(provider):
+    server, url = provider()
+    client = make_client(url)
+    for _ in range(5):
+        assert client.post('/try-on-file', files={'avatar_image': ('a.jpg', b'\xff\xd8' * 512, 'image/jpeg')}).status_code == 200
+    pool, = client.pool_stats()
+    assert pool['requests'] == 5
+    assert pool['connections_opened'] == 1
+    assert pool['idle_connections'] >= 1
+
+
+def test_retries_connection_failures_then_raises(provider):
+    server, url = provider()
+    server.shutdown()
+    server.server_close()
+    client = make_client(url, max_retries=2)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post('/try-on-file')
+    assert client.metrics['retries'] == 2
+    assert client.breaker.consecutive_failures == 1
@@ -0,0 +1,216 @@
+"""
+Content-addressed cache for virtual try-on results.
+
+Results are keyed by a hash of the clothing bytes, avatar bytes and request
+parameters and stored on disk under a size cap with LRU eviction; an
+in-memory index makes lookups free. Access times are written back to the
+sidecars in batches, so the LRU order survives restarts without a disk
+write per hit. SingleFlight collapses identical in-flight requests into one
+upstream call.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+HASH_CHUNK = 1024 * 1024
+ACCESS_FLUSH_INTERVAL = 30.0  # seconds between sidecar rewrites for cache hits
+ACCESS_FLUSH_BATCH = 64       # ...or sooner once this many hits are waiting
+
+
+def _update_hash(digest, value):
+    """Feed bytes or a seekable file object into a hash"""
+    if isinstance(value, (bytes, bytearray)):
+        digest.update(value)
+        return
+    value.seek(0)
+    for chunk in iter(lambda: value.read(HASH_CHUNK), b''):
+        digest.update(chunk)
+    value.seek(0)
+
+
+def cache_key(clothing, avatar, params=None):
+    """sha256 over clothing bytes, avatar bytes and canonical JSON parameters"""
+    digest = hashlib.sha256()
+    for part in (clothing, avatar):
+        part_digest = hashlib.sha256()
+        _update_hash(part_digest, part)
+        digest.update(part_digest.digest())
+    digest.update(json.dumps(params or {}, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class TryOnResultCache:
+    """Size-bounded on-disk result store with an in-memory LRU index"""
+
+    def __init__(self, directory='tryon_cache', max_bytes=512 * 1024 * 1024,
+                 flush_interval=ACCESS_FLUSH_INTERVAL, flush_batch=ACCESS_FLUSH_BATCH):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._index = OrderedDict()  # key -> metadata, least recently used first
+        self._total_bytes = 0
+        self._accessed = set()  # keys whose last_access is newer than their sidecar
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'access_flushes': 0}
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _write(self, path, data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _load_index(self):
+        """Rebuild the index from disk, oldest access first"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(root, name), 'r') as f:
+                        meta = json.load(f)
+                    if os.path.exists(self._path(meta['key'], '.jpg')):
+                        entries.append(meta)
+                except (OSError, ValueError, KeyError):
+                    continue
+        for meta in sorted(entries, key=lambda m: m.get('last_access', 0)):
+            self._index[meta['key']] = meta
+            self._total_bytes += meta['size']
+        if entries:
+            print(f"🗃️ Try-on cache: {len(entries)} results ({self._total_bytes / 1e6:.1f} MB) loaded from {self.directory}")
+
+    def __contains__(self, key):
+        """Whether a result is cached, without counting a hit or miss"""
+        with self._lock:
+            return key in self._index
+
+    def get(self, key):
+        """Return (content, metadata) for a cached result or None"""
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                self.stats['misses'] += 1
+                return None
+            self._index.move_to_end(key)
+            meta['last_access'] = time.time()
+            self._accessed.add(key)
+            self.stats['hits'] += 1
+            flush = (len(self._accessed) >= self.flush_batch
+                     or meta['last_access'] - self._last_flush >= self.flush_interval)
+        if flush:
+            self.flush_access_times()
+        try:
+            with open(self._path(key, '.jpg'), 'rb') as f:
+                return f.read(), dict(meta)
+        except OSError:
+            # File vanished underneath us; forget the entry
+            with self._lock:
+                if self._index.pop(key, None) is not None:
+                    self._total_bytes -= meta['size']
+            return None
+
+    def put(self, key, content, **meta):
+        """Store a result and evict least recently used entries beyond max_bytes"""
+        if len(content) > self.max_bytes:
+            return
+        meta = dict(meta, key=key, size=len(content), created_at=time.time(), last_access=time.time())
+        os.makedirs(os.path.dirname(self._path(key, '.jpg')), exist_ok=True)
+        for suffix, data in (('.jpg', content), ('.json', json.dumps(meta).encode('utf-8'))):
+            self._write(self._path(key, suffix), data)
+
+        evicted = []
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous['size']
+            self._index[key] = meta
+            self._accessed.discard(key)  # just written with a fresh last_access
+            self._total_bytes += meta['size']
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, old_meta = self._index.popitem(last=False)
+                self._total_bytes -= old_meta['size']
+                self._accessed.discard(old_key)
+                self.stats['evictions'] += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            for suffix in ('.jpg', '.json'):
+                try:
+                    os.remove(self._path(old_key, suffix))
+                except OSError:
+                    pass
+
+    def flush_access_times(self):
+        """Write the access times of results hit since the last flush to their sidecars"""
+        with self._lock:
+            pending = [dict(self._index[key]) for key in self._accessed if key in self._index]
+            self._accessed.clear()
+            self._last_flush = time.time()
+            if pending:
+                self.stats['access_flushes'] += 1
+        for meta in pending:
+            if not os.path.exists(self._path(meta['key'], '.jpg')):
+                continue  # evicted since
+            try:
+                self._write(self._path(meta['key'], '.json'), json.dumps(meta).encode('utf-8'))
+            except OSError as e:
+                print(f"⚠️ Could not persist try-on cache access time: {e}")
+        return len(pending)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'entries': len(self._index),
+                'unflushed_accesses': len(self._accessed),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                **self.stats
+            }
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers for the same key share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, fn):
+        """Returns (result, shared) where shared is True if another caller did the work"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
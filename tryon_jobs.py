@@ -0,0 +1,147 @@
+"""
+Asynchronous virtual try-on jobs.
+
+A POST creates a job and returns immediately; a bounded pool of background
+workers calls the upstream try-on service. Job status lives in the session
+store so any replica can answer polls, and every status change is pushed
+to subscribers (Socket.IO) through the notify callback.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised when the try-on job queue cannot accept more work"""
+
+
+class TryOnError(Exception):
+    """A try-on failure with the HTTP status to report to the client"""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TryOnJobQueue:
+    """Bounded worker pool for try-on jobs with status tracking and push notifications"""
+
+    def __init__(self, run_job, store, notify=None, max_workers=4, max_pending=32, sleep=None, poll_interval=0.05):
+        self.run_job = run_job        # run_job(job_id, payload, progress) -> result fields
+        self.store = store            # session store holding job records
+        self.notify = notify          # notify(job) on every status change
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        # Cooperative sleep (socketio.sleep under eventlet): wait() polls with it instead of
+        # blocking on the event, so a synchronous request does not stall the event loop
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tryon-worker')
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._running = 0
+        self._events = {}  # job id -> threading.Event set when the job finishes (this node)
+
+    def _publish(self, job_id, **fields):
+        job = self.store.update_job(job_id, updated_at=time.time(), **fields)
+        if self.notify:
+            try:
+                self.notify(job)
+            except Exception as e:
+                print(f"⚠️ Try-on job notification failed: {e}")
+        return job
+
+    def submit(self, payload, session_id=None, on_discard=None):
+        """Queue a try-on; returns the job record or raises QueueFullError"""
+        with self._lock:
+            if self._outstanding >= self.max_workers + self.max_pending:
+                raise QueueFullError('Try-on queue is full')
+            self._outstanding += 1
+            position = max(0, self._outstanding - self.max_workers)
+
+        job_id = uuid.uuid4().hex
+        self._events[job_id] = threading.Event()
+        self.store.set_job(job_id, {
+            'job_id': job_id,
+            'status': JOB_QUEUED,
+            'session_id': session_id,
+            'queue_position': position,
+            'progress': 0,
+            'created_at': time.time()
+        })
+        job = self._publish(job_id)
+        self.executor.submit(self._run, job_id, payload, on_discard)
+        return job
+
+    def record_completed(self, make_result, session_id=None):
+        """Record a job answered without a worker (e.g. from the cache); make_result(job_id) -> result fields"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.store.set_job(job_id, {
+            'job_id': job_id,
+            'status': JOB_RUNNING,
+            'session_id': session_id,
+            'queue_position': 0,
+            'created_at': now,
+            'started_at': now
+        })
+        return self._publish(job_id, status=JOB_SUCCEEDED, progress=100, finished_at=time.time(), **make_result(job_id))
+
+    def _run(self, job_id, payload, on_discard):
+        with self._lock:
+            self._running += 1
+        try:
+            self._publish(job_id, status=JOB_RUNNING, queue_position=0, progress=10, started_at=time.time())
+
+            def progress(percent, message=None, **fields):
+                self._publish(job_id, progress=percent, message=message, **fields)
+
+            result = self.run_job(job_id, payload, progress)
+            self._publish(job_id, status=JOB_SUCCEEDED, progress=100, finished_at=time.time(), **result)
+        except Exception as e:
+            print(f"❌ Try-on job {job_id} failed: {e}")
+            status_code = e.status_code if isinstance(e, TryOnError) else 500
+            self._publish(job_id, status=JOB_FAILED, error=str(e), error_status=status_code, finished_at=time.time())
+        finally:
+            if on_discard:
+                on_discard()
+            with self._lock:
+                self._running -= 1
+                self._outstanding -= 1
+            event = self._events.pop(job_id, None)
+            if event:
+                event.set()
+
+    def get(self, job_id):
+        return self.store.get_job(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """Wait until a job submitted on this node finishes; returns the job record"""
+        event = self._events.get(job_id)
+        if event and self.sleep is None:
+            event.wait(timeout)
+        elif event:
+            deadline = None if timeout is None else time.time() + timeout
+            while not event.is_set():
+                remaining = self.poll_interval if deadline is None else deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.sleep(min(remaining, self.poll_interval))
+        return self.store.get_job(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'running': self._running,
+                'queued': self._outstanding - self._running,
+                'max_pending': self.max_pending
+            }
@@ -0,0 +1,136 @@
+"""
+Speculative try-on prefetch.
+
+While a shopper browses the catalog the frontend reports the garments they
+are likely to try next. Once the session has an avatar, those try-ons are
+generated into the result cache in the background, one at a time and only
+while the try-on workers have spare capacity, so a click on a predicted
+garment is answered from the cache. A real try-on from the session cancels
+its pending predictions; new predictions replace the old ones.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class PrefetchQueue:
+    """Low-priority per-session prediction queue drained by background threads"""
+
+    def __init__(self, run_prefetch, has_spare_capacity, max_per_session=3, max_sessions=200,
+                 avatar_ttl=1800, workers=1, poll_interval=0.5):
+        self.run_prefetch = run_prefetch              # run_prefetch(session_id, garment_id, avatar) -> cache key or None
+        self.has_spare_capacity = has_spare_capacity  # () -> True when real try-ons leave room for speculation
+        self.max_per_session = max_per_session
+        self.max_sessions = max_sessions
+        self.avatar_ttl = avatar_ttl
+        self.poll_interval = poll_interval
+        self._avatars = OrderedDict()   # session id -> avatar entry, least recently used first
+        self._pending = OrderedDict()   # session id -> garment ids, served round-robin
+        self._prefetched = OrderedDict()  # cache keys generated speculatively and not yet claimed
+        self._cond = threading.Condition()
+        self.stats = {'predicted': 0, 'started': 0, 'completed': 0, 'failed': 0,
+                      'cancelled': 0, 'deferred': 0, 'hits': 0}
+        for i in range(workers):
+            threading.Thread(target=self._work, daemon=True, name=f'tryon-prefetch-{i}').start()
+
+    def set_avatar(self, session_id, data, prepared=None):
+        """Remember a session's avatar (raw upload bytes); returns its digest"""
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        with self._cond:
+            previous = self._avatars.pop(session_id, None)
+            if previous and previous['digest'] != digest:
+                # Predictions were for the old photo
+                self._cancel_locked(session_id)
+            self._avatars[session_id] = {'data': data, 'digest': digest, 'prepared': prepared, 'at': time.time()}
+            while len(self._avatars) > self.max_sessions:
+                old_session, _ = self._avatars.popitem(last=False)
+                self._cancel_locked(old_session)
+        return digest
+
+    def avatar(self, session_id):
+        """A session's avatar entry ({'data', 'digest', 'prepared'}) or None once expired"""
+        with self._cond:
+            entry = self._avatars.get(session_id)
+            if entry and time.time() - entry['at'] > self.avatar_ttl:
+                del self._avatars[session_id]
+                self._cancel_locked(session_id)
+                return None
+            return entry
+
+    def predict(self, session_id, garment_ids):
+        """Replace a session's pending predictions; returns the garment ids queued"""
+        queued = list(dict.fromkeys(garment_ids))[:self.max_per_session]
+        with self._cond:
+            self._cancel_locked(session_id)
+            if queued:
+                self._pending[session_id] = queued
+                self.stats['predicted'] += len(queued)
+                self._cond.notify_all()
+        return queued
+
+    def cancel(self, session_id):
+        """Drop a session's predictions that have not started (a real try-on arrived)"""
+        with self._cond:
+            self._cancel_locked(session_id)
+
+    def _cancel_locked(self, session_id):
+        dropped = self._pending.pop(session_id, None)
+        if dropped:
+            self.stats['cancelled'] += len(dropped)
+
+    def claim(self, key):
+        """True (once) if a cached result was produced by prefetch"""
+        with self._cond:
+            if self._prefetched.pop(key, None) is None:
+                return False
+            self.stats['hits'] += 1
+            return True
+
+    def _next(self):
+        """Block until a prediction can run on spare capacity; returns (session id, garment id)"""
+        with self._cond:
+            while True:
+                while not self._pending:
+                    self._cond.wait()
+                if self.has_spare_capacity():
+                    break
+                # Real try-ons come first; check again shortly
+                self.stats['deferred'] += 1
+                self._cond.wait(self.poll_interval)
+
+            session_id, garment_ids = self._pending.popitem(last=False)
+            garment_id = garment_ids.pop(0)
+            if garment_ids:
+                self._pending[session_id] = garment_ids  # back of the round-robin
+            self.stats['started'] += 1
+            return session_id, garment_id
+
+    def _work(self):
+        while True:
+            session_id, garment_id = self._next()
+            avatar = self.avatar(session_id)
+            if avatar is None:
+                continue
+            try:
+                key = self.run_prefetch(session_id, garment_id, avatar)
+            except Exception as e:
+                print(f"⚠️ Try-on prefetch of {garment_id} failed: {e}")
+                with self._cond:
+                    self.stats['failed'] += 1
+                continue
+            with self._cond:
+                self.stats['completed'] += 1
+                if key:
+                    self._prefetched[key] = time.time()
+                    while len(self._prefetched) > self.max_sessions * self.max_per_session:
+                        self._prefetched.popitem(last=False)
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'sessions_with_avatar': len(self._avatars),
+                'pending': sum(len(ids) for ids in self._pending.values()),
+                **self.stats
+            }
@@ -0,0 +1,254 @@
+"""
+Pre-processing of try-on uploads before they go upstream.
+
+Avatars are cropped to a padded box around the person found by the pose
+model, garments are trimmed to their content, and both are downscaled to
+the provider's working size and re-encoded as JPEG. Smaller uploads mean
+less time on the wire and less work for the provider.
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from shoulder_distance import ShoulderDistanceCalculator
+
+# Long side the provider works at; larger images are only extra upload time
+DEFAULT_MAX_SIDE = 1024
+DEFAULT_JPEG_QUALITY = 90
+# Pose detection runs on a copy at most this large (landmarks are normalised)
+DETECTION_MAX_SIDE = 640
+
+
+def decode_image(data, keep_alpha=False):
+    """Decode image bytes to a BGR (or BGRA) array, or None"""
+    flags = cv2.IMREAD_UNCHANGED if keep_alpha else cv2.IMREAD_COLOR
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if image is not None and image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image
+
+
+def encode_jpeg(image, quality):
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok:
+        raise ValueError('JPEG encoding failed')
+    return buffer.tobytes()
+
+
+def downscale(image, max_side):
+    """Shrink so the long side is at most max_side (never enlarges)"""
+    height, width = image.shape[:2]
+    scale = max_side / float(max(height, width))
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (int(round(width * scale)), int(round(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+def flatten_alpha(image, background=255):
+    """Composite a BGRA image onto a plain background"""
+    if image.shape[2] != 4:
+        return image
+    alpha = image[:, :, 3:4].astype(np.float32) / 255.0
+    flat = image[:, :, :3].astype(np.float32) * alpha + background * (1.0 - alpha)
+    return flat.astype(np.uint8)
+
+
+def person_box(landmarks, width, height, padding=0.15, aspect=0.75, min_visibility=0.5):
+    """Padded (x0, y0, x1, y1) box around visible landmarks, widened towards aspect (w/h)"""
+    points = np.array([(x, y) for x, y, visibility in landmarks if visibility >= min_visibility])
+    if len(points) < 4:
+        return None
+    x0, y0 = points.min(axis=0)
+    x1, y1 = points.max(axis=0)
+    box_height = y1 - y0
+    # The crown sits above the eye/ear landmarks and arms may hang outside the torso
+    pad_x = max((x1 - x0) * padding, box_height * 0.1)
+    x0, x1 = x0 - pad_x, x1 + pad_x
+    y0, y1 = y0 - box_height * (padding + 0.1), y1 + box_height * padding
+
+    # Grow the short dimension to the provider's aspect ratio
+    box_width, box_height = x1 - x0, y1 - y0
+    if box_width / box_height < aspect:
+        grow = (box_height * aspect - box_width) / 2
+        x0, x1 = x0 - grow, x1 + grow
+    else:
+        grow = (box_width / aspect - box_height) / 2
+        y0, y1 = y0 - grow, y1 + grow
+
+    x0, y0 = max(0, int(x0)), max(0, int(y0))
+    x1, y1 = min(width, int(np.ceil(x1))), min(height, int(np.ceil(y1)))
+    if x1 - x0 < 16 or y1 - y0 < 16:
+        return None
+    return x0, y0, x1, y1
+
+
+def foreground_mask(image, threshold=12):
+    """Boolean mask of a garment's pixels: alpha channel, or difference from the border colour"""
+    if image.shape[2] == 4:
+        return image[:, :, 3] > 8
+    border = np.concatenate([image[0], image[-1], image[:, 0], image[:, -1]])
+    background = np.median(border, axis=0)
+    return np.abs(image.astype(np.int16) - background).max(axis=2) > threshold
+
+
+def content_box(image, threshold=12, margin=0.03):
+    """(x0, y0, x1, y1) around a garment's pixels, excluding a plain or transparent background"""
+    height, width = image.shape[:2]
+    mask = foreground_mask(image, threshold)
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0 or len(cols) == 0:
+        return None
+    pad = int(max(height, width) * margin)
+    return (max(0, cols[0] - pad), max(0, rows[0] - pad),
+            min(width, cols[-1] + 1 + pad), min(height, rows[-1] + 1 + pad))
+
+
+class PoseDetector:
+    """Shared still-image pose detection, run on a downscaled copy"""
+
+    def __init__(self, max_side=DETECTION_MAX_SIDE):
+        self.max_side = max_side
+        self._calculator = None
+        self._lock = threading.Lock()  # the MediaPipe graph is not thread-safe
+
+    def detect(self, image):
+        """Landmarks as (x_px, y_px, visibility) in the full image's coordinates, or None"""
+        small = downscale(image, self.max_side)
+        scale = image.shape[1] / float(small.shape[1])
+        with self._lock:
+            if self._calculator is None:
+                self._calculator = ShoulderDistanceCalculator(static_image_mode=True)
+            landmarks = self._calculator.detect_landmarks(small)
+        if landmarks is None:
+            return None
+        return [(x * scale, y * scale, visibility) for x, y, visibility in landmarks]
+
+
+class TryOnPreprocessor:
+    """Crops, downscales and re-encodes try-on images, tracking bytes saved"""
+
+    def __init__(self, max_side=DEFAULT_MAX_SIDE, jpeg_quality=DEFAULT_JPEG_QUALITY, padding=0.15, pose_detector=None):
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        self.padding = padding
+        self.pose_detector = pose_detector or PoseDetector()
+        self._stats_lock = threading.Lock()
+        self.stats = {'images': 0, 'bytes_in': 0, 'bytes_out': 0, 'avatars_cropped': 0, 'garments_trimmed': 0, 'failures': 0}
+
+    def settings(self):
+        """Parameters that change the bytes sent upstream (part of the result cache key)"""
+        return {'max_side': self.max_side, 'jpeg_quality': self.jpeg_quality, 'padding': self.padding}
+
+    def _finish(self, kind, data, image, changed):
+        """Encode the processed image, keeping the original when that is smaller and nothing was cut"""
+        image = downscale(image, self.max_side)
+        encoded = encode_jpeg(image, self.jpeg_quality)
+        if not changed and len(encoded) >= len(data):
+            encoded = data
+        with self._stats_lock:
+            self.stats['images'] += 1
+            self.stats['bytes_in'] += len(data)
+            self.stats['bytes_out'] += len(encoded)
+        return encoded, {
+            'kind': kind,
+            'original_bytes': len(data),
+            'bytes': len(encoded),
+            'size': [int(image.shape[1]), int(image.shape[0])],
+            're_encoded': encoded is not data
+        }
+
+    def _failed(self, kind, data, error):
+        print(f"⚠️ Could not pre-process {kind} image, sending original: {error}")
+        with self._stats_lock:
+            self.stats['failures'] += 1
+        return data, {'kind': kind, 'original_bytes': len(data), 'bytes': len(data), 're_encoded': False}
+
+    def prepare_avatar(self, data):
+        """Crop an avatar photo to the person and shrink it; returns (bytes, report)"""
+        try:
+            image = decode_image(data)
+            if image is None:
+                raise ValueError('unreadable image')
+            height, width = image.shape[:2]
+            original_size = [width, height]
+            changed = max(height, width) > self.max_side
+
+            landmarks = self.pose_detector.detect(image)
+            box = person_box(landmarks, width, height, padding=self.padding) if landmarks else None
+            # Only crop when it removes a meaningful amount of background
+            cropped = box is not None and (box[2] - box[0]) * (box[3] - box[1]) < 0.9 * width * height
+            if cropped:
+                image = image[box[1]:box[3], box[0]:box[2]]
+                changed = True
+                with self._stats_lock:
+                    self.stats['avatars_cropped'] += 1
+
+            encoded, report = self._finish('avatar', data, image, changed)
+            report.update(original_size=original_size, person_found=landmarks is not None,
+                          crop_box=[int(v) for v in box] if cropped else None)
+            return encoded, report
+        except Exception as e:
+            return self._failed('avatar', data, e)
+
+    def prepare_garment(self, data):
+        """Trim a garment image to its content and shrink it; returns (bytes, report)"""
+        try:
+            image = decode_image(data, keep_alpha=True)
+            if image is None:
+                raise ValueError('unreadable image')
+            height, width = image.shape[:2]
+            original_size = [width, height]
+            changed = max(height, width) > self.max_side or image.shape[2] == 4
+
+            box = content_box(image)
+            trimmed = box is not None and (box[2] - box[0]) * (box[3] - box[1]) < 0.95 * width * height
+            if trimmed:
+                image = image[box[1]:box[3], box[0]:box[2]]
+                changed = True
+                with self._stats_lock:
+                    self.stats['garments_trimmed'] += 1
+
+            encoded, report = self._finish('garment', data, flatten_alpha(image), changed)
+            report.update(original_size=original_size, trimmed=trimmed)
+            return encoded, report
+        except Exception as e:
+            return self._failed('garment', data, e)
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+        return {**self.settings(), **stats}
+
+
+class SharedPreparation:
+    """Runs a prepare step once on first use and shares its (bytes, report) between try-ons"""
+
+    def __init__(self, prepare, data):
+        self.prepare = prepare
+        self.data = data
+        self._result = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._result is None:
+                self._result = self.prepare(self.data)
+                self.data = None
+            return self._result
+
+
+def create_preprocessor(pose_detector=None):
+    """Pre-processor configured from the environment, or None when disabled"""
+    if os.getenv('TRYON_PREPROCESS', '1').lower() in ('0', 'false', 'no'):
+        return None
+    return TryOnPreprocessor(
+        max_side=int(os.getenv('TRYON_IMAGE_MAX_SIDE', DEFAULT_MAX_SIDE)),
+        jpeg_quality=int(os.getenv('TRYON_JPEG_QUALITY', DEFAULT_JPEG_QUALITY)),
+        padding=float(os.getenv('TRYON_CROP_PADDING', 0.15)),
+        pose_detector=pose_detector
+    )
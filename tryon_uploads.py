@@ -0,0 +1,86 @@
+"""
+In-memory staging of try-on uploads.
+
+Uploaded images are held in memory until they are forwarded upstream,
+spilling to a private temp directory only above a size threshold, so
+concurrent try-ons never share file names or touch the working directory.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+# Uploads larger than this spill from memory to the private spool directory
+SPOOL_THRESHOLD = int(os.getenv('TRYON_SPOOL_THRESHOLD', 4 * 1024 * 1024))
+
+IMAGE_MIME_TYPES = {
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.jpg': 'image/jpeg',
+}
+
+_spool_dir = None
+_spool_lock = threading.Lock()
+
+
+def spool_dir():
+    """Private (0700) directory for uploads that exceed the in-memory threshold"""
+    global _spool_dir
+    with _spool_lock:
+        if _spool_dir is None or not os.path.isdir(_spool_dir):
+            _spool_dir = tempfile.mkdtemp(prefix='tryon_uploads_')
+        return _spool_dir
+
+
+def image_extension(filename, default='.jpg'):
+    """Normalised extension for an uploaded image (.png, .webp or .jpg)"""
+    filename = (filename or '').lower()
+    if filename.endswith('.png'):
+        return '.png'
+    if filename.endswith('.webp'):
+        return '.webp'
+    if filename.endswith(('.jpg', '.jpeg')):
+        return '.jpg'
+    return default
+
+
+class StagedUpload:
+    """An uploaded image held in memory (or spooled) until it is sent upstream"""
+
+    def __init__(self, data_or_stream, prefix, extension='.jpg'):
+        self.filename = f"{prefix}_{uuid.uuid4().hex}{extension}"
+        self.mimetype = IMAGE_MIME_TYPES.get(extension, 'image/jpeg')
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD, dir=spool_dir())
+        if isinstance(data_or_stream, (bytes, bytearray)):
+            self.file.write(data_or_stream)
+        else:
+            shutil.copyfileobj(data_or_stream, self.file)
+        self.size = self.file.tell()
+        self.file.seek(0)
+
+    @classmethod
+    def from_file_storage(cls, file_storage, prefix, extension=None):
+        """Stage a werkzeug FileStorage before its request ends"""
+        extension = extension or image_extension(file_storage.filename)
+        return cls(file_storage.stream, prefix, extension)
+
+    @property
+    def spooled_to_disk(self):
+        return getattr(self.file, '_rolled', False)
+
+    def read(self):
+        """Whole upload as bytes"""
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(0)
+        return data
+
+    def multipart(self):
+        """(filename, fileobj, mimetype) tuple for requests' files= argument"""
+        self.file.seek(0)
+        return (self.filename, self.file, self.mimetype)
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,273 @@
+"""
+Shared HTTP client for the upstream virtual try-on provider.
+
+One pooled keep-alive session for every try-on call, separate connect and
+read timeouts, jittered retries for failures that are safe to repeat,
+a circuit breaker that fails fast while the provider is unhealthy and an
+optional scheduler that paces calls to the provider's rate limit.
+"""
+
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from upstream_scheduler import PRIORITY_INTERACTIVE, create_scheduler
+
+# Responses that mean the provider did not process the request, so a retry is safe
+RETRYABLE_STATUS = (429, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Upstream try-on service unavailable, retry in {retry_after:.1f}s')
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a cool-down"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """Seconds until the breaker lets a probe through (0 when closed)"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.time())
+
+    def is_open(self):
+        return self.retry_after() > 0
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may go upstream now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.time()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                # Only one probe at a time while half-open
+                if self._probe_in_flight:
+                    raise CircuitOpenError(1.0)
+                self._probe_in_flight = True
+
+    def release_probe(self):
+        """Give back a half-open probe that ended without an upstream outcome (e.g. no scheduler slot)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    print(f"⚡ Try-on upstream circuit opened after {self.consecutive_failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'times_opened': self.times_opened,
+                'retry_after': round(max(0.0, self.opened_at + self.reset_timeout - time.time()), 1)
+                if self.state == self.OPEN else 0.0
+            }
+
+
+class UpstreamClient:
+    """Pooled keep-alive client with timeouts, retries and a circuit breaker"""
+
+    def __init__(self, base_url, headers=None, pool_size=10, connect_timeout=3.05, read_timeout=60.0,
+                 max_retries=2, backoff_base=0.5, backoff_max=8.0, breaker=None, scheduler=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.scheduler = scheduler
+
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers.update(headers or {})
+
+        self._lock = threading.Lock()
+        self.metrics = {
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'short_circuited': 0,
+            'in_flight': 0,
+            'latency_ms': None
+        }
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self.metrics[key] += delta
+
+    def _backoff(self, attempt, response=None):
+        """Full-jitter exponential backoff, honouring Retry-After when the provider sends one"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if response is not None:
+            try:
+                delay = max(delay, min(self.backoff_max, float(response.headers.get('Retry-After', 0))))
+            except ValueError:
+                pass
+        return delay
+
+    @staticmethod
+    def _rewind(files):
+        for value in (files or {}).values():
+            fileobj = value[1] if isinstance(value, tuple) else value
+            if hasattr(fileobj, 'seek'):
+                fileobj.seek(0)
+
+    def post(self, path, files=None, data=None, headers=None, user=None, priority=PRIORITY_INTERACTIVE,
+             on_wait=None, key=None):
+        """POST to the provider; retries connect failures and 429/502/503/504 responses
+
+        With a scheduler, every attempt first waits for a slot as `user` at `priority`
+        (`key` identifies the waiting call for promotion).
+        """
+        try:
+            self.breaker.before_request()
+        except CircuitOpenError:
+            self._count('short_circuited')
+            raise
+
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        recorded = False  # an outcome was reported to the breaker (which also ends a half-open probe)
+        self._count('in_flight')
+        try:
+            while True:
+                if self.scheduler:
+                    self.scheduler.acquire(user, priority, on_wait, key=key)
+                self._count('requests')
+                self._rewind(files)
+                started = time.time()
+                try:
+                    response = self.session.post(url, files=files, data=data, headers=headers, timeout=self.timeout)
+                except requests.exceptions.RequestException as e:
+                    # Only connection failures are repeated; after a read timeout the
+                    # provider may still be working on the request
+                    retryable = isinstance(e, requests.exceptions.ConnectionError)
+                    if retryable and attempt < self.max_retries:
+                        attempt += 1
+                        self._count('retries')
+                        time.sleep(self._backoff(attempt))
+                        continue
+                    self._count('failures')
+                    recorded = True
+                    self.breaker.record_failure()
+                    raise
+
+                self._record_latency(time.time() - started)
+                if self.scheduler:
+                    self.scheduler.observe(response)
+                if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                    attempt += 1
+                    self._count('retries')
+                    time.sleep(self._backoff(attempt, response))
+                    continue
+
+                recorded = True
+                if response.status_code >= 500:
+                    self._count('failures')
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return response
+        finally:
+            if not recorded:
+                self.breaker.release_probe()
+            self._count('in_flight', -1)
+
+    def _record_latency(self, elapsed):
+        with self._lock:
+            previous = self.metrics['latency_ms']
+            elapsed_ms = elapsed * 1000
+            self.metrics['latency_ms'] = round(elapsed_ms if previous is None else 0.8 * previous + 0.2 * elapsed_ms, 1)
+
+    def pool_stats(self):
+        """Connection pool usage from urllib3"""
+        pools = []
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': pool.host,
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': pool.pool.qsize() if pool.pool is not None else 0,
+                'max_size': pool.pool.maxsize if pool.pool is not None else None
+            })
+        return pools
+
+    def snapshot(self):
+        """Metrics for /status"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        return {
+            'base_url': self.base_url,
+            'timeouts': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'metrics': metrics,
+            'pool': self.pool_stats(),
+            'circuit_breaker': self.breaker.snapshot(),
+            'scheduler': self.scheduler.snapshot() if self.scheduler else None
+        }
+
+
+def create_tryon_client(rapidapi_key):
+    """Upstream client for the try-on provider, configured from the environment"""
+    base_url = os.getenv('TRYON_UPSTREAM_URL', 'https://try-on-diffusion.p.rapidapi.com')
+    return UpstreamClient(
+        base_url,
+        headers={
+            'x-rapidapi-host': urlparse(base_url).hostname,
+            'x-rapidapi-key': rapidapi_key
+        },
+        pool_size=int(os.getenv('TRYON_POOL_SIZE', 10)),
+        connect_timeout=float(os.getenv('TRYON_CONNECT_TIMEOUT', 3.05)),
+        read_timeout=float(os.getenv('TRYON_READ_TIMEOUT', 60)),
+        max_retries=int(os.getenv('TRYON_MAX_RETRIES', 2)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv('TRYON_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.getenv('TRYON_BREAKER_RESET', 30))
+        ),
+        scheduler=create_scheduler()
+    )
@@ -0,0 +1,265 @@
+"""
+Rate- and quota-aware scheduling of upstream try-on calls.
+
+Every call to the provider takes a token from a bucket sized to the
+provider plan. Callers wait in per-priority queues (interactive before batch
+before speculative) and, within a priority, users are served round-robin so
+one heavy user cannot starve the others. Rate-limit headers on provider
+responses pause or throttle the bucket, so bursts do not turn into 429s.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_SPECULATIVE = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BATCH: 'batch', PRIORITY_SPECULATIVE: 'speculative'}
+
+# Pause after a 429 that carries no Retry-After
+DEFAULT_THROTTLE_PAUSE = 2.0
+
+
+class UpstreamBusyError(Exception):
+    """Raised when a call waited too long for an upstream slot"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _header_number(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            continue
+    return None
+
+
+class UpstreamScheduler:
+    """Token bucket with priority classes and per-user round-robin queues"""
+
+    def __init__(self, rate_per_minute=60, burst=5, quota_reserve=0, max_wait=120.0):
+        self.rate = rate_per_minute / 60.0 if rate_per_minute else None  # tokens per second, None = unlimited
+        self.burst = max(1, burst)
+        self.quota_reserve = quota_reserve  # quota left for interactive calls only
+        self.max_wait = max_wait
+        self.tokens = float(self.burst)
+        self.updated = time.time()
+        self.paused_until = 0.0
+        self.quota = {'limit': None, 'remaining': None, 'reset_at': None}
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}  # user -> deque of waiters
+        self._cond = threading.Condition()
+        self.stats = {'granted': 0, 'waited': 0, 'timeouts': 0, 'throttled': 0, 'quota_pauses': 0,
+                      'max_wait_ms': 0, 'granted_by_priority': {name: 0 for name in PRIORITY_NAMES.values()}}
+
+    def _refill(self, now):
+        if self.rate is None:
+            self.tokens = float(self.burst)
+        else:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _head(self):
+        """The waiter that gets the next token"""
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if users:
+                return next(iter(users.values()))[0]
+        return None
+
+    def _position(self, waiter):
+        """1-based place in line, assuming no one else arrives"""
+        ahead = 0
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if priority < waiter['priority']:
+                ahead += sum(len(queue) for queue in users.values())
+                continue
+            if priority > waiter['priority']:
+                break
+            index = users[waiter['user']].index(waiter)
+            before = True
+            for user, queue in users.items():
+                if user == waiter['user']:
+                    before = False
+                    ahead += index
+                else:
+                    ahead += min(len(queue), index + 1 if before else index)
+        return ahead + 1
+
+    def _wait_time(self, now):
+        """Seconds until a token can be granted"""
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1 and self.rate:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def _blocked_by_quota(self, priority):
+        remaining = self.quota['remaining']
+        return priority != PRIORITY_INTERACTIVE and remaining is not None and remaining <= self.quota_reserve
+
+    def _remove(self, waiter):
+        users = self._queues[waiter['priority']]
+        queue = users.get(waiter['user'])
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del users[waiter['user']]
+
+    def acquire(self, user=None, priority=PRIORITY_INTERACTIVE, on_wait=None, timeout=None, key=None):
+        """Block until this caller may send one request upstream; returns seconds waited
+
+        on_wait(position, eta_seconds) is called whenever the caller's place in line
+        changes, and with (0, 0) once it is through after having waited. A waiter
+        with a key can be moved up later with promote().
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        user = user or 'anonymous'
+        waiter = {'user': user, 'priority': priority, 'key': key}
+        started = time.time()
+        reported = None
+        with self._cond:
+            self._queues[priority].setdefault(user, deque()).append(waiter)
+
+        while True:
+            with self._cond:
+                now = time.time()
+                self._refill(now)
+                wait = self._wait_time(now)
+                priority = waiter['priority']
+                if (self._head() is waiter and wait <= 0 and self.tokens >= 1
+                        and not self._blocked_by_quota(priority)):
+                    users = self._queues[priority]
+                    users[user].popleft()
+                    if users[user]:
+                        users.move_to_end(user)  # the user's next call goes behind everyone else's
+                    else:
+                        del users[user]
+                    self.tokens -= 1
+                    if self.quota['remaining'] is not None:
+                        self.quota['remaining'] -= 1
+                    waited = now - started
+                    self.stats['granted'] += 1
+                    self.stats['granted_by_priority'][PRIORITY_NAMES[priority]] += 1
+                    if reported:
+                        self.stats['waited'] += 1
+                        self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], round(waited * 1000))
+                    self._cond.notify_all()
+                    break
+
+                if now - started >= timeout:
+                    self._remove(waiter)
+                    self.stats['timeouts'] += 1
+                    self._cond.notify_all()
+                    raise UpstreamBusyError('Try-on service is at its rate limit, try again shortly',
+                                            max(1.0, wait))
+
+                position = self._position(waiter)
+                eta = wait + (position - 1) / self.rate if self.rate else wait
+                moved = position != reported
+                reported = position
+                if not moved:
+                    # Sleep until a token is due or the line moves
+                    self._cond.wait(1.0 if self._blocked_by_quota(priority) else min(max(wait, 0.05), 1.0))
+
+            if moved and on_wait:
+                on_wait(position, eta)
+
+        if reported and on_wait:
+            on_wait(0, 0)
+        return waited
+
+    def promote(self, key, priority):
+        """Move a waiting call up to `priority` (e.g. a click on a garment being prefetched)"""
+        with self._cond:
+            for current in sorted(self._queues, reverse=True):
+                if current <= priority:
+                    break
+                for queue in list(self._queues[current].values()):
+                    for waiter in list(queue):
+                        if waiter['key'] == key:
+                            self._remove(waiter)
+                            waiter['priority'] = priority
+                            self._queues[priority].setdefault(waiter['user'], deque()).append(waiter)
+                            self._cond.notify_all()
+                            return True
+        return False
+
+    def observe(self, response):
+        """Update the bucket from a provider response's status and rate-limit headers"""
+        headers = response.headers
+        now = time.time()
+        with self._cond:
+            # Plan quota (RapidAPI X-RateLimit-Requests-*): pause when it is used up
+            quota_remaining = _header_number(headers, 'X-RateLimit-Requests-Remaining')
+            if quota_remaining is not None:
+                quota_reset = _header_number(headers, 'X-RateLimit-Requests-Reset')
+                self.quota['remaining'] = quota_remaining
+                self.quota['limit'] = _header_number(headers, 'X-RateLimit-Requests-Limit')
+                self.quota['reset_at'] = now + quota_reset if quota_reset is not None else None
+                if quota_remaining <= 0 and quota_reset:
+                    self.paused_until = max(self.paused_until, now + quota_reset)
+                    self.stats['quota_pauses'] += 1
+                    print(f"⏸️ Try-on quota used up, pausing upstream calls for {quota_reset:.0f}s")
+
+            # Short-window rate limit: never hold more tokens than the window has left
+            window_remaining = _header_number(headers, 'X-RateLimit-Remaining')
+            if window_remaining is not None:
+                self.tokens = min(self.tokens, window_remaining)
+                window_reset = _header_number(headers, 'X-RateLimit-Reset')
+                if window_remaining <= 0 and window_reset:
+                    # Either seconds from now or an epoch timestamp
+                    until = window_reset if window_reset > 1e9 else now + window_reset
+                    self.paused_until = max(self.paused_until, until)
+
+            if response.status_code == 429:
+                retry_after = _header_number(headers, 'Retry-After') or DEFAULT_THROTTLE_PAUSE
+                self.paused_until = max(self.paused_until, now + retry_after)
+                self.tokens = 0.0
+                self.stats['throttled'] += 1
+            self._cond.notify_all()
+
+    def idle(self):
+        """No one waiting and a token available now"""
+        with self._cond:
+            now = time.time()
+            self._refill(now)
+            waiting = any(self._queues[priority] for priority in self._queues)
+            return not waiting and self.tokens >= 1 and now >= self.paused_until
+
+    def snapshot(self):
+        with self._cond:
+            now = time.time()
+            self._refill(now)
+            return {
+                'rate_per_minute': round(self.rate * 60, 2) if self.rate else None,
+                'burst': self.burst,
+                'tokens': round(self.tokens, 2),
+                'paused_for': round(max(0.0, self.paused_until - now), 1),
+                'waiting': {PRIORITY_NAMES[p]: sum(len(q) for q in users.values()) for p, users in self._queues.items()},
+                'users_waiting': len({user for users in self._queues.values() for user in users}),
+                'quota': {
+                    'limit': self.quota['limit'],
+                    'remaining': self.quota['remaining'],
+                    'resets_in': round(self.quota['reset_at'] - now) if self.quota['reset_at'] else None,
+                    'reserve': self.quota_reserve
+                },
+                **{key: (dict(value) if isinstance(value, dict) else value) for key, value in self.stats.items()}
+            }
+
+
+def create_scheduler():
+    """Upstream scheduler configured from the environment to match the provider plan"""
+    return UpstreamScheduler(
+        rate_per_minute=float(os.getenv('TRYON_RATE_LIMIT_PER_MIN', 60)),
+        burst=int(os.getenv('TRYON_RATE_BURST', 5)),
+        quota_reserve=int(os.getenv('TRYON_QUOTA_RESERVE', 0)),
+        max_wait=float(os.getenv('TRYON_SCHEDULER_MAX_WAIT', 120))
+    )
@@ -3,6 +3,15 @@ let selectedFabric = null;
 let selectedFabricName = '';
 let allFabricCards = [];
 
+// API Configuration
+const API_BASE = 'http://localhost:8000';
+
+// Garments the shopper showed interest in, most recent first (for try-on prefetch)
+let prefetchInterest = [];
+let prefetchTimer = null;
+const PREFETCH_MAX_GARMENTS = 3;
+const PREFETCH_HOVER_MS = 700;
+
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
     initializeCatalog();
@@ -17,6 +26,9 @@ function initializeCatalog() {
     // Initialize search functionality
     setupSearch();
     
+    // Report hovered cards as likely try-ons
+    setupPrefetchSignals();
+    
     // Show all categories by default
     showCategory('all');
     
@@ -231,6 +243,7 @@ function tryOnFabric(imageSrc, fabricName) {
     
     selectedFabric = imageSrc;
     selectedFabricName = fabricName;
+    notePrefetchInterest(garmentIdFromSrc(imageSrc));
     
     // Update modal content
     document.getElementById('selectedItemImage').src = imageSrc;
@@ -246,6 +259,70 @@ function tryOnFabric(imageSrc, fabricName) {
     showNotification(`✨ ${fabricName} selected for try-on`, 'success');
 }
 
+// Speculative try-on prefetch: once the try-on page has sent the shopper's
+// photo, the server pre-generates the garments they are likely to try next
+function getTryOnSessionId() {
+    let sessionId = localStorage.getItem('tryonSessionId');
+    if (!sessionId) {
+        sessionId = `shopper-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+        localStorage.setItem('tryonSessionId', sessionId);
+    }
+    return sessionId;
+}
+
+// Catalog images ('red_kurta.png') are registered on the server by file name
+function garmentIdFromSrc(src) {
+    if (!src || src.includes('://') || src.startsWith('data:') || src.startsWith('blob:')) {
+        return null;
+    }
+    return src.split('?')[0].split('/').pop().replace(/\.(png|webp|jpe?g)$/i, '') || null;
+}
+
+function garmentIdFromImage(img) {
+    // Built pages point src at fingerprinted variants and keep the garment in data-garment-id
+    return img ? (img.dataset.garmentId || garmentIdFromSrc(img.getAttribute('src'))) : null;
+}
+
+function setupPrefetchSignals() {
+    allFabricCards.forEach(card => {
+        let hoverTimer = null;
+        card.addEventListener('mouseenter', () => {
+            const img = card.querySelector('.fabric-image img');
+            hoverTimer = setTimeout(() => notePrefetchInterest(garmentIdFromImage(img)), PREFETCH_HOVER_MS);
+        });
+        card.addEventListener('mouseleave', () => clearTimeout(hoverTimer));
+    });
+}
+
+function notePrefetchInterest(garmentId) {
+    if (!garmentId || !localStorage.getItem('tryonPrefetchAvatar')) {
+        return;
+    }
+    prefetchInterest = [garmentId, ...prefetchInterest.filter(id => id !== garmentId)].slice(0, PREFETCH_MAX_GARMENTS);
+    
+    // Debounced: a burst of hovers becomes one prediction
+    clearTimeout(prefetchTimer);
+    prefetchTimer = setTimeout(sendPrefetchPredictions, 1000);
+}
+
+async function sendPrefetchPredictions() {
+    const formData = new FormData();
+    formData.append('session_id', getTryOnSessionId());
+    formData.append('garment_id', prefetchInterest.join(','));
+    try {
+        const response = await fetch(`${API_BASE}/virtual-tryon/prefetch`, { method: 'POST', body: formData });
+        if (response.status === 409) {
+            // The server no longer has this shopper's photo
+            localStorage.removeItem('tryonPrefetchAvatar');
+            return;
+        }
+        const result = await response.json();
+        console.log('🔮 Try-on prefetch:', result.queued, 'queued,', result.cached, 'already cached');
+    } catch (error) {
+        console.log('⚠️ Try-on prefetch unavailable:', error.message);
+    }
+}
+
 function showTryOnModal() {
     console.log('🎭 Showing try-on modal for custom item');
     
@@ -3,27 +3,35 @@
 Generate beautiful clothing images for the virtual try-on catalog
 """
 
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-import os
+
+# Smaller copies saved next to each image as name_<width>w.png
+VARIANT_WIDTHS = (150,)
 
 def create_gradient(width, height, color1, color2, direction='vertical'):
-    """Create a gradient background"""
-    base = Image.new('RGB', (width, height), color1)
-    top = Image.new('RGB', (width, height), color2)
-    
+    """Create a gradient background (one broadcast blend over the whole image)"""
     if direction == 'vertical':
-        for y in range(height):
-            alpha = int(255 * (y / height))
-            mask = Image.new('L', (width, height), alpha)
-            base.paste(top, (0, 0), mask)
+        ramp = (np.arange(height, dtype=np.float32) / height)[:, None, None]
     else:  # horizontal
-        for x in range(width):
-            alpha = int(255 * (x / width))
-            mask = Image.new('L', (width, height), alpha)
-            base.paste(top, (0, 0), mask)
-    
-    return base
+        ramp = (np.arange(width, dtype=np.float32) / width)[None, :, None]
+    start = np.asarray(color1, dtype=np.float32)
+    end = np.asarray(color2, dtype=np.float32)
+    pixels = np.broadcast_to(start + (end - start) * ramp, (height, width, 3))
+    return Image.fromarray(np.rint(pixels).astype(np.uint8), 'RGB')
+
+def add_stripes(img, box, spacing=20, thickness=2, color=(255, 255, 255)):
+    """Horizontal stripes inside box, set with one strided array assignment"""
+    pixels = np.array(img)
+    x0, y0, x1, y1 = box
+    for offset in range(thickness):
+        pixels[y0 + offset:y1:spacing, x0:x1 + 1] = color
+    return Image.fromarray(pixels, 'RGB')
 
 def create_shirt_image(color1, color2, name, pattern='solid'):
     """Create a shirt image"""
@@ -34,6 +42,10 @@ def create_shirt_image(color1, color2, name, pattern='solid'):
     else:
         img = Image.new('RGB', (width, height), color1)
     
+    if pattern == 'striped':
+        # Inside the body outline only (it is 3 px wide), on the same 20 px rhythm as before
+        img = add_stripes(img, (93, 85, 207, 347))
+    
     draw = ImageDraw.Draw(img)
     
     # Draw shirt shape
@@ -50,11 +62,6 @@ def create_shirt_image(color1, color2, name, pattern='solid'):
     # Collar
     draw.polygon([(140, 50), (160, 50), (155, 80), (145, 80)], fill=None, outline='white', width=2)
     
-    # Add some style details
-    if pattern == 'striped':
-        for i in range(5, height-5, 20):
-            draw.line([(90, i), (210, i)], fill='white', width=2)
-    
     return img
 
 def create_salwar_image(color1, color2, name):
@@ -156,10 +163,8 @@ def create_saree_image(color1, color2, name):
     
     return img
 
-def main():
-    """Generate all clothing images"""
-    print("🎨 Creating beautiful clothing images...")
-    
+def catalog_items():
+    """(kind, filename, color1, color2, name, pattern) for every catalog image"""
     # Define clothing items with colors
     shirts = [
         ("white_formal.png", (240, 240, 250), (220, 220, 240), "White Formal Shirt", "solid"),
@@ -193,31 +198,59 @@ def main():
         ("mint_saree.png", (152, 255, 152), (144, 238, 144), "Mint Green Saree"),
     ]
     
-    # Create shirt images
-    for filename, color1, color2, name, pattern in shirts:
-        img = create_shirt_image(color1, color2, name, pattern)
-        img.save(filename)
-        print(f"✅ Created {filename}")
-    
-    # Create salwar suit images
-    for filename, color1, color2, name in salwar_suits:
-        img = create_salwar_image(color1, color2, name)
-        img.save(filename)
-        print(f"✅ Created {filename}")
-    
-    # Create kurta images
-    for filename, color1, color2, name in kurtas:
-        img = create_kurta_image(color1, color2, name)
-        img.save(filename)
-        print(f"✅ Created {filename}")
-    
-    # Create saree images
-    for filename, color1, color2, name in sarees:
-        img = create_saree_image(color1, color2, name)
-        img.save(filename)
-        print(f"✅ Created {filename}")
-    
-    print("🎉 All clothing images created successfully!")
+    items = [('shirt',) + shirt for shirt in shirts]
+    items += [('salwar',) + suit + ('gradient',) for suit in salwar_suits]
+    items += [('kurta',) + kurta + ('gradient',) for kurta in kurtas]
+    items += [('saree',) + saree + ('gradient',) for saree in sarees]
+    return items
+
+def render_item(item):
+    """Render one catalog image"""
+    kind, filename, color1, color2, name, pattern = item
+    if kind == 'shirt':
+        return create_shirt_image(color1, color2, name, pattern)
+    if kind == 'salwar':
+        return create_salwar_image(color1, color2, name)
+    if kind == 'kurta':
+        return create_kurta_image(color1, color2, name)
+    return create_saree_image(color1, color2, name)
+
+def generate_item(item, output_dir='.', widths=VARIANT_WIDTHS):
+    """Render and save one image plus its smaller variants; returns the files written"""
+    filename = item[1]
+    img = render_item(item)
+    written = [os.path.join(output_dir, filename)]
+    img.save(written[0])
+    stem, extension = os.path.splitext(filename)
+    for width in widths:
+        if width >= img.width:
+            continue
+        variant = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        written.append(os.path.join(output_dir, f"{stem}_{width}w{extension}"))
+        variant.save(written[-1])
+    return written
+
+def main():
+    """Generate all clothing images"""
+    parser = argparse.ArgumentParser(description='Generate catalog clothing images')
+    parser.add_argument('--output', default='.', help='Directory to write images to (default: current directory)')
+    parser.add_argument('--widths', default=','.join(str(w) for w in VARIANT_WIDTHS),
+                        help='Comma-separated widths of the smaller variants ("" for none)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+    widths = tuple(int(w) for w in args.widths.split(',') if w.strip())
+    os.makedirs(args.output, exist_ok=True)
+    
+    print("🎨 Creating beautiful clothing images...")
+    started = time.time()
+    items = catalog_items()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(generate_item, item, args.output, widths) for item in items]
+        for future in futures:
+            for path in future.result():
+                print(f"✅ Created {os.path.basename(path)}")
+    
+    print(f"🎉 All clothing images created successfully! ({len(items)} items in {time.time() - started:.2f}s)")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,32 +1,78 @@
 // Global variables
+const API_BASE = 'http://localhost:8000';
+const RESULTS_PAGE_SIZE = 20;
 let currentResultIndex = 1;
 let totalResults = 3;
 let availableResults = [];
+let nextResultsOffset = null;
 
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
     initializeResultsViewer();
 });
 
-function initializeResultsViewer() {
+async function initializeResultsViewer() {
     console.log('🖼️ Initializing Results Viewer...');
     
     // Load available results
-    loadResults();
-    
-    // Setup navigation
-    updateNavigation();
-    
-    // Update display
-    updateResultDisplay();
+    await loadResults();
     
     console.log('✅ Results Viewer initialized');
 }
 
-function loadResults() {
+// Convert a stored result from the API into a viewer entry
+function toViewerResult(result, index) {
+    return {
+        id: index + 1,
+        resultId: result.result_id,
+        userImage: 'blue_shirt.png',
+        clothImage: 'red_tshirt.png',
+        resultImage: `${API_BASE}${result.result_url}`,
+        thumbnailImage: `${API_BASE}${result.thumbnail_url}`,
+        seed: result.seed,
+        resolution: '-',
+        processingTime: result.cached ? 'cached' : '-',
+        timestamp: new Date(result.created_at * 1000).toLocaleString()
+    };
+}
+
+// Fetch the next page of try-on history; returns false when there is none
+async function loadMoreResults() {
+    if (nextResultsOffset === null) {
+        return false;
+    }
+    const response = await fetch(`${API_BASE}/results?offset=${nextResultsOffset}&limit=${RESULTS_PAGE_SIZE}`);
+    if (!response.ok) {
+        throw new Error(`API Error: ${response.status}`);
+    }
+    const page = await response.json();
+    page.results.forEach(result => availableResults.push(toViewerResult(result, availableResults.length)));
+    totalResults = page.total;
+    nextResultsOffset = page.next_offset;
+    return page.results.length > 0;
+}
+
+async function loadResults() {
     console.log('📁 Loading available results...');
     
-    // Define available result sets (you can modify this based on actual files)
+    // Page through the server's try-on history, newest first
+    availableResults = [];
+    nextResultsOffset = 0;
+    currentResultIndex = 1;
+    try {
+        await loadMoreResults();
+        if (availableResults.length > 0) {
+            console.log(`📊 Found ${totalResults} stored results`);
+            updateNavigation();
+            updateResultDisplay();
+            return;
+        }
+    } catch (error) {
+        console.log('⚠️ Results API unavailable, showing sample results:', error.message);
+    }
+    nextResultsOffset = null;
+    
+    // Sample result sets when the server has no history
     availableResults = [
         {
             id: 1,
@@ -62,6 +108,8 @@ function loadResults() {
     
     totalResults = availableResults.length;
     console.log(`📊 Found ${totalResults} result sets`);
+    updateNavigation();
+    updateResultDisplay();
 }
 
 function updateNavigation() {
@@ -108,8 +156,10 @@ function updateImages(result) {
     updateImageWithFallback(clothImage, result.clothImage, 'red_tshirt.png');
     updateImageWithFallback(resultImage, result.resultImage, 'green_striped.png');
     
-    // Update confidence score
-    confidenceScore.innerHTML = `<i class="fas fa-star"></i> ${result.confidence}% Match`;
+    // Update confidence score (stored results report their seed instead)
+    confidenceScore.innerHTML = result.confidence !== undefined
+        ? `<i class="fas fa-star"></i> ${result.confidence}% Match`
+        : `<i class="fas fa-seedling"></i> Seed ${result.seed}`;
     
     // Add loading animation
     [userImage, clothImage, resultImage].forEach(img => {
@@ -144,7 +194,7 @@ function showErrorState() {
             <i class="fas fa-exclamation-triangle"></i>
             <h3>No Results Found</h3>
             <p>No virtual try-on results are available in the results folder.</p>
-            <button class="retry-btn" onclick="loadResults(); updateResultDisplay();">
+            <button class="retry-btn" onclick="loadResults();">
                 <i class="fas fa-sync-alt"></i> Refresh
             </button>
         </div>
@@ -165,8 +215,19 @@ function previousResult() {
     }
 }
 
-function nextResult() {
+async function nextResult() {
     if (currentResultIndex < totalResults) {
+        // Fetch the next page of history when reaching the end of what is loaded
+        if (currentResultIndex >= availableResults.length) {
+            try {
+                if (!await loadMoreResults()) {
+                    return;
+                }
+            } catch (error) {
+                showNotification('❌ Could not load more results', 'error');
+                return;
+            }
+        }
         currentResultIndex++;
         updateNavigation();
         updateResultDisplay();
@@ -226,10 +287,10 @@ function createComparisonModal() {
             <div class="comparison-grid">
                 ${availableResults.map(result => `
                     <div class="comparison-item ${result.id === currentResultIndex ? 'active' : ''}">
-                        <img src="${result.resultImage}" alt="Result ${result.id}" onerror="this.src='green_striped.png'">
+                        <img src="${result.thumbnailImage || result.resultImage}" alt="Result ${result.id}" onerror="this.src='green_striped.png'">
                         <div class="comparison-info">
                             <strong>Result ${result.id}</strong>
-                            <span>${result.confidence}% Match</span>
+                            <span>${result.confidence !== undefined ? result.confidence + '% Match' : 'Seed ' + result.seed}</span>
                         </div>
                     </div>
                 `).join('')}
@@ -363,7 +424,6 @@ document.addEventListener('keydown', function(e) {
             if (e.ctrlKey || e.metaKey) {
                 e.preventDefault();
                 loadResults();
-                updateResultDisplay();
                 showNotification('🔄 Results refreshed', 'info');
             }
             break;
@@ -237,7 +237,7 @@ async function performVirtualTryOn(clothingFile) {
                 showNotification('✨ Virtual try-on complete!', 'success');
                 
                 // Display the result
-                displayTryOnResult(result.result_image_base64);
+                displayTryOnResult(`http://localhost:8000${result.result_url}`);
                 
                 return result;
             } else {
@@ -255,7 +255,7 @@ async function performVirtualTryOn(clothingFile) {
 }
 
 // Add function to display try-on results
-function displayTryOnResult(imageBase64) {
+function displayTryOnResult(imageUrl) {
     // Create or update result display
     let resultModal = document.getElementById('tryOnResultModal');
     
@@ -291,7 +291,7 @@ function displayTryOnResult(imageBase64) {
     }
     
     const resultImage = document.getElementById('tryOnResultImage');
-    resultImage.src = imageBase64;
+    resultImage.src = imageUrl;
     
     resultModal.style.display = 'block';
 }
@@ -3,6 +3,8 @@ let userImage = null;
 let clothingImage = null;
 let userImageFile = null;
 let clothingImageFile = null;
+let clothingGarmentId = null; // catalog garment the server already has
+let prefetchAvatarFile = null; // avatar last sent to the prefetch endpoint
 let resultCanvas = null;
 let resultContext = null;
 let currentAdjustments = {
@@ -14,6 +16,25 @@ let currentAdjustments = {
 // API Configuration
 const API_BASE = 'http://localhost:8000';
 
+// Catalog images ('red_kurta.png') are registered on the server by file name
+function garmentIdFromSrc(src) {
+    if (!src || src.startsWith('data:') || src.startsWith('blob:')) {
+        return null;
+    }
+    const fileName = src.split('?')[0].split('/').pop();
+    return fileName.replace(/\.(png|webp|jpe?g)$/i, '') || null;
+}
+
+// Reference catalog garments by id instead of re-uploading them
+function appendClothing(formData) {
+    if (clothingGarmentId && !clothingImageFile) {
+        formData.append('garment_id', clothingGarmentId);
+        console.log('👕 Clothing: catalog garment', clothingGarmentId);
+    } else {
+        formData.append('clothing_image', clothingImageFile);
+    }
+}
+
 // Update Live Try-On badge visibility
 function updateLiveTryOnBadge() {
     const badge = document.getElementById('liveClothingBadge');
@@ -84,6 +105,8 @@ function checkForPreSelectedFabric() {
         const img = new Image();
         img.onload = () => {
             clothingImage = img;
+            clothingImageFile = null;
+            clothingGarmentId = garmentIdFromSrc(selectedFabric);
             displayImagePreview(img, 'clothingImagePreview', 'clothingUploadArea');
             updateLiveTryOnBadge();
             
@@ -152,6 +175,7 @@ function handleImageUpload(event, type) {
             } else {
                 clothingImage = img;
                 clothingImageFile = file; // Store original file
+                clothingGarmentId = null;
                 displayImagePreview(img, 'clothingImagePreview', 'clothingUploadArea');
                 showNotification('👕 Clothing image uploaded successfully!', 'success');
                 updateLiveTryOnBadge();
@@ -193,6 +217,7 @@ function loadPresetClothing(src) {
     img.onload = () => {
         clothingImage = img;
         clothingImageFile = null; // No file for presets
+        clothingGarmentId = garmentIdFromSrc(src);
         displayImagePreview(img, 'clothingImagePreview', 'clothingUploadArea');
         showNotification('👕 Preset clothing selected!', 'success');
         checkReadyState();
@@ -218,6 +243,7 @@ function checkReadyState() {
         tryOnBtn.disabled = false;
         tryOnBtn.innerHTML = '<i class="fas fa-magic"></i> Try It On!';
         showNotification('🎉 Ready for virtual try-on!', 'info');
+        prefetchTryOn();
     } else {
         tryOnBtn.disabled = true;
         const missing = [];
@@ -278,13 +304,13 @@ async function performVirtualTryOn() {
         }
         
         // Check if we can use AI mode or need to convert preset images
-        if (!clothingImageFile || !userImageFile) {
+        if ((!clothingImageFile && !clothingGarmentId) || !userImageFile) {
             try {
                 console.log('🔄 Converting preset images for AI mode...');
                 showNotification('🔄 Converting images for AI try-on...', 'info');
                 
                 // Convert any missing files
-                if (!clothingImageFile && clothingImage) {
+                if (!clothingImageFile && !clothingGarmentId && clothingImage) {
                     await convertPresetImageToFile('clothing');
                 }
                 if (!userImageFile && userImage) {
@@ -832,6 +858,7 @@ function usePhoto(type) {
             } else {
                 clothingImage = img;
                 clothingImageFile = file; // Set the File object for API usage
+                clothingGarmentId = null;
                 displayImagePreview(img, 'clothingImagePreview', 'clothingUploadArea');
                 showNotification('👕 Clothing photo captured and ready for API!', 'success');
                 console.log('📁 Created clothing image file:', file.name, file.size, 'bytes');
@@ -929,6 +956,7 @@ function resetTryOn() {
     clothingImage = null;
     userImageFile = null;
     clothingImageFile = null;
+    clothingGarmentId = null;
     currentAdjustments = { size: 100, positionX: 0, positionY: 0 };
     
     // Reset UI
@@ -1587,8 +1615,8 @@ async function performAPITryOn() {
         showNotification('🎭 Processing with streaming API...', 'info');
         showLoadingOverlay();
         
-        // Check if we have original clothing file
-        if (!clothingImageFile) {
+        // Check if we have original clothing file (or a catalog garment)
+        if (!clothingImageFile && !clothingGarmentId) {
             hideLoadingOverlay();
             showNotification('❌ Camera mode requires uploaded clothing files. Please upload clothing image first.', 'error');
             setTimeout(() => {
@@ -1599,25 +1627,22 @@ async function performAPITryOn() {
         
         // Use only original clothing file (no canvas conversion)
         const formData = new FormData();
-        formData.append('clothing_image', clothingImageFile);
+        appendClothing(formData);
         
         // If we have a user image, include it as avatar to avoid camera requirement
         if (userImageFile) {
             formData.append('avatar_image', userImageFile);
             console.log('📤 Making API call with uploaded avatar to:', `${API_BASE}/virtual-tryon`);
-            console.log('📁 Clothing file:', clothingImageFile.name, clothingImageFile.size, 'bytes');
+            console.log('📁 Clothing file:', clothingImageFile ? `${clothingImageFile.name} ${clothingImageFile.size} bytes` : `catalog garment ${clothingGarmentId}`);
             console.log('📁 Avatar file:', userImageFile.name, userImageFile.size, 'bytes');
         } else {
             console.log('📤 Making API call with live camera to:', `${API_BASE}/virtual-tryon`);
-            console.log('📁 Clothing file:', clothingImageFile.name, clothingImageFile.size, 'bytes');
+            console.log('📁 Clothing file:', clothingImageFile ? `${clothingImageFile.name} ${clothingImageFile.size} bytes` : `catalog garment ${clothingGarmentId}`);
             console.log('📹 Avatar: Live camera stream (requires active camera)');
         }
         
         try {
-            const response = await fetch(`${API_BASE}/virtual-tryon`, {
-                method: 'POST',
-                body: formData
-            });
+            const response = await fetchTryOnJob(formData);
             
             console.log('📥 API Response status:', response.status);
             
@@ -1629,7 +1654,7 @@ async function performAPITryOn() {
                 
                 if (result.success) {
                     // Display the API result
-                    displayAPIResult(result.result_image_base64);
+                    displayAPIResult(`${API_BASE}${result.result_url}`);
                     showNotification('✨ API try-on complete!', 'success');
                 } else {
                     throw new Error(result.error || 'API try-on failed');
@@ -1687,7 +1712,7 @@ async function performAPITryOnWithUserImage() {
     }
     
     // This function should only be called when we have original files
-    if (!clothingImageFile || !userImageFile) {
+    if ((!clothingImageFile && !clothingGarmentId) || !userImageFile) {
         console.error('❌ performAPITryOnWithUserImage called without original files');
         showNotification('❌ Internal error: Missing original files', 'error');
         return;
@@ -1700,18 +1725,15 @@ async function performAPITryOnWithUserImage() {
         
         // Use only original files - no canvas conversion
         const formData = new FormData();
-        formData.append('clothing_image', clothingImageFile);
+        appendClothing(formData);
         formData.append('avatar_image', userImageFile);
         
         console.log('📤 Making API call to:', `${API_BASE}/virtual-tryon`);
-        console.log('📁 Clothing file:', clothingImageFile.name, clothingImageFile.size, 'bytes');
+        console.log('📁 Clothing file:', clothingImageFile ? `${clothingImageFile.name} ${clothingImageFile.size} bytes` : `catalog garment ${clothingGarmentId}`);
         console.log('📁 Avatar file:', userImageFile.name, userImageFile.size, 'bytes');
         
         try {
-            const response = await fetch(`${API_BASE}/virtual-tryon`, {
-                method: 'POST',
-                body: formData
-            });
+            const response = await fetchTryOnJob(formData);
             
             console.log('📥 API Response status:', response.status);
             
@@ -1723,7 +1745,7 @@ async function performAPITryOnWithUserImage() {
                 
                 if (result.success) {
                     // Display the API result
-                    displayAPIResult(result.result_image_base64);
+                    displayAPIResult(`${API_BASE}${result.result_url}`);
                     showResultActions();
                     showNotification('✨ AI try-on complete!', 'success');
                 } else {
@@ -1759,6 +1781,99 @@ async function performAPITryOnWithUserImage() {
     }
 }
 
+// Shared with the catalog page, which reports browsing signals for prefetch
+function getTryOnSessionId() {
+    let sessionId = localStorage.getItem('tryonSessionId');
+    if (!sessionId) {
+        sessionId = `shopper-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+        localStorage.setItem('tryonSessionId', sessionId);
+    }
+    return sessionId;
+}
+
+// Start generating the selected catalog garment before "Try It On" is clicked;
+// the click then joins the running try-on or is answered from the cache
+async function prefetchTryOn() {
+    if (!userImageFile || !clothingGarmentId || clothingImageFile) {
+        return;
+    }
+    const formData = new FormData();
+    formData.append('session_id', getTryOnSessionId());
+    formData.append('garment_id', clothingGarmentId);
+    if (prefetchAvatarFile !== userImageFile) {
+        formData.append('avatar_image', userImageFile);
+    }
+    try {
+        const response = await fetch(`${API_BASE}/virtual-tryon/prefetch`, { method: 'POST', body: formData });
+        if (response.status === 409 && prefetchAvatarFile) {
+            // The server dropped this shopper's photo; send it again
+            prefetchAvatarFile = null;
+            return prefetchTryOn();
+        }
+        const result = await response.json();
+        if (result.enabled) {
+            prefetchAvatarFile = userImageFile;
+            localStorage.setItem('tryonPrefetchAvatar', '1');
+            console.log('🔮 Prefetching try-on of', clothingGarmentId);
+        }
+    } catch (error) {
+        console.log('⚠️ Try-on prefetch unavailable:', error.message);
+    }
+}
+
+// Submit a try-on as a background job and poll until it finishes.
+// Resolves to a Response shaped like the synchronous /virtual-tryon reply,
+// so the request is not held open for the 30-60 s the upstream call takes.
+async function fetchTryOnJob(formData) {
+    if (!formData.has('session_id')) {
+        formData.append('session_id', getTryOnSessionId());
+    }
+    const submit = await fetch(`${API_BASE}/virtual-tryon/jobs`, {
+        method: 'POST',
+        body: formData
+    });
+    if (submit.status !== 202) {
+        return submit;
+    }
+    
+    const job = await submit.json();
+    console.log('🕒 Try-on job queued:', job.job_id);
+    let upstreamPosition = 0;
+    
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const statusResponse = await fetch(`${API_BASE}${job.status_url}`);
+        if (!statusResponse.ok) {
+            return statusResponse;
+        }
+        const status = await statusResponse.json();
+        
+        // Waiting in line for the provider's rate limit
+        if (status.upstream_position && status.upstream_position !== upstreamPosition) {
+            showNotification(`⏳ ${status.message}`, 'info');
+        }
+        upstreamPosition = status.upstream_position || 0;
+        
+        if (status.status === 'failed') {
+            return new Response(JSON.stringify({ success: false, error: status.error }), {
+                status: status.error_status || 500,
+                headers: { 'Content-Type': 'application/json' }
+            });
+        }
+        if (status.status === 'succeeded') {
+            return new Response(JSON.stringify({
+                success: true,
+                job_id: status.job_id,
+                result_id: status.result_id,
+                result_url: status.result_url,
+                thumbnail_url: status.thumbnail_url,
+                result_filename: status.result_filename,
+                seed: status.seed
+            }), { status: 200, headers: { 'Content-Type': 'application/json' } });
+        }
+    }
+}
+
 // Helper function to convert image to blob
 function imageToBlob(image, filename) {
     return new Promise((resolve, reject) => {
@@ -1858,7 +1973,7 @@ async function convertPresetImageToFile(imageType = 'clothing') {
 }
 
 // Display API result
-function displayAPIResult(imageBase64) {
+function displayAPIResult(imageUrl) {
     const urlParams = new URLSearchParams(window.location.search);
     const cameraMode = urlParams.get('mode') === 'camera';
     
@@ -1872,6 +1987,7 @@ function displayAPIResult(imageBase64) {
             
             // Create a new image element to load the API result
             const img = new Image();
+            img.crossOrigin = 'anonymous'; // keep the canvas exportable
             img.onload = () => {
                 // Set canvas size to match image
                 resultCanvas.width = img.width;
@@ -1893,7 +2009,7 @@ function displayAPIResult(imageBase64) {
                 
                 console.log('✅ API result displayed in main canvas');
             };
-            img.src = 'data:image/jpeg;base64,' + imageBase64;
+            img.src = imageUrl;
         } else {
             console.error('❌ Result canvas not found');
         }
@@ -1931,7 +2047,7 @@ function displayAPIResult(imageBase64) {
         
         const apiResultImage = document.getElementById('apiResultImage');
         if (apiResultImage) {
-            apiResultImage.src = 'data:image/jpeg;base64,' + imageBase64;
+            apiResultImage.src = imageUrl;
         }
         
         // Scroll to result